@@ -1,11 +1,11 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app import crud
-from app.database import get_db
+from app.database import AwaitableSession, get_db
+from app.hashing import verify_password
+from app.principals import Principal, principal_cache
 
 SECRET_KEY = "your_secret_key"  # Замените на ваш секретный ключ
 ALGORITHM = "HS256"
@@ -13,19 +13,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def authenticate_user(db: Session, username: str, password: str):
-    user = crud.get_user_by_username(db, username)
+# bcrypt выполняется в ограниченном пуле app.hashing, чтобы не блокировать
+# цикл событий и не занимать потоки обработчиков
+async def authenticate_user(db: AwaitableSession, username: str, password: str):
+    user = await db.run(crud.get_user_by_username, username)
+    await db.release()
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return None
     return user
 
@@ -35,20 +30,32 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Неверные учетные данные",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+# Проверка токена без зависимости oauth2_scheme: используется также там,
+# где токен передаётся не заголовком (WebSocket, EventSource)
+async def principal_from_token(token: str, db: AwaitableSession) -> Principal:
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    user = crud.get_user_by_username(db, username)
+        raise _credentials_exception()
+    user = await db.run(crud.get_user_by_username, username)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise _credentials_exception()
+    principal = Principal(id=user.id, username=user.username, role=user.role.name)
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AwaitableSession = Depends(get_db)):
+    return await principal_from_token(token, db)
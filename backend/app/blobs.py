@@ -0,0 +1,324 @@
+import argparse
+import hashlib
+import mimetypes
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.orm import Session
+from app import models
+from app.config import (
+    BLOB_GC_BATCH_SIZE, BLOB_GC_GRACE_SECONDS, BLOB_GC_INTERVAL_SECONDS,
+    UPLOAD_CHUNK_SIZE, UPLOAD_MAX_BYTES, UPLOADS_DIR,
+)
+
+# Хранилище вложений с адресацией по содержимому: файл сохраняется под
+# своим SHA-256 в uploads/blobs/ab/cd/<hash>, поэтому одинаковые файлы
+# разных задач хранятся один раз, а файлы с одинаковыми именами не
+# перезаписывают друг друга. Исходное имя файла хранится в Attachment.
+
+BLOBS_DIR = os.path.join(UPLOADS_DIR, "blobs")
+# Временные файлы лежат в той же файловой системе, что и blobs,
+# чтобы готовый файл переносился на место атомарным os.replace
+INCOMING_DIR = os.path.join(UPLOADS_DIR, "incoming")
+
+# Запас на заголовки multipart сверх размера самого файла
+MULTIPART_OVERHEAD = 64 * 1024
+
+class StoredBlob:
+    __slots__ = ("sha256", "size", "content_type", "filename")
+
+    def __init__(self, sha256: str, size: int, content_type: str, filename: str):
+        self.sha256 = sha256
+        self.size = size
+        self.content_type = content_type
+        self.filename = filename
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOBS_DIR, sha256[:2], sha256[2:4], sha256)
+
+# Ключ файла в хранилище для Attachment.file_url; сам файл отдаётся через
+# GET /tasks/{task_id}/attachments/{attachment_id}/content
+def blob_url(sha256: str) -> str:
+    return "/".join(["uploads", "blobs", sha256[:2], sha256[2:4], sha256])
+
+def _too_large():
+    return HTTPException(
+        status_code=413,
+        detail=f"Файл превышает допустимый размер {UPLOAD_MAX_BYTES} байт",
+    )
+
+def _content_type(declared: Optional[str], filename: str) -> str:
+    if declared and declared != "application/octet-stream":
+        return declared
+    guessed, _ = mimetypes.guess_type(filename)
+    return guessed or declared or "application/octet-stream"
+
+def _store(temp_path: str, sha256: str):
+    path = blob_path(sha256)
+    try:
+        # Такой файл уже есть: новая копия не нужна. Время изменения
+        # обновляется, чтобы сборщик мусора не удалил файл, пока запись
+        # о вложении ещё не сохранена. Если сборщик успел его убрать,
+        # файл сохраняется заново
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return
+    os.remove(temp_path)
+
+# Разбор multipart-тела по мере поступления: данные поля с файлом пишутся
+# на диск блоками UPLOAD_CHUNK_SIZE с одновременным подсчётом SHA-256,
+# превышение UPLOAD_MAX_BYTES прерывает загрузку, не дочитывая тело.
+class _FilePartReader:
+    def __init__(self, field: str):
+        self.field = field
+        self.header_name = b""
+        self.header_value = b""
+        self.headers = {}
+        self.active = False
+        self.found = False
+        self.filename = None
+        self.declared_type = None
+        self.pending = []
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data, start, end):
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_name.lower()] = self.header_value
+        self.header_name = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        self.active = not self.found and name == self.field and b"filename" in options
+        if self.active:
+            self.found = True
+            self.filename = os.path.basename(options[b"filename"].decode("utf-8", errors="replace"))
+            content_type = self.headers.get(b"content-type")
+            self.declared_type = content_type.decode("latin-1") if content_type else None
+
+    def on_part_data(self, data, start, end):
+        if self.active:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self):
+        self.active = False
+
+    def callbacks(self):
+        names = ("on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+                 "on_headers_finished", "on_part_data", "on_part_end")
+        return {name: getattr(self, name) for name in names}
+
+async def receive_upload(request: Request, field: str = "file") -> StoredBlob:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Ожидается multipart/form-data")
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit() \
+            and int(declared_length) > UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD:
+        raise _too_large()
+
+    reader = _FilePartReader(field)
+    parser = MultipartParser(options[b"boundary"], reader.callbacks())
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=INCOMING_DIR)
+    os.close(descriptor)
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    try:
+        async with await anyio.open_file(temp_path, "wb") as target:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                for piece in reader.pending:
+                    size += len(piece)
+                    if size > UPLOAD_MAX_BYTES:
+                        raise _too_large()
+                    digest.update(piece)
+                    buffer += piece
+                reader.pending.clear()
+                while len(buffer) >= UPLOAD_CHUNK_SIZE:
+                    await target.write(bytes(buffer[:UPLOAD_CHUNK_SIZE]))
+                    del buffer[:UPLOAD_CHUNK_SIZE]
+            parser.finalize()
+            if buffer:
+                await target.write(bytes(buffer))
+        if not reader.found:
+            raise HTTPException(status_code=422, detail="Файл не передан")
+        sha256 = digest.hexdigest()
+        await anyio.to_thread.run_sync(_store, temp_path, sha256)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return StoredBlob(sha256, size, _content_type(reader.declared_type, reader.filename), reader.filename)
+
+# Сборка мусора. Ссылки на файлы хранятся в attachments.sha256, поэтому
+# после удаления вложения, задачи или проекта файл остаётся на диске, пока
+# его не удалит сборщик. Он обходит хранилище пакетами, проверяет ссылки
+# одним запросом на пакет и удаляет файлы без ссылок, которые не менялись
+# дольше периода ожидания: так не затрагиваются загрузки, запись о которых
+# ещё не сохранена. Недокачанные временные файлы удаляются по тому же правилу.
+# Файлы, загруженные до хранилища blobs, лежат в корне uploads под
+# исходными именами (ссылка — attachments.filename). По имени их не отличить
+# от посторонних файлов в этом каталоге, поэтому они проверяются только по
+# явному запросу (legacy=True, в командной строке --legacy).
+
+class GcReport:
+    __slots__ = ("scanned", "deleted", "reclaimed_bytes", "skipped_recent", "errors")
+
+    def __init__(self):
+        self.scanned = 0
+        self.deleted = 0
+        self.reclaimed_bytes = 0
+        self.skipped_recent = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def _files(directory: str, depth: int = 0):
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if depth and entry.is_dir(follow_symlinks=False):
+            yield from _files(entry.path, depth - 1)
+        elif not depth and entry.is_file(follow_symlinks=False):
+            yield entry
+
+def _batches(entries, size: int):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _referenced_blobs(db: Session, names):
+    rows = db.query(models.Attachment.sha256).filter(models.Attachment.sha256.in_(names)).distinct()
+    return {sha256 for sha256, in rows}
+
+def _referenced_legacy(db: Session, names):
+    rows = db.query(models.Attachment.filename)\
+             .filter(models.Attachment.sha256.is_(None), models.Attachment.filename.in_(names))\
+             .distinct()
+    return {filename for filename, in rows}
+
+def _nothing_referenced(db: Session, names):
+    return set()
+
+# Загрузка того же файла может обновить время изменения уже после проверки.
+# Поэтому файл сначала переносится под временное имя (после этого загрузка
+# сохранит свою копию заново), проверяется ещё раз и возвращается на место,
+# если его успели обновить. Возвращает размер удалённого файла или None.
+def _remove_stale(path: str, cutoff: float) -> Optional[int]:
+    trash = f"{path}.gc-{os.getpid()}"
+    os.rename(path, trash)
+    stat_result = os.stat(trash)
+    if stat_result.st_mtime > cutoff:
+        os.replace(trash, path)
+        return None
+    os.remove(trash)
+    return stat_result.st_size
+
+def _sweep(db: Session, entries, referenced, report: GcReport, cutoff: float, batch_size: int, dry_run: bool):
+    for batch in _batches(entries, batch_size):
+        report.scanned += len(batch)
+        keep = referenced(db, [entry.name for entry in batch])
+        for entry in batch:
+            if entry.name in keep:
+                continue
+            try:
+                stat_result = entry.stat(follow_symlinks=False)
+                if stat_result.st_mtime > cutoff:
+                    report.skipped_recent += 1
+                    continue
+                if not dry_run and _remove_stale(entry.path, cutoff) is None:
+                    report.skipped_recent += 1
+                    continue
+            except FileNotFoundError:
+                continue
+            except OSError as error:
+                print(f"Не удалось удалить файл {entry.path}: {error}")
+                report.errors += 1
+                continue
+            report.deleted += 1
+            report.reclaimed_bytes += stat_result.st_size
+
+def _legacy_files():
+    # Скрытые файлы старый обработчик загрузок не создавал
+    return (entry for entry in _files(UPLOADS_DIR) if not entry.name.startswith("."))
+
+def collect_garbage(db: Session, grace_seconds: int = BLOB_GC_GRACE_SECONDS,
+                    batch_size: int = BLOB_GC_BATCH_SIZE, dry_run: bool = False,
+                    legacy: bool = False) -> GcReport:
+    report = GcReport()
+    cutoff = time.time() - grace_seconds
+    _sweep(db, _files(BLOBS_DIR, depth=2), _referenced_blobs, report, cutoff, batch_size, dry_run)
+    if legacy:
+        _sweep(db, _legacy_files(), _referenced_legacy, report, cutoff, batch_size, dry_run)
+    _sweep(db, _files(INCOMING_DIR), _nothing_referenced, report, cutoff, batch_size, dry_run)
+    return report
+
+def _collect_with_session():
+    from app.database import ReadSessionLocal
+    db = ReadSessionLocal()
+    try:
+        return collect_garbage(db)
+    finally:
+        db.close()
+
+# Периодическая сборка в работающем приложении; запускается в main при старте
+async def run_periodic_gc(interval_seconds: int = BLOB_GC_INTERVAL_SECONDS):
+    while True:
+        await anyio.sleep(interval_seconds)
+        try:
+            report = await run_in_threadpool(_collect_with_session)
+        except Exception as error:
+            print(f"Сборка мусора во вложениях завершилась ошибкой: {error}")
+            continue
+        if report.deleted or report.errors:
+            print(f"Сборка мусора во вложениях: {report.as_dict()}")
+
+def main(argv=None):
+    from app.database import ReadSessionLocal
+    parser = argparse.ArgumentParser(description="Обслуживание хранилища вложений")
+    parser.add_argument("command", choices=["gc"])
+    parser.add_argument("--grace", type=int, default=BLOB_GC_GRACE_SECONDS,
+                        help="Не удалять файлы, изменённые за последние N секунд")
+    parser.add_argument("--batch", type=int, default=BLOB_GC_BATCH_SIZE, help="Файлов в пакете")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено")
+    parser.add_argument("--legacy", action="store_true",
+                        help="Проверить и файлы в корне uploads, загруженные до хранилища blobs")
+    args = parser.parse_args(argv)
+    db = ReadSessionLocal()
+    try:
+        report = collect_garbage(db, args.grace, args.batch, args.dry_run, args.legacy)
+    finally:
+        db.close()
+    action = "Можно освободить" if args.dry_run else "Освобождено"
+    print(f"Проверено файлов: {report.scanned}, без ссылок: {report.deleted}, "
+          f"{action}: {report.reclaimed_bytes} байт, недавних пропущено: {report.skipped_recent}, "
+          f"ошибок: {report.errors}")
+    return 1 if report.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Any, Iterable, Optional
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import events, metrics, serializers
+from app.config import (
+    CACHE_BACKEND, CACHE_DISABLED_ENDPOINTS, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES, CACHE_REDIS_URL, CACHE_TTL_SECONDS,
+)
+from app.principals import Principal
+
+# Кэш готовых ответов для запросов, которые читают намного чаще, чем
+# изменяют. Обработчик после проверки прав вызывает lookup и при попадании
+# сразу отдаёт сохранённое тело; иначе строит ответ как обычно и передаёт
+# его в store, который сериализует содержимое один раз и сохраняет с
+# тегами. Записи crud сбрасывают теги после commit: теги выводятся из
+# событий ленты изменений (app.events), записи без событий (пользователи)
+# вызывают invalidate явно. Кэш memory у каждого процесса свой, и записи в
+# других процессах его не сбрасывают — для нескольких процессов нужен redis
+# или короткий CACHE_TTL_SECONDS.
+
+PENDING_TAGS = "pending_cache_tags"
+
+# Заголовки ответа, которые сохраняются вместе с телом
+STORED_HEADERS = ("x-next-cursor", "etag", "last-modified", "cache-control", "vary")
+
+class MemoryBackend:
+    blocking = False
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, tags: Iterable[str], ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tags = tuple(tags)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            self.size += len(value)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.pop(tag, set())
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.size, "evictions": self.evictions}
+
+    # Вызывается под self._lock
+    def _remove(self, key: str):
+        _, value, tags = self._entries.pop(key)
+        self.size -= len(value)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+# Redis или совместимый сервер: у каждого тега есть множество ключей записей
+class RedisBackend:
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "taskmanager:cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Для CACHE_BACKEND=redis нужен пакет redis: pip install redis")
+        self.client = redis.Redis.from_url(url, socket_timeout=1)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, tags: Iterable[str], ttl: float):
+        pipeline = self.client.pipeline()
+        pipeline.set(self.prefix + key, value, ex=int(ttl))
+        for tag in tags:
+            pipeline.sadd(self.prefix + "tag:" + tag, self.prefix + key)
+            # Набор тега живёт не меньше самых долгих записей с этим тегом
+            pipeline.expire(self.prefix + "tag:" + tag, max(int(ttl), CACHE_TTL_SECONDS))
+        pipeline.execute()
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        tag_keys = [self.prefix + "tag:" + tag for tag in tags]
+        keys = set()
+        for tag_key in tag_keys:
+            keys |= self.client.smembers(tag_key)
+        if keys or tag_keys:
+            self.client.delete(*keys, *tag_keys)
+        return len(keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        return {}
+
+def create_backend(name: str = CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+    if name == "redis":
+        return RedisBackend(CACHE_REDIS_URL)
+    return None
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float = CACHE_TTL_SECONDS, disabled: Iterable[str] = ()):
+        self.backend = backend
+        self.ttl = ttl
+        self.disabled = set(disabled)
+        self.counters = defaultdict(lambda: {"hits": 0, "misses": 0, "stores": 0})
+        self.invalidations = 0
+        self.errors = 0
+        # Номер сброса: ответ, построенный до сброса, не сохраняется
+        self.generation = 0
+
+    def enabled(self, name: str) -> bool:
+        return self.backend is not None and self.ttl > 0 and name not in self.disabled
+
+    # scope — чей это ответ, если он зависит от пользователя:
+    # "role" — общий для роли, "user" — свой у каждого пользователя
+    def key(self, request: Request, name: str, scope: Optional[str] = None,
+            principal: Optional[Principal] = None) -> str:
+        owner = ""
+        if scope == "role" and principal is not None:
+            owner = principal.role.value
+        elif scope == "user" and principal is not None:
+            owner = str(principal.id)
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        digest = hashlib.sha1(f"{request.url.path}?{query}|{owner}".encode()).hexdigest()
+        return f"{name}:{digest}"
+
+    async def _call(self, method, *args):
+        try:
+            if self.backend.blocking:
+                return await run_in_threadpool(method, *args)
+            return method(*args)
+        except Exception as error:
+            # Недоступный кэш не должен ломать запрос
+            self.errors += 1
+            print(f"Ошибка кэша ответов: {error}")
+            return None
+
+    async def lookup(self, request: Request, name: str, scope: Optional[str] = None,
+                     principal: Optional[Principal] = None) -> Optional[Response]:
+        if not self.enabled(name):
+            return None
+        request.state.cache_generation = self.generation
+        value = await self._call(self.backend.get, self.key(request, name, scope, principal))
+        if value is None:
+            self.counters[name]["misses"] += 1
+            return None
+        self.counters[name]["hits"] += 1
+        header, body = value.split(b"\n", 1)
+        response = Response(content=body, media_type="application/json", headers=json.loads(header))
+        response.headers["X-Cache"] = "HIT"
+        return response
+
+    # Сериализует content по модели ответа (app.serializers) и возвращает
+    # готовый ответ; headers — заголовки из параметра Response. expires_at —
+    # момент, после которого ответ устареет без записей в базу (например,
+    # число просроченных задач); запись хранится не дольше него
+    async def store(self, request: Request, name: str, content: Any, tags: Iterable[str],
+                    model: Any = None, headers=None, scope: Optional[str] = None,
+                    principal: Optional[Principal] = None, expires_at: Optional[datetime] = None) -> Response:
+        if model is not None:
+            body = serializers.dumps(model, content)
+        else:
+            started = time.perf_counter()
+            body = orjson.dumps(jsonable_encoder(content))
+            metrics.record_serialization(started)
+        kept = {k: v for k, v in (headers or {}).items() if k.lower() in STORED_HEADERS}
+        response = Response(content=body, media_type="application/json", headers=kept)
+        if not self.enabled(name):
+            return response
+        response.headers["X-Cache"] = "MISS"
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.utcnow()).total_seconds())
+        # Redis хранит срок в целых секундах
+        if ttl >= 1 and getattr(request.state, "cache_generation", None) == self.generation:
+            value = json.dumps(kept).encode() + b"\n" + body
+            await self._call(self.backend.set, self.key(request, name, scope, principal), value, tuple(tags), ttl)
+            self.counters[name]["stores"] += 1
+        return response
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        tags = set(tags)
+        if self.backend is None or not tags:
+            return
+        self.generation += 1
+        self.invalidations += 1
+        try:
+            self.backend.invalidate(tags)
+        except Exception as error:
+            self.errors += 1
+            print(f"Ошибка сброса кэша ответов: {error}")
+
+    def clear(self):
+        if self.backend is not None:
+            self.generation += 1
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": CACHE_BACKEND if self.backend is not None else "none",
+            "endpoints": {name: dict(values) for name, values in self.counters.items()},
+            "disabled": sorted(self.disabled),
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            **(self.backend.stats() if self.backend is not None else {}),
+        }
+
+response_cache = ResponseCache(create_backend(), disabled=CACHE_DISABLED_ENDPOINTS)
+
+# Явный сброс для записей, которые не порождают событий ленты изменений
+def invalidate(db: Session, *tags: str):
+    db.info.setdefault(PENDING_TAGS, set()).update(tags)
+
+def _change_tags(change: dict):
+    tags = set()
+    kind = change["type"].split(".", 1)[0]
+    if kind == "task":
+        tags.add("tasks")
+    elif kind == "project":
+        tags.add("projects")
+        if change["type"] == "project.deleted":
+            # Задачи проекта удалены каскадно
+            tags.add("tasks")
+    if change.get("project_id") is not None and kind in ("task", "project"):
+        tags.add(f"project:{change['project_id']}")
+    if change.get("task_id") is not None:
+        tags.add(f"task:{change['task_id']}")
+    return tags
+
+# Теги собираются до commit (после него события уже переданы в брокер),
+# а сбрасываются после, чтобы новый ответ не построился по старым данным
+@event.listens_for(Session, "before_commit")
+def collect_tags(session):
+    changes = session.info.get(events.PENDING_EVENTS)
+    if changes:
+        tags = session.info.setdefault(PENDING_TAGS, set())
+        for change in changes:
+            tags |= _change_tags(change)
+
+@event.listens_for(Session, "after_commit")
+def invalidate_pending(session):
+    tags = session.info.pop(PENDING_TAGS, None)
+    if tags:
+        response_cache.invalidate_tags(tags)
+
+@event.listens_for(Session, "after_transaction_end")
+def discard_pending(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_TAGS, None)
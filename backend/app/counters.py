@@ -0,0 +1,211 @@
+import argparse
+import sys
+from collections import defaultdict
+from sqlalchemy import event, func, inspect, literal, literal_column, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import models
+
+# Материализованные счётчики задач (таблица task_counters) поддерживаются
+# инкрементально по событиям сессии: на каждую вставку, изменение и удаление
+# задачи применяются дельты к строкам областей «all», «project» и «assignee»
+# в разрезе статуса и приоритета в той же транзакции.
+
+TRACKED_ATTRS = ("status", "priority", "project_id", "assigned_user_id", "estimated_time", "time_spent")
+
+# Старые значения нужны для вычитания дельты, даже если атрибут истёк после commit
+def _load_old_value(target, value, oldvalue, initiator):
+    return value
+
+for _name in TRACKED_ATTRS:
+    event.listen(getattr(models.Task, _name), "set", _load_old_value, active_history=True, retval=True)
+
+def _task_keys(project_id, assigned_user_id, status, priority):
+    status = status or models.TaskStatus.new
+    priority = priority or models.TaskPriority.medium
+    keys = [("all", 0, status, priority)]
+    if project_id is not None:
+        keys.append(("project", project_id, status, priority))
+    if assigned_user_id is not None:
+        keys.append(("assignee", assigned_user_id, status, priority))
+    return keys
+
+def _current(task):
+    return {name: getattr(task, name) for name in TRACKED_ATTRS}
+
+def _previous(task):
+    state = inspect(task)
+    values = {}
+    for name in TRACKED_ATTRS:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            values[name] = getattr(task, name)
+    return values
+
+def _add(deltas, values, sign):
+    keys = _task_keys(values["project_id"], values["assigned_user_id"], values["status"], values["priority"])
+    for key in keys:
+        delta = deltas[key]
+        delta[0] += sign
+        delta[1] += sign * (values["estimated_time"] or 0.0)
+        delta[2] += sign * (values["time_spent"] or 0.0)
+
+def _upsert(connection, key, task_count, estimated_time, time_spent):
+    table = models.TaskCounter.__table__
+    scope, scope_id, status, priority = key
+    values = dict(scope=scope, scope_id=scope_id, status=status, priority=priority,
+                  task_count=task_count, estimated_time=estimated_time, time_spent=time_spent)
+    increments = dict(
+        task_count=table.c.task_count + task_count,
+        estimated_time=table.c.estimated_time + estimated_time,
+        time_spent=table.c.time_spent + time_spent,
+    )
+    conflict_columns = ["scope", "scope_id", "status", "priority"]
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = insert(table).values(**values)\
+            .on_conflict_do_update(index_elements=conflict_columns, set_=increments)
+        connection.execute(statement)
+        return
+    updated = connection.execute(
+        table.update()
+        .where(table.c.scope == scope, table.c.scope_id == scope_id,
+               table.c.status == status, table.c.priority == priority)
+        .values(**increments)
+    )
+    if updated.rowcount == 0:
+        connection.execute(table.insert().values(**values))
+
+def apply_deltas(connection, deltas):
+    for key, (task_count, estimated_time, time_spent) in deltas.items():
+        if task_count or estimated_time or time_spent:
+            _upsert(connection, key, task_count, estimated_time, time_spent)
+
+# Массовые операции (app.crud.bulk_*) обходят события сессии и передают
+# пары значений TRACKED_ATTRS «до» и «после»; None — строки нет
+def apply_changes(connection, changes):
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for previous, current in changes:
+        if previous is not None:
+            _add(deltas, previous, -1)
+        if current is not None:
+            _add(deltas, current, 1)
+    apply_deltas(connection, deltas)
+
+@event.listens_for(Session, "after_flush")
+def track_task_changes(session, flush_context):
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for obj in session.new:
+        if isinstance(obj, models.Task):
+            _add(deltas, _current(obj), 1)
+    for obj in session.dirty:
+        if isinstance(obj, models.Task) and session.is_modified(obj):
+            previous, current = _previous(obj), _current(obj)
+            if previous != current:
+                _add(deltas, previous, -1)
+                _add(deltas, current, 1)
+    for obj in session.deleted:
+        if isinstance(obj, models.Task):
+            _add(deltas, _previous(obj), -1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+# Снимок счётчиков по живой таблице tasks: используется для пересборки,
+# проверки и для массовых операций, которые обходят события сессии
+def aggregate(db: Session, condition=None):
+    task = models.Task
+    scope_columns = {
+        "all": None,
+        "project": task.project_id,
+        "assignee": task.assigned_user_id,
+    }
+    selects = []
+    for scope, scope_id in scope_columns.items():
+        select = db.query(
+            literal(scope).label("scope"),
+            (scope_id if scope_id is not None else literal_column("0")).label("scope_id"),
+            task.status, task.priority,
+            func.count(task.id), func.coalesce(func.sum(task.estimated_time), 0.0),
+            func.coalesce(func.sum(task.time_spent), 0.0),
+        )
+        group_by = [task.status, task.priority]
+        if scope_id is not None:
+            select = select.filter(scope_id.isnot(None))
+            group_by.insert(0, scope_id)
+        if condition is not None:
+            select = select.filter(condition)
+        selects.append(select.group_by(*group_by).statement)
+    result = {}
+    for scope, scope_id, status, priority, task_count, estimated_time, time_spent in db.execute(union_all(*selects)):
+        status = status if isinstance(status, models.TaskStatus) else models.TaskStatus[status]
+        priority = priority if isinstance(priority, models.TaskPriority) else models.TaskPriority[priority]
+        result[(scope, scope_id, status, priority)] = [task_count, float(estimated_time), float(time_spent)]
+    return result
+
+def diff(before, after):
+    deltas = {}
+    for key in set(before) | set(after):
+        old = before.get(key, [0, 0.0, 0.0])
+        new = after.get(key, [0, 0.0, 0.0])
+        deltas[key] = [n - o for n, o in zip(new, old)]
+    return deltas
+
+def stored(db: Session):
+    counters = db.query(models.TaskCounter).all()
+    return {
+        (c.scope, c.scope_id, c.status, c.priority): [c.task_count, c.estimated_time, c.time_spent]
+        for c in counters if c.task_count
+    }
+
+def rebuild(db: Session):
+    db.query(models.TaskCounter).delete(synchronize_session=False)
+    apply_deltas(db.connection(), aggregate(db))
+    db.commit()
+
+def verify(db: Session):
+    expected = aggregate(db)
+    actual = stored(db)
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        exp = expected.get(key, [0, 0.0, 0.0])
+        act = actual.get(key, [0, 0.0, 0.0])
+        if exp[0] != act[0] or abs(exp[1] - act[1]) > 1e-6 or abs(exp[2] - act[2]) > 1e-6:
+            mismatches.append((key, exp, act))
+    return mismatches
+
+# Первичное заполнение для базы, созданной до появления счётчиков
+def ensure_built(db: Session):
+    if db.query(models.TaskCounter.id).first() is None and db.query(models.Task.id).first() is not None:
+        rebuild(db)
+
+def read(db: Session, scope: str = "all", scope_id: int = 0):
+    return db.query(models.TaskCounter)\
+             .filter(models.TaskCounter.scope == scope, models.TaskCounter.scope_id == scope_id)\
+             .all()
+
+def main(argv=None):
+    from app.database import SessionLocal
+    parser = argparse.ArgumentParser(description="Обслуживание счётчиков задач")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args(argv)
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            rebuild(db)
+            print("Счётчики пересобраны")
+            return 0
+        mismatches = verify(db)
+        for key, expected, actual in mismatches:
+            print(f"{key}: ожидалось {expected}, сохранено {actual}")
+        print("Расхождений нет" if not mismatches else f"Расхождений: {len(mismatches)}")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
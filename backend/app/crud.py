@@ -1,24 +1,61 @@
-from sqlalchemy.orm import Session, joinedload
-from app import models, schemas
-from passlib.context import CryptContext
-from typing import List
-
-pwd_context = PasslibContext = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from datetime import datetime
+from sqlalchemy import and_, case, exists, func, literal, or_, select, union
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
+from sqlalchemy.inspection import inspect
+from pydantic import BaseModel
+from app import cache, counters, events, models, notifications, schemas, search
+from app.config import TASK_BULK_MAX_ITEMS
+from app.principals import invalidate_user
+from app.pagination import PageParams, paginate, paginate_ranked
+from typing import List, Optional, Type
+
+# План загрузки связей, выведенный из схемы ответа: каждая связь модели,
+# которую сериализует схема, загружается заранее (selectinload для коллекций,
+# joinedload для ссылок «многие к одному»), поэтому число запросов не зависит
+# от количества строк.
+def loading_plan(model, schema: Type[BaseModel]):
+    relationships = inspect(model).relationships
+    options = []
+    for name, field in schema.__fields__.items():
+        if name not in relationships:
+            continue
+        rel = relationships[name]
+        attr = getattr(model, name)
+        loader = selectinload(attr) if rel.uselist else joinedload(attr)
+        nested = field.type_
+        if isinstance(nested, type) and issubclass(nested, BaseModel):
+            nested_plan = loading_plan(rel.mapper.class_, nested)
+            if nested_plan:
+                loader = loader.options(*nested_plan)
+        options.append(loader)
+    return options
+
+TASK_READ_PLAN = loading_plan(models.Task, schemas.TaskRead)
+USER_READ_PLAN = loading_plan(models.User, schemas.UserRead)
+COMMENT_READ_PLAN = loading_plan(models.Comment, schemas.CommentRead)
+PROJECT_MEMBER_PLAN = loading_plan(models.User, schemas.ProjectMember)
+PROJECT_TASK_PLAN = loading_plan(models.Task, schemas.ProjectTask)
 
 def get_user(db: Session, user_id: int):
     return db.query(models.User)\
-             .options(joinedload(models.User.assigned_tasks))\
+             .options(*USER_READ_PLAN)\
              .filter(models.User.id == user_id)\
              .first()
 
 def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+    return db.query(models.User)\
+             .options(joinedload(models.User.role))\
+             .filter(models.User.username == username)\
+             .first()
+
+def user_exists(db: Session, user_id: int) -> bool:
+    return db.query(models.User.id).filter(models.User.id == user_id).first() is not None
 
-def get_users(db: Session):
-    return db.query(models.User).all()
+def get_users(db: Session, page: Optional[PageParams] = None):
+    return paginate(db.query(models.User).options(*USER_READ_PLAN), models.User, page)
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+# Пароль хэшируется вызывающей стороной через app.hashing
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
     role = db.query(models.Role).filter(models.Role.name == user.role).first()
     if not role:
         raise ValueError("Указанная роль не существует")
@@ -30,32 +67,57 @@ def create_user(db: Session, user: schemas.UserCreate):
         role=role
     )
     db.add(db_user)
+    cache.invalidate(db, "users")
     db.commit()
-    db.refresh(db_user)
-    return db_user
-
-def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
+    return get_user(db, db_user.id)
+
+# Пользователь входит в ответы по задачам (исполнитель, автор, автор
+# комментария) и в детали проектов (руководитель, участник): при его
+# изменении или удалении эти задачи и проекты получают события ленты,
+# а с ними новые версии для ETag (app.etags)
+def _emit_user_change(db: Session, user_id: int):
+    commented = select(models.Comment.task_id).where(models.Comment.user_id == user_id)
+    tasks = db.query(models.Task.id, models.Task.project_id, models.Task.assigned_user_id)\
+              .filter(or_(models.Task.assigned_user_id == user_id,
+                          models.Task.creator_id == user_id,
+                          models.Task.id.in_(commented)))\
+              .all()
+    for task in tasks:
+        events.emit(db, "task.updated", project_id=task.project_id, user_ids=[task.assigned_user_id],
+                    task_id=task.id, fields=["users"])
+    participated = select(models.project_participants.c.project_id)\
+        .where(models.project_participants.c.user_id == user_id)
+    projects = db.query(models.Project.id)\
+                 .filter(or_(models.Project.leader_id == user_id, models.Project.id.in_(participated)))
+    for project_id, in projects:
+        events.emit(db, "project.updated", project_id=project_id, user_ids=[user_id])
+
+def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate, hashed_password: Optional[str] = None):
     user = get_user(db, user_id)
     if user:
+        if user_update.full_name is not None or user_update.email is not None or user_update.role is not None:
+            _emit_user_change(db, user_id)
         if user_update.full_name is not None:
             user.full_name = user_update.full_name
         if user_update.email is not None:
             user.email = user_update.email
-        if user_update.password is not None:
-            user.hashed_password = pwd_context.hash(user_update.password)
+        if hashed_password is not None:
+            user.hashed_password = hashed_password
         if user_update.role is not None:
             role = db.query(models.Role).filter(models.Role.name == user_update.role).first()
             if role:
                 user.role = role
+        cache.invalidate(db, "users")
         db.commit()
-        db.refresh(user)
+        invalidate_user(user_id)
+        user = get_user(db, user_id)
     return user
 
 def get_project(db: Session, project_id: int):
     return db.query(models.Project).filter(models.Project.id == project_id).first()
 
-def get_projects(db: Session):
-    return db.query(models.Project).all()
+def get_projects(db: Session, page: Optional[PageParams] = None):
+    return paginate(db.query(models.Project), models.Project, page)
 
 def create_project(db: Session, project: schemas.ProjectCreate):
     db_project = models.Project(
@@ -63,26 +125,50 @@ def create_project(db: Session, project: schemas.ProjectCreate):
         description=project.description
     )
     db.add(db_project)
+    db.flush()
+    events.emit(db, "project.created", project_id=db_project.id)
     db.commit()
     db.refresh(db_project)
     return db_project
 
-def get_project_with_details(db: Session, project_id: int):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+# Участники проекта и исполнители его задач одним запросом (UNION)
+def get_project_participants(db: Session, project_id: int):
+    members = select(models.project_participants.c.user_id.label("user_id"))\
+        .where(models.project_participants.c.project_id == project_id)
+    assignees = select(models.Task.assigned_user_id)\
+        .where(models.Task.project_id == project_id, models.Task.assigned_user_id.isnot(None))
+    user_ids = union(members, assignees).subquery()
+    return db.query(models.User)\
+             .options(*PROJECT_MEMBER_PLAN)\
+             .join(user_ids, user_ids.c.user_id == models.User.id)\
+             .order_by(models.User.id)\
+             .all()
+
+# Детали проекта для schemas.ProjectDetail и курсор следующей страницы
+# задач; None, если проекта нет. Число запросов не зависит от числа задач.
+def get_project_with_details(db: Session, project_id: int, page: Optional[PageParams] = None,
+                             fields: Optional[List[str]] = None):
+    project = db.query(models.Project)\
+        .options(joinedload(models.Project.leader).options(*PROJECT_MEMBER_PLAN))\
+        .filter(models.Project.id == project_id)\
+        .first()
     if not project:
-        return None
-
-    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
-
-    participants_set = set(project.participants)
-
-    for task in tasks:
-        if task.assigned_user and task.assigned_user not in participants_set:
-            participants_set.add(task.assigned_user)
-
-    participants = list(participants_set)
-
-    return project, tasks, participants
+        return None, None
+
+    tasks = db.query(models.Task).options(*PROJECT_TASK_PLAN) if fields is None else task_query(db, fields)
+    tasks, next_cursor = paginate(tasks.filter(models.Task.project_id == project_id), models.Task, page)
+
+    detail = {
+        "id": project.id,
+        "name": project.name,
+        "description": project.description,
+        "created_at": project.created_at,
+        "leader": project.leader,  # будет None, если не назначен
+        "task_summary": get_task_stats(db, project_id),
+        "tasks": tasks,
+        "participants": get_project_participants(db, project_id),
+    }
+    return detail, next_cursor
 
 def add_participant_to_project(db: Session, project_id: int, user_id: int):
     project = get_project(db, project_id)
@@ -95,15 +181,164 @@ def add_participant_to_project(db: Session, project_id: int, user_id: int):
     if user in project.participants:
         return project  # пользователь уже есть
     project.participants.append(user)
+    events.emit(db, "project.participant_added", project_id=project_id, user_ids=[user_id])
     db.commit()
     db.refresh(project)
     return project
 
 def get_task(db: Session, task_id: int):
-    return db.query(models.Task).filter(models.Task.id == task_id).first()
+    return db.query(models.Task)\
+             .options(*TASK_READ_PLAN)\
+             .filter(models.Task.id == task_id)\
+             .first()
 
-def get_tasks(db: Session):
-    return db.query(models.Task).all()
+def task_exists(db: Session, task_id: int) -> bool:
+    return db.query(models.Task.id).filter(models.Task.id == task_id).first() is not None
+
+# Поддерево задач одним рекурсивным запросом: корни по условию roots
+# (depth = 0) и их подзадачи на всех уровнях, но не глубже max_depth
+def subtree_cte(roots, max_depth: Optional[int] = None):
+    tree = select(models.Task.id, literal(0).label("depth"))\
+        .where(roots)\
+        .cte("subtree", recursive=True)
+    children = select(models.Task.id, (tree.c.depth + 1).label("depth"))\
+        .where(models.Task.parent_task_id == tree.c.id)
+    if max_depth is not None:
+        children = children.where(tree.c.depth < max_depth)
+    return tree.union_all(children)
+
+TREE_COLUMNS = (
+    models.Task.id, models.Task.description, models.Task.status, models.Task.priority,
+    models.Task.parent_task_id, models.Task.assigned_user_id, models.Task.due_date,
+    models.Task.estimated_time, models.Task.time_spent,
+)
+
+# Строки поддерева в порядке уровней; subtasks_truncated отмечает задачи
+# на границе max_depth, у которых есть невыгруженные подзадачи
+def get_task_tree_rows(db: Session, task_id: int, max_depth: int):
+    tree = subtree_cte(models.Task.id == task_id, max_depth)
+    child = aliased(models.Task)
+    truncated = and_(tree.c.depth == max_depth,
+                     exists().where(child.parent_task_id == models.Task.id))
+    return db.query(*TREE_COLUMNS, tree.c.depth, truncated.label("subtasks_truncated"))\
+             .join(tree, tree.c.id == models.Task.id)\
+             .order_by(tree.c.depth, models.Task.id)\
+             .all()
+
+# Дерево задачи вложенными словарями (schemas.TaskTreeNode); None, если
+# задачи нет. Итоги считаются снизу вверх, от самого глубокого уровня.
+def get_task_tree(db: Session, task_id: int, max_depth: int):
+    rows = get_task_tree_rows(db, task_id, max_depth)
+    if not rows:
+        return None
+    nodes = {}
+    for row in rows:
+        node = dict(row._mapping)
+        node["estimated_time"] = node["estimated_time"] or 0.0
+        node["time_spent"] = node["time_spent"] or 0.0
+        node.update(
+            total_estimated_time=node["estimated_time"],
+            total_time_spent=node["time_spent"],
+            task_count=1,
+            completed_count=1 if node["status"] == models.TaskStatus.completed else 0,
+            subtasks=[],
+        )
+        nodes[node["id"]] = node
+    for row in reversed(rows):
+        node = nodes[row.id]
+        node["completion_percent"] = round(100.0 * node["completed_count"] / node["task_count"], 1)
+        if row.depth == 0:
+            continue
+        parent = nodes[row.parent_task_id]
+        parent["subtasks"].insert(0, node)
+        for key in ("total_estimated_time", "total_time_spent", "task_count", "completed_count"):
+            parent[key] += node[key]
+    return nodes[task_id]
+
+# Удаление задач вместе со всеми подзадачами без загрузки объектов в сессию;
+# комментарии и вложения удаляет база данных по ON DELETE CASCADE. Строки
+# поддерева читаются только в объёме, нужном для счётчиков (app.counters).
+def delete_subtrees(db: Session, roots) -> int:
+    tree = subtree_cte(roots)
+    removed = db.query(*BULK_TASK_COLUMNS, models.Task.parent_task_id)\
+                .filter(models.Task.id.in_(select(tree.c.id)))\
+                .all()
+    if not removed:
+        return 0
+    db.query(models.Task)\
+      .filter(models.Task.id.in_(select(tree.c.id)))\
+      .delete(synchronize_session=False)
+    counters.apply_changes(db.connection(), [(_tracked(row), None) for row in removed])
+    for row in removed:
+        events.emit(db, "task.deleted", project_id=row.project_id, user_ids=[row.assigned_user_id], task_id=row.id,
+                    parent_task_id=row.parent_task_id)
+    return len(removed)
+
+def filter_tasks(query, filters: Optional[schemas.TaskFilter]):
+    if filters is None:
+        return query
+    if filters.status is not None:
+        query = query.filter(models.Task.status == filters.status)
+    if filters.priority is not None:
+        query = query.filter(models.Task.priority == filters.priority)
+    if filters.project_id is not None:
+        query = query.filter(models.Task.project_id == filters.project_id)
+    if filters.assigned_user_id is not None:
+        query = query.filter(models.Task.assigned_user_id == filters.assigned_user_id)
+    if filters.due_from is not None:
+        query = query.filter(models.Task.due_date >= filters.due_from)
+    if filters.due_to is not None:
+        query = query.filter(models.Task.due_date <= filters.due_to)
+    return query
+
+# Полный граф TaskRead или, если заданы fields, выборка только скалярных
+# колонок: строки не попадают в identity map и не тянут связи
+def task_query(db: Session, fields: Optional[List[str]] = None):
+    if fields is None:
+        return db.query(models.Task).options(*TASK_READ_PLAN)
+    return db.query(*[getattr(models.Task, name) for name in fields])
+
+def get_tasks(db: Session, filters: Optional[schemas.TaskFilter] = None, page: Optional[PageParams] = None,
+              fields: Optional[List[str]] = None):
+    query = filter_tasks(task_query(db, fields), filters)
+    return paginate(query, models.Task, page)
+
+def get_tasks_by_assignee(db: Session, user_id: int, filters: Optional[schemas.TaskFilter] = None,
+                          page: Optional[PageParams] = None, fields: Optional[List[str]] = None):
+    query = filter_tasks(task_query(db, fields), filters)\
+        .filter(models.Task.assigned_user_id == user_id)
+    return paginate(query, models.Task, page)
+
+# Версии для условных запросов (app.etags): только ключи и номера версий,
+# без загрузки объектов; для списков — та же страница, что и в выдаче
+VERSION_COLUMNS = ("id", "version", "updated_at", "created_at")
+
+def _version_query(db: Session, model):
+    return db.query(*[getattr(model, name) for name in VERSION_COLUMNS])
+
+def get_task_version(db: Session, task_id: int):
+    return _version_query(db, models.Task).filter(models.Task.id == task_id).first()
+
+def get_task_versions(db: Session, filters: Optional[schemas.TaskFilter] = None, page: Optional[PageParams] = None,
+                      assignee_id: Optional[int] = None):
+    query = filter_tasks(_version_query(db, models.Task), filters)
+    if assignee_id is not None:
+        query = query.filter(models.Task.assigned_user_id == assignee_id)
+    return paginate(query, models.Task, page)
+
+def get_project_version(db: Session, project_id: int):
+    return _version_query(db, models.Project).filter(models.Project.id == project_id).first()
+
+def get_project_versions(db: Session, page: Optional[PageParams] = None):
+    return paginate(_version_query(db, models.Project), models.Project, page)
+
+# Выгрузка (app.exports): только колонки, в порядке id
+def export_tasks_query(db: Session, fields: List[str], filters: Optional[schemas.TaskFilter] = None,
+                       assignee_id: Optional[int] = None):
+    query = filter_tasks(task_query(db, fields), filters)
+    if assignee_id is not None:
+        query = query.filter(models.Task.assigned_user_id == assignee_id)
+    return query.order_by(models.Task.id)
 
 def create_task(db: Session, task: schemas.TaskCreate, creator_id: int):
     db_task = models.Task(
@@ -116,65 +351,271 @@ def create_task(db: Session, task: schemas.TaskCreate, creator_id: int):
         assigned_user_id=task.assigned_user_id,
         creator_id=creator_id,
         parent_task_id=task.parent_task_id,
+        assignment_date=datetime.utcnow() if task.assigned_user_id else None,
     )
     db.add(db_task)
+    db.flush()
+    events.emit(db, "task.created", project_id=db_task.project_id, user_ids=[db_task.assigned_user_id],
+                task_id=db_task.id)
+    notifications.notify(db, [db_task.assigned_user_id], _assigned_message(db_task.id, db_task.description),
+                         task_id=db_task.id, actor_id=creator_id)
     db.commit()
-    db.refresh(db_task)
-    return db_task
-
-def update_task(db: Session, task: models.Task, task_update: schemas.TaskUpdate):
-    for key, value in task_update.dict(exclude_unset=True).items():
+    return get_task(db, db_task.id)
+
+# Тексты уведомлений по электронной почте (app.notifications)
+TASK_FIELD_NAMES = {
+    "status": "статус",
+    "priority": "приоритет",
+    "description": "описание",
+    "details": "подробности",
+    "estimated_time": "оценка времени",
+    "time_spent": "затраченное время",
+    "assigned_user_id": "исполнитель",
+}
+
+def _assigned_message(task_id: int, description: str) -> str:
+    return f"Вам назначена задача #{task_id}: {description}"
+
+def _changed_message(task_id: int, description: str, changes: dict) -> str:
+    names = ", ".join(TASK_FIELD_NAMES.get(name, name) for name in sorted(changes))
+    status = changes.get("status")
+    suffix = f" (статус: {status.value})" if status is not None else ""
+    return f"Задача #{task_id} «{description}» изменена: {names}{suffix}"
+
+# Об изменении задачи уведомляются исполнитель и автор, кроме того, кто её изменил
+def update_task(db: Session, task: models.Task, task_update: schemas.TaskUpdate, actor_id: Optional[int] = None):
+    changes = task_update.dict(exclude_unset=True)
+    for key, value in changes.items():
         setattr(task, key, value)
+    # Пустое изменение не меняет версию задачи и не сбрасывает кэш
+    if changes:
+        events.emit(db, "task.updated", project_id=task.project_id, user_ids=[task.assigned_user_id],
+                    task_id=task.id, fields=sorted(changes))
+        notifications.notify(db, [task.assigned_user_id, task.creator_id],
+                             _changed_message(task.id, task.description, changes),
+                             task_id=task.id, actor_id=actor_id)
+    db.commit()
+    return get_task(db, task.id)
+
+# Массовые операции с задачами выполняются одним INSERT/UPDATE/DELETE на
+# весь набор в одной транзакции. Ссылки и права проверяются одним запросом
+# на набор; задачи, не прошедшие проверку, попадают в errors и пропускаются,
+# остальные применяются. Счётчики (app.counters) обновляются по выбранным
+# строкам, так как массовые запросы не вызывают событий сессии.
+BULK_TASK_COLUMNS = (models.Task.id, models.Task.description, models.Task.creator_id)\
+    + tuple(getattr(models.Task, name) for name in counters.TRACKED_ATTRS)
+
+def _existing_ids(db: Session, column, values):
+    values = {value for value in values if value is not None}
+    if not values:
+        return set()
+    return {value for value, in db.query(column).filter(column.in_(values))}
+
+def _tracked(row):
+    return {name: getattr(row, name) for name in counters.TRACKED_ATTRS}
+
+def _tracked_values(values: dict):
+    return {name: values.get(name) for name in counters.TRACKED_ATTRS}
+
+def bulk_create_tasks(db: Session, tasks: List[schemas.TaskCreate], creator_id: int):
+    projects = _existing_ids(db, models.Project.id, [task.project_id for task in tasks])
+    users = _existing_ids(db, models.User.id, [task.assigned_user_id for task in tasks])
+    parents = _existing_ids(db, models.Task.id, [task.parent_task_id for task in tasks])
+    now = datetime.utcnow()
+    rows, errors = [], []
+    for index, task in enumerate(tasks):
+        if task.project_id not in projects:
+            errors.append(schemas.TaskBulkError(index=index, detail="Проект не найден"))
+        elif task.assigned_user_id is not None and task.assigned_user_id not in users:
+            errors.append(schemas.TaskBulkError(index=index, detail="Пользователь не найден"))
+        elif task.parent_task_id is not None and task.parent_task_id not in parents:
+            errors.append(schemas.TaskBulkError(index=index, detail="Родительская задача не найдена"))
+        else:
+            rows.append(dict(
+                description=task.description,
+                details=task.details,
+                due_date=task.due_date,
+                status=models.TaskStatus.new,
+                priority=task.priority,
+                estimated_time=task.estimated_time,
+                time_spent=0.0,
+                project_id=task.project_id,
+                assigned_user_id=task.assigned_user_id,
+                creator_id=creator_id,
+                parent_task_id=task.parent_task_id,
+                assignment_date=now if task.assigned_user_id else None,
+                created_at=now,
+            ))
+    if rows:
+        # return_defaults возвращает id строк: в PostgreSQL пакетами через
+        # RETURNING, в SQLite по одной строке внутри той же транзакции
+        db.bulk_insert_mappings(models.Task, rows, return_defaults=True)
+        counters.apply_changes(db.connection(), [(None, _tracked_values(row)) for row in rows])
+        for row in rows:
+            events.emit(db, "task.created", project_id=row["project_id"], user_ids=[row["assigned_user_id"]],
+                        task_id=row["id"])
+            notifications.notify(db, [row["assigned_user_id"]], _assigned_message(row["id"], row["description"]),
+                                 task_id=row["id"], actor_id=creator_id)
     db.commit()
-    db.refresh(task)
-    return task
+    return schemas.TaskBulkResult(ids=[row["id"] for row in rows], errors=errors)
+
+# Задачи, выбранные списком ids или фильтром. only_assignee ограничивает
+# выбор задачами исполнителя; чужие задачи из списка ids попадают в errors.
+def _bulk_targets(db: Session, selection: schemas.TaskBulkSelection, only_assignee: Optional[int] = None):
+    query = db.query(*BULK_TASK_COLUMNS)
+    if selection.ids is None:
+        query = filter_tasks(query, selection.filter)
+        if only_assignee is not None:
+            query = query.filter(models.Task.assigned_user_id == only_assignee)
+        rows = query.order_by(models.Task.id).limit(TASK_BULK_MAX_ITEMS + 1).all()
+        if len(rows) > TASK_BULK_MAX_ITEMS:
+            raise ValueError(f"Фильтру соответствует больше {TASK_BULK_MAX_ITEMS} задач, уточните условия")
+        return rows, []
+    found = {row.id: row for row in query.filter(models.Task.id.in_(selection.ids))}
+    rows, errors = [], []
+    for task_id in dict.fromkeys(selection.ids):
+        row = found.get(task_id)
+        if row is None:
+            errors.append(schemas.TaskBulkError(id=task_id, detail="Задача не найдена"))
+        elif only_assignee is not None and row.assigned_user_id != only_assignee:
+            errors.append(schemas.TaskBulkError(id=task_id, detail="Нет прав на изменение этой задачи"))
+        else:
+            rows.append(row)
+    return rows, errors
+
+def bulk_update_tasks(db: Session, selection: schemas.TaskBulkUpdate, only_assignee: Optional[int] = None,
+                      actor_id: Optional[int] = None):
+    rows, errors = _bulk_targets(db, selection, only_assignee)
+    values = selection.changes.dict(exclude_unset=True)
+    ids = [row.id for row in rows]
+    if ids:
+        update = dict(values)
+        if values.get("assigned_user_id") is not None:
+            update["assignment_date"] = datetime.utcnow()
+        db.query(models.Task)\
+          .filter(models.Task.id.in_(ids))\
+          .update(update, synchronize_session=False)
+        counters.apply_changes(db.connection(), [(_tracked(row), {**_tracked(row), **values}) for row in rows])
+        for row in rows:
+            # При переназначении событие получают прежний и новый исполнитель
+            assignees = [row.assigned_user_id, values.get("assigned_user_id", row.assigned_user_id)]
+            events.emit(db, "task.updated", project_id=row.project_id, user_ids=assignees,
+                        task_id=row.id, fields=sorted(values))
+            if assignees[1] != row.assigned_user_id:
+                notifications.notify(db, [assignees[1]], _assigned_message(row.id, row.description),
+                                     task_id=row.id, actor_id=actor_id)
+            notifications.notify(db, [row.assigned_user_id, row.creator_id],
+                                 _changed_message(row.id, row.description, values),
+                                 task_id=row.id, actor_id=actor_id)
+    db.commit()
+    return schemas.TaskBulkResult(ids=ids, errors=errors)
+
+def bulk_delete_tasks(db: Session, selection: schemas.TaskBulkSelection):
+    rows, errors = _bulk_targets(db, selection)
+    ids = [row.id for row in rows]
+    if ids:
+        delete_subtrees(db, models.Task.id.in_(ids))
+    db.commit()
+    return schemas.TaskBulkResult(ids=ids, errors=errors)
+
+# Событие об изменении внутри задачи (комментарии, вложения) адресуется
+# проекту и исполнителю задачи; возвращает строку задачи для уведомлений
+def _emit_task_change(db: Session, type: str, task_id: int, **data):
+    scope = db.query(models.Task.project_id, models.Task.assigned_user_id,
+                     models.Task.creator_id, models.Task.description)\
+              .filter(models.Task.id == task_id)\
+              .first()
+    project_id, assigned_user_id = (scope.project_id, scope.assigned_user_id) if scope else (None, None)
+    events.emit(db, type, project_id=project_id, user_ids=[assigned_user_id], task_id=task_id, **data)
+    return scope
 
 def create_comment(db: Session, comment: schemas.CommentCreate, user_id: int, task_id: int):
     db_comment = models.Comment(content=comment.content, user_id=user_id, task_id=task_id)
     db.add(db_comment)
+    db.flush()
+    task = _emit_task_change(db, "comment.created", task_id, comment_id=db_comment.id)
+    if task:
+        notifications.notify(db, [task.assigned_user_id, task.creator_id],
+                             f"Новый комментарий к задаче #{task_id} «{task.description}»: {comment.content[:200]}",
+                             task_id=task_id, actor_id=user_id)
     db.commit()
-    db.refresh(db_comment)
-    return db_comment
+    return db.query(models.Comment)\
+             .options(*COMMENT_READ_PLAN)\
+             .filter(models.Comment.id == db_comment.id)\
+             .first()
 
 def get_comments_by_task(db: Session, task_id: int):
     return db.query(models.Comment).filter(models.Comment.task_id == task_id).all()
 
-def create_attachment(db: Session, attachment: schemas.AttachmentCreate, task_id: int, file_url: str):
+def create_attachment(db: Session, attachment: schemas.AttachmentCreate, task_id: int, file_url: str,
+                      size: Optional[int] = None, sha256: Optional[str] = None,
+                      content_type: Optional[str] = None):
     db_attachment = models.Attachment(
         filename=attachment.filename,
         file_url=file_url,
-        task_id=task_id
+        task_id=task_id,
+        size=size,
+        sha256=sha256,
+        content_type=content_type,
     )
     db.add(db_attachment)
+    db.flush()
+    _emit_task_change(db, "attachment.created", task_id, attachment_id=db_attachment.id)
     db.commit()
     db.refresh(db_attachment)
     return db_attachment
 
+def get_attachment(db: Session, task_id: int, attachment_id: int):
+    return db.query(models.Attachment)\
+             .filter(models.Attachment.id == attachment_id, models.Attachment.task_id == task_id)\
+             .first()
+
+def delete_attachment(db: Session, task_id: int, attachment_id: int):
+    attachment = db.query(models.Attachment)\
+        .filter(models.Attachment.id == attachment_id, models.Attachment.task_id == task_id)\
+        .first()
+    if attachment:
+        db.delete(attachment)
+        _emit_task_change(db, "attachment.deleted", task_id, attachment_id=attachment_id)
+        db.commit()
+        return True
+    return False
+
 def get_attachments_by_task(db: Session, task_id: int):
     return db.query(models.Attachment).filter(models.Attachment.task_id == task_id).all()
 
 def create_subtask(db: Session, task: schemas.TaskCreate, creator_id: int):
     return create_task(db, task, creator_id)
 
-def search_tasks(db: Session, query: str):
-    return (
-        db.query(models.Task)
-        .filter(models.Task.description.ilike(f"%{query}%"))
-        .all()
-    )
-
-def search_projects(db: Session, query: str):
-    return (
-        db.query(models.Project)
-        .filter(models.Project.name.ilike(f"%{query}%"))
-        .all()
-    )
+# Поиск по полнотекстовому индексу (app.search); по умолчанию результаты
+# упорядочены по релевантности, sort=created_at/id даёт обычную выдачу.
+# Запрос без слов, как и прежде, возвращает все записи.
+def _search_results(query, model, matches, page: Optional[PageParams]):
+    if matches is not None:
+        query = query.join(matches, matches.c.id == model.id)
+    if page is None or page.sort == "rank":
+        rank = matches.c.rank if matches is not None else model.id
+        return paginate_ranked(query, rank, model.id, page)
+    return paginate(query, model, page)
+
+def search_tasks(db: Session, query: str, filters: Optional[schemas.TaskFilter] = None,
+                 page: Optional[PageParams] = None, fields: Optional[List[str]] = None):
+    tasks = filter_tasks(task_query(db, fields), filters)
+    return _search_results(tasks, models.Task, search.match_tasks(db, query), page)
+
+def search_projects(db: Session, query: str, page: Optional[PageParams] = None):
+    projects = db.query(models.Project)
+    return _search_results(projects, models.Project, search.match_projects(db, query), page)
 
 def delete_user(db: Session, user_id: int):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if user:
+        _emit_user_change(db, user_id)
         db.delete(user)
+        # Задачи пользователя остаются без исполнителя
+        cache.invalidate(db, "users", "tasks")
         db.commit()
+        invalidate_user(user_id)
         return True
     return False
 
@@ -182,29 +623,26 @@ def delete_project(db: Session, project_id: int):
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if project:
         db.delete(project)
+        events.emit(db, "project.deleted", project_id=project_id)
         db.commit()
         return True
     return False
 
 def delete_task(db: Session, task_id: int):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if task:
-        db.delete(task)
-        db.commit()
-        return True
-    return False
+    deleted = delete_subtrees(db, models.Task.id == task_id)
+    db.commit()
+    return deleted > 0
 
-def assign_leader(db: Session, project_id: int, user_id: int):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
-        return None
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        return None
-    project.leader_id = user_id
+def assign_leader(db: Session, project_id: int, user_id: int) -> bool:
+    if not user_exists(db, user_id):
+        return False
+    updated = db.query(models.Project)\
+                .filter(models.Project.id == project_id)\
+                .update({"leader_id": user_id}, synchronize_session=False)
+    if updated:
+        events.emit(db, "project.leader_changed", project_id=project_id, user_ids=[user_id])
     db.commit()
-    db.refresh(project)
-    return project
+    return updated > 0
 
 def remove_participant_from_project(db: Session, project_id: int, user_id: int):
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
@@ -215,6 +653,84 @@ def remove_participant_from_project(db: Session, project_id: int, user_id: int):
         return False
     if user in project.participants:
         project.participants.remove(user)
+        events.emit(db, "project.participant_removed", project_id=project_id, user_ids=[user_id])
         db.commit()
         return True
-    return False
\ No newline at end of file
+    return False
+
+# Агрегаты отчёта по задачам: все показатели считаются условной агрегацией
+# за один проход по таблице tasks. Просроченными считаются незавершённые
+# задачи со сроком раньше текущего момента.
+def task_stats_columns(now: datetime):
+    task = models.Task
+    def count_where(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+    return [
+        func.count(task.id).label("total_tasks"),
+        count_where(task.status == models.TaskStatus.completed).label("completed_tasks"),
+        count_where(task.status == models.TaskStatus.in_progress).label("in_progress_tasks"),
+        count_where(task.status == models.TaskStatus.new).label("new_tasks"),
+        count_where(and_(task.due_date < now, task.status != models.TaskStatus.completed)).label("overdue_tasks"),
+        func.coalesce(func.sum(task.estimated_time), 0.0).label("estimated_time"),
+        func.coalesce(func.sum(task.time_spent), 0.0).label("time_spent"),
+    ]
+
+# Разрезы отчёта: колонка группировки и необязательная подпись из связанной таблицы
+STATS_BREAKDOWNS = {
+    "status": (models.Task.status, None),
+    "priority": (models.Task.priority, None),
+    "project": (models.Task.project_id, models.Project.name),
+    "assignee": (models.Task.assigned_user_id, models.User.username),
+}
+
+STATUS_STATS_KEYS = {
+    models.TaskStatus.completed: "completed_tasks",
+    models.TaskStatus.in_progress: "in_progress_tasks",
+    models.TaskStatus.new: "new_tasks",
+}
+
+# Сводка читается из материализованных счётчиков; просрочка зависит от
+# текущего времени и считается отдельным запросом по индексу due_date
+def get_task_stats(db: Session, project_id: Optional[int] = None):
+    scope, scope_id = ("all", 0) if project_id is None else ("project", project_id)
+    stats = {"total_tasks": 0, "completed_tasks": 0, "in_progress_tasks": 0, "new_tasks": 0,
+             "overdue_tasks": 0, "estimated_time": 0.0, "time_spent": 0.0}
+    for counter in counters.read(db, scope, scope_id):
+        stats["total_tasks"] += counter.task_count
+        stats[STATUS_STATS_KEYS[counter.status]] += counter.task_count
+        stats["estimated_time"] += counter.estimated_time
+        stats["time_spent"] += counter.time_spent
+    overdue = db.query(func.count(models.Task.id))\
+        .filter(models.Task.due_date < datetime.utcnow(),
+                models.Task.status != models.TaskStatus.completed)
+    if project_id is not None:
+        overdue = overdue.filter(models.Task.project_id == project_id)
+    stats["overdue_tasks"] = overdue.scalar()
+    return stats
+
+# Ближайший срок незавершённой задачи, после которого изменится число
+# просроченных: до него сводку можно отдавать из кэша
+def next_overdue_at(db: Session, project_id: Optional[int] = None) -> Optional[datetime]:
+    query = db.query(func.min(models.Task.due_date))\
+              .filter(models.Task.due_date >= datetime.utcnow(),
+                      models.Task.status != models.TaskStatus.completed)
+    if project_id is not None:
+        query = query.filter(models.Task.project_id == project_id)
+    return query.scalar()
+
+def task_stats_breakdown_query(db: Session, by: str, project_id: Optional[int] = None):
+    key, label = STATS_BREAKDOWNS[by]
+    columns = [key.label("key")]
+    if label is not None:
+        columns.append(label.label("label"))
+    query = db.query(*columns, *task_stats_columns(datetime.utcnow()))
+    if by == "project":
+        query = query.outerjoin(models.Project, models.Project.id == models.Task.project_id)
+    elif by == "assignee":
+        query = query.outerjoin(models.User, models.User.id == models.Task.assigned_user_id)
+    if project_id is not None:
+        query = query.filter(models.Task.project_id == project_id)
+    return query.group_by(*columns).order_by(key)
+
+def get_task_stats_breakdown(db: Session, by: str, project_id: Optional[int] = None):
+    return [dict(row._mapping) for row in task_stats_breakdown_query(db, by, project_id).all()]
@@ -1,28 +1,203 @@
-from sqlalchemy import create_engine, event
+import asyncio
+import threading
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app import metrics
+from app.config import (
+    DATABASE_URL, DB_ASYNC, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    METRICS_ENABLED,
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE, SQLITE_JOURNAL_MODE, SQLITE_MMAP_SIZE,
+    SQLITE_READ_POOL_SIZE, SQLITE_SYNCHRONOUS, SQLITE_TEMP_STORE,
+)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"  # Замените на ваш путь к базе данных
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Асинхронные драйверы для тех же баз данных
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def _engine_options(url, is_async: bool, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW):
+    options = dict(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        # Для файловой SQLite по умолчанию используется пул без повторного
+        # использования соединений, поэтому пул задаётся явно
+        options["poolclass"] = AsyncAdaptedQueuePool if is_async else QueuePool
+    elif backend == "postgresql" and url.get_driver_name() == "psycopg2":
+        # Пакетные INSERT/UPDATE одной командой вместо построчного executemany
+        options["executemany_mode"] = "values_plus_batch"
+    return options
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+def sqlite_profile(read_only: bool):
+    pragmas = [
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+        f"PRAGMA temp_store={SQLITE_TEMP_STORE}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    else:
+        # Режим журнала хранится в файле базы и устанавливается писателем
+        pragmas.insert(0, f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+
+    def apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return apply
+
+# Время и число SQL-запросов для app.metrics
+def _instrument(target, is_async: bool):
+    if METRICS_ENABLED:
+        metrics.instrument(target.sync_engine if is_async else target)
+
+# Для SQLite создаются два движка: писатель с единственным соединением,
+# через который последовательно проходят все записи, и пул соединений
+# только для чтения, которые в режиме WAL не ждут писателя. Для других
+# баз оба имени указывают на один движок.
+def create_engines(url, is_async: bool = False):
+    url = make_url(url)
+    create = create_async_engine if is_async else create_engine
+    if url.get_backend_name() != "sqlite":
+        shared = create(url, **_engine_options(url, is_async))
+        _instrument(shared, is_async)
+        return shared, shared
+    writer = create(url, **_engine_options(url, is_async, pool_size=1, max_overflow=0))
+    reader = create(url, **_engine_options(url, is_async, pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0))
+    for target, read_only in ((writer, False), (reader, True)):
+        sync_engine = target.sync_engine if is_async else target
+        event.listen(sync_engine, "connect", sqlite_profile(read_only))
+        _instrument(target, is_async)
+    return writer, reader
 
-# Включение поддержки внешних ключей в SQLite
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+engine, read_engine = create_engines(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+if DB_ASYNC:
+    async_engine, async_read_engine = create_engines(async_url(SQLALCHEMY_DATABASE_URL), is_async=True)
+    # expire_on_commit=False: после commit объекты сериализуются без обращения к базе
+    AsyncSessionLocal = sessionmaker(
+        bind=async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+    AsyncReadSessionLocal = sessionmaker(
+        bind=async_read_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+    )
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+# Создание недостающих таблиц, колонок и индексов. create_all пропускает
+# уже существующие таблицы целиком, поэтому колонки и индексы, добавленные
+# в модели позже, проверяются отдельно. Добавляются только колонки, которые
+# допускают NULL или имеют значение по умолчанию на стороне базы.
+def ensure_schema(bind=None):
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        existing = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            present = {column["name"] for column in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present or not (column.nullable or column.server_default is not None):
+                    continue
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+# Сессия запроса: функции crud остаются синхронными и вызываются через
+# await db.run(crud.fn, ...). В асинхронном режиме они выполняются в
+# AsyncSession.run_sync поверх асинхронного драйвера, без занятия потока;
+# в синхронном — в пуле потоков Starlette.
+class AwaitableSession:
+    def __init__(self, session, gate: threading.Lock = None):
+        self.session = session
+        self.is_async = isinstance(session, AsyncSession)
+        self.gate = gate
+        self.holding = False
+
+    async def run(self, fn, *args, **kwargs):
+        if self.gate is not None and not self.holding:
+            await self._acquire_gate()
+        if self.is_async:
+            return await self.session.run_sync(lambda sync_session: fn(sync_session, *args, **kwargs))
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    async def _acquire_gate(self):
+        # Ожидание идёт в исполнителе цикла событий, а не в пуле потоков Starlette
+        waiter = asyncio.get_running_loop().run_in_executor(None, self.gate.acquire)
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            waiter.add_done_callback(lambda _: self.gate.release())
+            raise
+        self.holding = True
+
+    async def close(self):
+        try:
+            if self.is_async:
+                await self.session.close()
+            else:
+                await run_in_threadpool(self.session.close)
+        finally:
+            if self.holding:
+                self.holding = False
+                self.gate.release()
+
+    # Возвращает соединение в пул до долгой работы без базы (например, bcrypt);
+    # загруженные объекты остаются доступны, сессию можно использовать дальше
+    async def release(self):
+        await self.close()
+
+# В синхронном режиме ожидание единственного соединения писателя в пуле
+# занимало бы потоки Starlette, которые нужны его владельцу для завершения
+# запроса. Поэтому сессии записи SQLite сначала становятся в очередь.
+write_gate = threading.Lock() if engine is not read_engine else None
+
+def open_session(read_only: bool = False) -> AwaitableSession:
+    if AsyncSessionLocal is not None:
+        factory = AsyncReadSessionLocal if read_only else AsyncSessionLocal
+        return AwaitableSession(factory())
+    if read_only:
+        return AwaitableSession(ReadSessionLocal())
+    return AwaitableSession(SessionLocal(), gate=write_gate)
+
+# Читающие запросы (GET/HEAD/OPTIONS) получают соединение из пула чтения
+async def get_db(request: Request):
+    db = open_session(read_only=request.method in READ_METHODS)
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await db.close()
@@ -1,15 +1,37 @@
-from typing import List
-from fastapi import Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Query, status
 from app.auth import get_current_user
-from app.models import User, RoleEnum
+from app.models import RoleEnum
+from app.principals import Principal
+from app.schemas import TASK_SUMMARY_FIELDS
 
 def role_required(allowed_roles: List[RoleEnum]):
-    def wrapper(current_user: User = Depends(get_current_user)):
-        user_role = current_user.role.name
-        if user_role not in [role.value for role in allowed_roles]:
+    async def wrapper(current_user: Principal = Depends(get_current_user)):
+        if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Недостаточно прав для выполнения данного действия",
             )
         return current_user
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+# Режим выдачи списков задач: None для полного графа TaskRead,
+# иначе список скалярных колонок для компактных строк
+async def task_fields(
+    view: str = Query("full", regex="^(summary|full)$", description="summary — компактные строки без вложенных объектов"),
+    fields: Optional[str] = Query(None, description="Колонки через запятую, подразумевает view=summary"),
+) -> Optional[List[str]]:
+    if fields is None:
+        return list(TASK_SUMMARY_FIELDS) if view == "summary" else None
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in TASK_SUMMARY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестные поля: {', '.join(unknown)}",
+        )
+    # id и created_at нужны для курсора следующей страницы
+    for name in ("id", "created_at"):
+        if name not in selected:
+            selected.append(name)
+    return selected
@@ -0,0 +1,168 @@
+import mimetypes
+import os
+from email.utils import formatdate
+from typing import Optional, Tuple
+from urllib.parse import quote
+import anyio
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from app import blobs, models
+from app.config import DOWNLOAD_SENDFILE_HEADER, DOWNLOAD_SENDFILE_PREFIX, UPLOADS_DIR
+
+# Отдача содержимого вложений: ETag из SHA-256, условные запросы
+# (If-None-Match, If-Range), один диапазон Range (206/416) и передача файла
+# без копирования. Файл отправляет, в порядке предпочтения:
+#   - обратный прокси (nginx X-Accel-Redirect, Apache X-Sendfile), если задан
+#     DOWNLOAD_SENDFILE_HEADER, — тогда прокси сам обрабатывает Range;
+#   - ASGI-сервер через расширение http.response.zerocopysend (sendfile);
+#   - само приложение, читая файл блоками.
+
+CHUNK_SIZE = 256 * 1024
+
+# Содержимое по адресу-хэшу не меняется; private — файлы доступны только после входа
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# Вложения, загруженные до хранилища blobs, могут быть перезаписаны
+MUTABLE_CACHE_CONTROL = "private, no-cache"
+
+def _unsatisfiable(size: int):
+    return HTTPException(
+        status_code=416,
+        detail="Запрошенный диапазон недоступен",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+# Разбор заголовка Range. Поддерживается один диапазон; несколько диапазонов
+# и синтаксически неверный заголовок игнорируются, и файл отдаётся целиком.
+def parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, separator, last = spec.strip().partition("-")
+    if not separator:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise _unsatisfiable(size)
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else None
+    except ValueError:
+        return None
+    if start < 0 or end is not None and end < start:
+        return None
+    if start >= size:
+        raise _unsatisfiable(size)
+    return start, size - 1 if end is None else min(end, size - 1)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in header.split(",")]
+    plain = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(
+        (tag[2:] if tag.startswith("W/") else tag) == plain for tag in candidates
+    )
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+class FileRangeResponse(Response):
+    def __init__(self, path: str, start: int, end: int, size: int, status_code: int,
+                 headers: dict, media_type: str, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1 if size else 0
+        self.send_body = send_body
+        self.headers["content-length"] = str(self.count)
+        if status_code == 206:
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.count:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+            return
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.start)
+            remaining = self.count
+            while remaining:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+def _attachment_path(attachment: models.Attachment) -> str:
+    if attachment.sha256:
+        return blobs.blob_path(attachment.sha256)
+    # Вложения, сохранённые до хранилища blobs, лежат в uploads под исходным именем
+    return os.path.join(UPLOADS_DIR, os.path.basename(attachment.file_url))
+
+def _stat(path: str):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+async def attachment_response(request: Request, attachment: models.Attachment) -> Response:
+    path = _attachment_path(attachment)
+    stat_result = await anyio.to_thread.run_sync(_stat, path)
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Файл вложения не найден")
+    size = stat_result.st_size
+    if attachment.sha256:
+        etag = f'"{attachment.sha256}"'
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        etag = f'W/"{int(stat_result.st_mtime)}-{size}"'
+        cache_control = MUTABLE_CACHE_CONTROL
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+        "content-disposition": _content_disposition(attachment.filename),
+    }
+    media_type = attachment.content_type or mimetypes.guess_type(attachment.filename)[0] \
+        or "application/octet-stream"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if DOWNLOAD_SENDFILE_HEADER:
+        relative = os.path.relpath(path, UPLOADS_DIR).replace(os.sep, "/")
+        headers[DOWNLOAD_SENDFILE_HEADER] = DOWNLOAD_SENDFILE_PREFIX + relative
+        return Response(status_code=200, headers=headers, media_type=media_type)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range: диапазон отдаётся, только если файл не изменился с прошлой
+    # загрузки; слабый ETag для этого не подходит
+    if range_header and (if_range is None or if_range.strip() == etag and not etag.startswith("W/")):
+        byte_range = parse_range(range_header, size)
+    send_body = request.method != "HEAD"
+    if byte_range is None:
+        return FileRangeResponse(path, 0, size - 1, size, 200, headers, media_type, send_body)
+    start, end = byte_range
+    return FileRangeResponse(path, start, end, size, 206, headers, media_type, send_body)
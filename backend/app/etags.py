@@ -0,0 +1,90 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import events, models
+
+# Условные GET для задач и проектов. У строк tasks и projects есть номер
+# версии и время изменения; обработчик сначала читает только их (одна
+# строка или ключи страницы списка) и при совпадении If-None-Match отвечает
+# 304, не загружая объекты и не выполняя сериализацию. Версии увеличиваются
+# перед commit по событиям ленты изменений (app.events): каждая запись crud,
+# затрагивающая задачу или проект, уже сообщает их id. Изменения задачи
+# увеличивают и версию её проекта — в деталях проекта есть список задач и
+# итоги по ним, а изменения подзадачи — версию родителя, в ответе которого
+# есть список подзадач со статусами. Пользователи входят в ответы без
+# списков своих задач; их изменение и удаление crud сообщает событиями по
+# задачам и проектам, где они упоминаются. Списки проверяются только по
+# ETag и не отправляют Last-Modified: после удаления строки со страницы
+# наибольшее время изменения оставшихся строк не меняется, и запрос с
+# одним If-Modified-Since получил бы 304 со старой страницей.
+
+CACHE_CONTROL = "private, no-cache"
+
+@event.listens_for(Session, "before_commit")
+def bump_versions(session):
+    changes = session.info.get(events.PENDING_EVENTS)
+    if not changes:
+        return
+    now = datetime.utcnow()
+    task_ids = {change["task_id"] for change in changes if change.get("task_id")}
+    # Удалённые подзадачи сообщают родителя в событии, для остальных он читается из базы
+    parent_ids = {change["parent_task_id"] for change in changes if change.get("parent_task_id")}
+    if task_ids:
+        parent_ids.update(parent_id for parent_id, in session.query(models.Task.parent_task_id)
+                          .filter(models.Task.id.in_(task_ids), models.Task.parent_task_id.isnot(None)))
+    targets = (
+        (models.Task, task_ids | parent_ids),
+        (models.Project, {change["project_id"] for change in changes if change.get("project_id")}),
+    )
+    for model, ids in targets:
+        if ids:
+            session.query(model)\
+                   .filter(model.id.in_(ids))\
+                   .update({model.version: model.version + 1, model.updated_at: now}, synchronize_session=False)
+
+# Слабый ETag: представление зависит также от параметров запроса (fields,
+# view, курсор) и от того, чьи задачи видит пользователь
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+# Ключи строк страницы (id, version, ...) вместе с параметрами запроса
+def rows_etag(request: Request, scope, rows: Iterable) -> str:
+    return make_etag(request.url.path, request.url.query, scope, *(f"{row.id}:{row.version}" for row in rows))
+
+def _same_tag(candidate: str, tag: str) -> bool:
+    # Слабое сравнение: префикс W/ не учитывается
+    return candidate.strip().removeprefix("W/") == tag.removeprefix("W/")
+
+def is_not_modified(request: Request, tag: str, modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or any(_same_tag(candidate, tag) for candidate in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    # Last-Modified передаётся с точностью до секунды
+    return modified.replace(microsecond=0) <= since
+
+def set_validators(response: Response, tag: str, modified: Optional[datetime] = None):
+    response.headers["ETag"] = tag
+    if modified is not None:
+        response.headers["Last-Modified"] = format_datetime(modified.replace(tzinfo=timezone.utc), usegmt=True)
+    # Ответ зависит от пользователя и всегда проверяется у сервера
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.headers["Vary"] = "Authorization"
+
+def not_modified(tag: str, modified: Optional[datetime] = None) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, tag, modified)
+    return response
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional, Set
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config import EVENTS_HISTORY_SIZE, EVENTS_KEEPALIVE_SECONDS, EVENTS_QUEUE_SIZE
+
+# Лента изменений для клиентов (/ws/changes и /sse/changes). Функции crud
+# добавляют компактные события в сессию вызовом emit, после commit они
+# публикуются в брокер внутри процесса; при откате транзакции отбрасываются.
+# Брокер нумерует события, хранит последние EVENTS_HISTORY_SIZE для
+# возобновления после переподключения и раздаёт их подписчикам по проекту
+# или исполнителю. Брокер один на процесс: при нескольких процессах
+# сервера клиент получает изменения, сделанные его процессом.
+
+PENDING_EVENTS = "pending_change_events"
+
+# Событие, после которого клиент должен перечитать данные целиком:
+# пропущенные события уже не восстановить
+RESET = "reset"
+
+def emit(db: Session, type: str, project_id: Optional[int] = None, user_ids: Iterable[Optional[int]] = (), **data):
+    db.info.setdefault(PENDING_EVENTS, []).append({
+        "type": type,
+        "project_id": project_id,
+        "user_ids": sorted({user_id for user_id in user_ids if user_id is not None}),
+        **data,
+    })
+
+@event.listens_for(Session, "after_commit")
+def publish_pending(session):
+    pending = session.info.pop(PENDING_EVENTS, None)
+    if pending:
+        broker.publish(pending)
+
+# Транзакция завершилась без commit — события не публикуются
+@event.listens_for(Session, "after_transaction_end")
+def discard_pending(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_EVENTS, None)
+
+class Subscription:
+    def __init__(self, project_ids: Optional[Set[int]] = None, user_id: Optional[int] = None):
+        self.project_ids = project_ids or set()
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.backlog = []
+        self.last_seq = 0
+        self.lost = False
+
+    # Заданные фильтры должны выполняться оба: проект из project_ids и
+    # пользователь среди адресатов события
+    def matches(self, change: dict) -> bool:
+        if self.project_ids and change.get("project_id") not in self.project_ids:
+            return False
+        return self.user_id is None or self.user_id in change.get("user_ids", ())
+
+    # Вызывается в цикле событий подписчика; медленный клиент, не успевший
+    # забрать EVENTS_QUEUE_SIZE событий, получает reset вместо остальных
+    def push(self, change: dict):
+        if self.lost:
+            return
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.lost = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"seq": change["seq"], "type": RESET})
+
+class ChangeBroker:
+    def __init__(self, history_size: int):
+        self._lock = threading.Lock()
+        # Номера растут и между перезапусками процесса: отсчёт начинается
+        # с текущего времени в микросекундах, поэтому номер, сохранённый
+        # клиентом до перезапуска, распознаётся как устаревший
+        self._seq = time.time_ns() // 1000
+        self._history = deque(maxlen=history_size)
+        self._subscriptions = set()
+
+    # Может вызываться из любого потока (обработчики выполняются в пуле)
+    def publish(self, changes):
+        with self._lock:
+            for change in changes:
+                self._seq += 1
+                change["seq"] = self._seq
+                self._history.append(change)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            matching = [change for change in changes if subscription.matches(change)]
+            if not matching:
+                continue
+            try:
+                for change in matching:
+                    subscription.loop.call_soon_threadsafe(subscription.push, change)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+    # after — номер последнего полученного клиентом события. Если часть
+    # событий после него уже вытеснена из истории, первым придёт reset.
+    def subscribe(self, subscription: Subscription, after: Optional[int] = None):
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if after is None:
+                subscription.last_seq = self._seq
+                return
+            oldest = self._history[0]["seq"] if self._history else self._seq + 1
+            if after > self._seq or after < oldest - 1:
+                subscription.backlog = [{"seq": self._seq, "type": RESET}]
+            else:
+                subscription.backlog = [change for change in self._history
+                                        if change["seq"] > after and subscription.matches(change)]
+            subscription.last_seq = after
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    # События подписчика по порядку номеров; None — пора отправить keepalive.
+    # После reset поток заканчивается.
+    async def listen(self, subscription: Subscription, keepalive: float = EVENTS_KEEPALIVE_SECONDS):
+        try:
+            for change in subscription.backlog:
+                subscription.last_seq = change["seq"]
+                yield change
+                if change["type"] == RESET:
+                    return
+            subscription.backlog = []
+            while True:
+                try:
+                    change = await asyncio.wait_for(subscription.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                # Событие могло попасть и в историю при подписке, и в очередь
+                if change["seq"] <= subscription.last_seq and change["type"] != RESET:
+                    continue
+                subscription.last_seq = change["seq"]
+                yield change
+                if change["type"] == RESET:
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+broker = ChangeBroker(EVENTS_HISTORY_SIZE)
@@ -0,0 +1,86 @@
+import csv
+import enum
+import json
+from datetime import datetime
+from typing import Callable, List
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+from app.config import EXPORT_BATCH_SIZE
+from app.database import ReadSessionLocal
+
+# Потоковая выгрузка строк запроса в CSV или NDJSON. Строки читаются
+# пакетами по EXPORT_BATCH_SIZE через серверный курсор (stream_results,
+# yield_per) и сразу отправляются клиенту, поэтому память не зависит от
+# числа строк. Запрос выполняется в собственной сессии чтения: она живёт,
+# пока идёт передача, и закрывается вместе с генератором.
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+FORMAT_PATTERN = "^(" + "|".join(MEDIA_TYPES) + ")$"
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+# csv.writer пишет в список строк, который опустошается после каждого пакета
+class _Lines:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line: str):
+        self.lines.append(line)
+
+    def flush(self) -> str:
+        chunk = "".join(self.lines)
+        self.lines.clear()
+        return chunk
+
+def _csv_chunks(rows, columns: List[str]):
+    buffer = _Lines()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel распознал кодировку UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(["" if value is None else _plain(value) for value in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.flush()
+    yield buffer.flush()
+
+def _ndjson_chunks(rows, columns: List[str]):
+    lines = []
+    for row in rows:
+        record = {name: _plain(value) for name, value in zip(columns, row)}
+        lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "".join(lines)
+            lines.clear()
+    if lines:
+        yield "".join(lines)
+
+def _chunks(build_query: Callable[[Session], Query], format: str):
+    db = ReadSessionLocal()
+    try:
+        query = build_query(db)
+        columns = [description["name"] for description in query.column_descriptions]
+        rows = query.execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+        writer = _csv_chunks if format == "csv" else _ndjson_chunks
+        for chunk in writer(rows, columns):
+            yield chunk.encode("utf-8")
+    finally:
+        db.close()
+
+# build_query получает сессию и возвращает запрос колонок (не объектов);
+# имена колонок становятся заголовком CSV и ключами NDJSON
+def export_response(build_query: Callable[[Session], Query], format: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        _chunks(build_query, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
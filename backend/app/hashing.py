@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from app.config import BCRYPT_ROUNDS, HASHING_MAX_PENDING, HASHING_USE_PROCESSES, HASHING_WORKERS
+
+# Единственный контекст паролей приложения; стоимость bcrypt задаётся BCRYPT_ROUNDS
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+class HashingMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+        self.rejected = 0
+
+    def observe(self, operation: str, seconds: float):
+        with self._lock:
+            stats = self.operations.setdefault(
+                operation, {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)}
+            )
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][i] += 1
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "rejected": self.rejected,
+                "buckets": list(LATENCY_BUCKETS),
+                "operations": {name: dict(stats, buckets=list(stats["buckets"]))
+                               for name, stats in self.operations.items()},
+            }
+
+# Ограниченный пул для bcrypt: не больше workers + max_pending операций
+# одновременно, остальные запросы сразу получают 429
+class HashingPool:
+    def __init__(self, workers: int, max_pending: int, use_processes: bool = False):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self.metrics = HashingMetrics()
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+            return self._executor
+
+    def submit(self, operation: str, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            self.metrics.reject()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+        started = time.perf_counter()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        def done(_):
+            self._slots.release()
+            self.metrics.observe(operation, time.perf_counter() - started)
+        future.add_done_callback(done)
+        return future
+
+    async def run(self, operation: str, fn, *args):
+        return await asyncio.wrap_future(self.submit(operation, fn, *args))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+hashing_pool = HashingPool(HASHING_WORKERS, HASHING_MAX_PENDING, HASHING_USE_PROCESSES)
+
+async def hash_password(password: str) -> str:
+    return await hashing_pool.run("hash", _hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await hashing_pool.run("verify", _verify, password, hashed_password)
+
+# Для кода вне запросов (начальная инициализация, скрипты)
+def hash_password_sync(password: str) -> str:
+    return _hash(password)
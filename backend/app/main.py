@@ -1,11 +1,14 @@
+import asyncio
 import os
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from app import models
-from app.database import engine, SessionLocal
-from app.routers import users, auth, projects, tasks, reports
+from app import blobs, counters, models, notifications, search
+from app.database import async_engine, ensure_schema, SessionLocal
+from app.routers import users, auth, projects, tasks, reports, changes, cache, metrics
 from app.models import RoleEnum, Role
-from app.auth import get_password_hash
+from app.hashing import hash_password_sync, hashing_pool
+from app.pagination import NEXT_CURSOR_HEADER
+from app.config import BLOB_GC_INTERVAL_SECONDS, METRICS_ENABLED, NOTIFY_WORKERS, UPLOADS_DIR
+from app.metrics import MetricsMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import register
 
@@ -15,9 +18,6 @@ app = FastAPI(
     version="1.0.0",
 )
 
-# Путь к директории загрузок
-UPLOADS_DIR = "uploads"
-
 # Проверка и создание директории 'uploads'
 if not os.path.exists(UPLOADS_DIR):
     os.makedirs(UPLOADS_DIR)
@@ -30,9 +30,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-models.Base.metadata.create_all(bind=engine)
+# Замеры запросов; внешний слой, чтобы учитывать и время CORS
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Создание таблиц и недостающих индексов
+ensure_schema()
 
 # Создание начальных ролей
 def create_roles():
@@ -49,13 +55,33 @@ def create_roles():
 
 create_roles()
 
+# Заполнение счётчиков задач для базы, созданной до их появления
+def build_task_counters():
+    db = SessionLocal()
+    try:
+        counters.ensure_built(db)
+    finally:
+        db.close()
+
+build_task_counters()
+
+# Полнотекстовый индекс задач и проектов
+def build_search_index():
+    db = SessionLocal()
+    try:
+        search.ensure_index(db)
+    finally:
+        db.close()
+
+build_search_index()
+
 # Создание первоначального администратора
 def create_initial_admin():
     db = SessionLocal()
     try:
         user = db.query(models.User).filter(models.User.username == "admin").first()
         if not user:
-            hashed_password = get_password_hash("admin123")
+            hashed_password = hash_password_sync("admin123")
             admin_role = db.query(Role).filter(Role.name == RoleEnum.admin).first()
             admin_user = models.User(
                 username="admin",
@@ -69,11 +95,35 @@ def create_initial_admin():
 
 create_initial_admin()
 
+# Периодическое удаление файлов вложений, на которые не осталось ссылок
+@app.on_event("startup")
+async def start_blob_gc():
+    if BLOB_GC_INTERVAL_SECONDS > 0:
+        app.state.blob_gc = asyncio.create_task(blobs.run_periodic_gc())
+
+# Обработчики исходящих уведомлений по электронной почте
+@app.on_event("startup")
+async def start_notification_workers():
+    if notifications.ENABLED and NOTIFY_WORKERS > 0:
+        app.state.notification_workers = asyncio.create_task(notifications.run_workers())
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    for name in ("blob_gc", "notification_workers"):
+        background = getattr(app.state, name, None)
+        if background is not None:
+            background.cancel()
+    hashing_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(tasks.router)
 app.include_router(reports.router)
 app.include_router(projects.router)
 app.include_router(register.router)
-
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
\ No newline at end of file
+app.include_router(changes.router)
+app.include_router(cache.router)
+if METRICS_ENABLED:
+    app.include_router(metrics.router)
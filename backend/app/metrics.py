@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from app.config import METRICS_SERVER_TIMING, METRICS_SLOW_QUERY_MS
+
+# Замеры запросов: время ответа, время в базе и число SQL-запросов, время
+# сериализации. Всё включается METRICS_ENABLED: без него промежуточный
+# слой не добавляется и обработчики событий движка не регистрируются.
+# Замеры текущего запроса хранятся в contextvar; функции crud в пуле
+# потоков и в run_sync видят тот же объект. Гистограммы отдаются в формате
+# Prometheus на GET /metrics.
+
+QUERY_STARTED = "metrics_query_started"
+
+logger = logging.getLogger(__name__)
+
+# Секунды: от быстрых запросов SQLite до медленных выгрузок
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Sequence[float], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        # значения меток -> [число наблюдений по корзинам..., сумма]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(label_values, list(series)) for label_values, series in self._series.items()]
+        for label_values, series in sorted(items):
+            labels = [f'{name}="{_label(value)}"' for name, value in zip(self.labels, label_values)]
+            prefix = ",".join(labels + [""])
+            total = 0
+            for bucket, count in zip(self.buckets + ("+Inf",), series):
+                total += count
+                yield f'{self.name}_bucket{{{prefix}le="{_number(bucket)}"}} {total}'
+            selector = "{" + ",".join(labels) + "}" if labels else ""
+            yield f"{self.name}_sum{selector} {series[-1]}"
+            yield f"{self.name}_count{selector} {total}"
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = ",".join(f'{name}="{_label(v)}"' for name, v in zip(self.labels, label_values))
+            yield f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}"
+
+REQUEST_LABELS = ("method", "route")
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса", SECONDS_BUCKETS, REQUEST_LABELS + ("status",))
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Время SQL-запросов за один HTTP-запрос", SECONDS_BUCKETS, REQUEST_LABELS)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Число SQL-запросов за один HTTP-запрос", COUNT_BUCKETS, REQUEST_LABELS)
+REQUEST_SERIALIZATION = Histogram(
+    "http_request_serialization_seconds", "Время сериализации ответа", SECONDS_BUCKETS, REQUEST_LABELS)
+QUERY_DURATION = Histogram("db_query_duration_seconds", "Время одного SQL-запроса", SECONDS_BUCKETS)
+SLOW_QUERIES = Counter("db_slow_queries_total", "SQL-запросы дольше METRICS_SLOW_QUERY_MS", ("route",))
+
+METRICS = (REQUEST_DURATION, REQUEST_DB_TIME, REQUEST_QUERIES, REQUEST_SERIALIZATION, QUERY_DURATION, SLOW_QUERIES)
+
+class RequestMetrics:
+    __slots__ = ("scope", "started", "db_time", "queries", "serialization")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.serialization = 0.0
+
+    # Шаблон пути маршрута (/tasks/{task_id}), а не сам путь, чтобы число
+    # рядов метрик не росло с числом объектов
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return route.path_format if route is not None else "unmatched"
+
+    def server_timing(self) -> str:
+        elapsed = (time.perf_counter() - self.started) * 1000
+        return (
+            f"db;dur={self.db_time * 1000:.2f}, queries;desc=\"{self.queries}\", "
+            f"serialize;dur={self.serialization * 1000:.2f}, app;dur={elapsed:.2f}"
+        )
+
+    def finish(self, status: int):
+        method, route = self.scope["method"], self.route()
+        REQUEST_DURATION.observe(time.perf_counter() - self.started, method, route, str(status))
+        REQUEST_DB_TIME.observe(self.db_time, method, route)
+        REQUEST_QUERIES.observe(self.queries, method, route)
+        REQUEST_SERIALIZATION.observe(self.serialization, method, route)
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+# Сериализаторы передают сюда момент начала своей работы
+def record_serialization(started: float):
+    current = _current.get()
+    if current is not None:
+        current.serialization += time.perf_counter() - started
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(QUERY_STARTED, []).append(time.perf_counter())
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info[QUERY_STARTED].pop()
+    QUERY_DURATION.observe(elapsed)
+    current = _current.get()
+    if current is not None:
+        current.db_time += elapsed
+        current.queries += 1
+    if METRICS_SLOW_QUERY_MS > 0 and elapsed * 1000 >= METRICS_SLOW_QUERY_MS:
+        # Параметры не выводятся: в них могут быть пароли и личные данные
+        route = f"{current.scope['method']} {current.route()}" if current is not None else "вне запроса"
+        SLOW_QUERIES.inc(current.route() if current is not None else "background")
+        logger.warning("Медленный SQL-запрос %.1f мс (%s)", elapsed * 1000, route)
+        # Текст запроса — только на уровне DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Текст медленного запроса: %s", " ".join(statement.split())[:1000])
+
+def _discard_started(context):
+    started = context.connection.info.get(QUERY_STARTED)
+    if started:
+        started.pop()
+
+# Вызывается для каждого движка (синхронного или sync_engine асинхронного)
+def instrument(engine):
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _discard_started)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        current = RequestMetrics(scope)
+        token = _current.set(current)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if METRICS_SERVER_TIMING:
+                    MutableHeaders(scope=message).append("Server-Timing", current.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            current.finish(status)
+
+def render(extra=()) -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
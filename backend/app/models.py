@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Float, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Float, Table, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship, backref
 from app.database import Base
 from datetime import datetime
@@ -22,6 +22,8 @@ project_participants = Table(
     Base.metadata,
     Column("project_id", Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
     Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    # первичный ключ начинается с project_id, поиск проектов пользователя идёт по этому индексу
+    Index("ix_project_participants_user_id", "user_id"),
 )
 
 class User(Base):
@@ -49,6 +51,15 @@ class Project(Base):
     description = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     leader_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # Версия и время последнего изменения для ETag (app.etags)
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    updated_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_projects_created_at_id", "created_at", "id"),
+        Index("ix_projects_leader_id", "leader_id"),
+    )
+
     leader = relationship("User", foreign_keys=[leader_id])
     tasks = relationship("Task", back_populates="project", cascade="all, delete-orphan")
     # участники проекта
@@ -73,6 +84,11 @@ class Comment(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
 
+    __table_args__ = (
+        Index("ix_comments_task_id", "task_id"),
+        Index("ix_comments_user_id", "user_id"),
+    )
+
     user = relationship("User", back_populates="comments")
     task = relationship("Task", back_populates="comments")
 
@@ -83,6 +99,15 @@ class Attachment(Base):
     filename = Column(String, nullable=False)
     file_url = Column(String, nullable=False)
     task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
+    # Сведения о содержимом; у вложений, загруженных до хранилища blobs, пустые
+    size = Column(Integer, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    content_type = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_attachments_task_id", "task_id"),
+        Index("ix_attachments_sha256", "sha256"),
+    )
 
     task = relationship("Task", back_populates="attachments")
 
@@ -103,6 +128,24 @@ class Task(Base):
     parent_task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=True)
     assignment_date = Column(DateTime, default=datetime.utcnow, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    updated_at = Column(DateTime, nullable=True)
+
+    # Составные индексы под постраничную выдачу по ключу (created_at, id)
+    # с фильтрами списка задач; project_id и assigned_user_id стоят в них
+    # первыми и покрывают также поиск по внешнему ключу
+    __table_args__ = (
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        Index("ix_tasks_project_created_at_id", "project_id", "created_at", "id"),
+        Index("ix_tasks_assignee_created_at_id", "assigned_user_id", "created_at", "id"),
+        Index("ix_tasks_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_tasks_due_date", "due_date"),
+        Index("ix_tasks_creator_id", "creator_id"),
+        Index("ix_tasks_parent_task_id", "parent_task_id"),
+        # Исполнители задач проекта (участники в деталях проекта) читаются
+        # только из индекса
+        Index("ix_tasks_project_assignee", "project_id", "assigned_user_id"),
+    )
 
     project = relationship("Project", back_populates="tasks")
     assigned_user = relationship("User", back_populates="assigned_tasks", foreign_keys=[assigned_user_id])
@@ -110,4 +153,47 @@ class Task(Base):
     parent_task = relationship("Task", remote_side=[id], backref=backref("subtasks", cascade="all, delete-orphan"))
 
     comments = relationship("Comment", back_populates="task", cascade="all, delete-orphan")
-    attachments = relationship("Attachment", back_populates="task", cascade="all, delete-orphan")
\ No newline at end of file
+    attachments = relationship("Attachment", back_populates="task", cascade="all, delete-orphan")
+
+# Материализованные счётчики задач по областям: "all" (scope_id = 0),
+# "project" и "assignee"; ведутся в app.counters
+class TaskCounter(Base):
+    __tablename__ = "task_counters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False)
+    scope_id = Column(Integer, nullable=False, default=0)
+    status = Column(Enum(TaskStatus), nullable=False)
+    priority = Column(Enum(TaskPriority), nullable=False)
+    task_count = Column(Integer, nullable=False, default=0)
+    estimated_time = Column(Float, nullable=False, default=0.0)
+    time_spent = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_id", "status", "priority", name="uq_task_counters_key"),
+    )
+
+# Исходящие уведомления по электронной почте (outbox): строки пишутся в той
+# же транзакции, что и изменение задачи, и отправляются фоновым обработчиком
+# app.notifications; отправленные строки удаляются
+class Notification(Base):
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Без внешнего ключа: уведомление об удалённой задаче тоже доставляется
+    task_id = Column(Integer, nullable=True)
+    message = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    claim_token = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_notifications_status_next_attempt", "status", "next_attempt_at"),
+        Index("ix_notifications_user_status", "user_id", "status"),
+        Index("ix_notifications_claim_token", "claim_token"),
+    )
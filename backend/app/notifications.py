@@ -0,0 +1,280 @@
+import argparse
+import smtplib
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, Iterable, List, Optional
+import anyio
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, event, insert, or_
+from sqlalchemy.orm import Session
+from app import models
+from app.config import (
+    NOTIFY_BATCH_SIZE, NOTIFY_CLAIM_TIMEOUT_SECONDS, NOTIFY_DIGEST_SECONDS, NOTIFY_FROM, NOTIFY_MAX_ATTEMPTS,
+    NOTIFY_POLL_SECONDS, NOTIFY_RATE_PER_MINUTE, NOTIFY_RETRY_SECONDS, NOTIFY_SMTP_HOST, NOTIFY_SMTP_PASSWORD,
+    NOTIFY_SMTP_PORT, NOTIFY_SMTP_STARTTLS, NOTIFY_SMTP_TIMEOUT_SECONDS, NOTIFY_SMTP_USER, NOTIFY_WORKERS,
+)
+
+# Уведомления по электронной почте через outbox. Функции crud вызывают
+# notify, и перед commit строки уведомлений записываются в таблицу
+# notifications в той же транзакции, что и само изменение: при откате
+# пропадают вместе с ним, SMTP в обработчиках запросов не вызывается.
+# Фоновые обработчики забирают уведомления пользователя целиком одним
+# дайджестом, когда самому старому из них исполнилось NOTIFY_DIGEST_SECONDS,
+# и отправляют одним письмом через общее соединение SMTP на пакет.
+
+PENDING_NOTIFICATIONS = "pending_notifications"
+
+PENDING = "pending"
+SENDING = "sending"
+FAILED = "failed"
+
+ENABLED = bool(NOTIFY_SMTP_HOST)
+
+def notify(db: Session, user_ids: Iterable[Optional[int]], message: str,
+           task_id: Optional[int] = None, actor_id: Optional[int] = None):
+    if not ENABLED:
+        return
+    pending = db.info.setdefault(PENDING_NOTIFICATIONS, [])
+    # Автор изменения не получает уведомление о своём действии
+    for user_id in {user_id for user_id in user_ids if user_id is not None and user_id != actor_id}:
+        pending.append({"user_id": user_id, "task_id": task_id, "message": message})
+
+# Уведомления записываются одним INSERT; пользователи без адреса пропускаются
+@event.listens_for(Session, "before_commit")
+def write_pending(session):
+    pending = session.info.pop(PENDING_NOTIFICATIONS, None)
+    if not pending:
+        return
+    recipients = {
+        user_id for user_id, in session.query(models.User.id)
+                                       .filter(models.User.id.in_({row["user_id"] for row in pending}))
+                                       .filter(models.User.email.isnot(None))
+    }
+    now = datetime.utcnow()
+    due = now + timedelta(seconds=NOTIFY_DIGEST_SECONDS)
+    rows = [
+        dict(row, status=PENDING, attempts=0, next_attempt_at=due, created_at=now)
+        for row in pending if row["user_id"] in recipients
+    ]
+    if rows:
+        session.execute(insert(models.Notification), rows)
+
+@event.listens_for(Session, "after_transaction_end")
+def discard_pending(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_NOTIFICATIONS, None)
+
+class Digest:
+    def __init__(self, user_id: int, email: Optional[str], name: str):
+        self.user_id = user_id
+        self.email = email
+        self.name = name
+        self.ids: List[int] = []
+        self.lines: List[str] = []
+        self.attempts = 0
+
+    def as_message(self) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = NOTIFY_FROM
+        message["To"] = self.email
+        message["Subject"] = f"Task Manager: новые уведомления ({len(self.lines)})"
+        message.set_content(f"Здравствуйте, {self.name}!\n\n" + "\n".join(self.lines) + "\n")
+        return message
+
+def _waiting(now: datetime):
+    stale = now - timedelta(seconds=NOTIFY_CLAIM_TIMEOUT_SECONDS)
+    return or_(
+        models.Notification.status == PENDING,
+        and_(models.Notification.status == SENDING, models.Notification.claimed_at < stale),
+    )
+
+# Захват дайджестов до limit пользователей. Строки помечаются своим
+# claim_token одним UPDATE с тем же условием, поэтому несколько
+# обработчиков (и процессов) не отправят одно уведомление дважды.
+def claim_digests(db: Session, limit: int = NOTIFY_BATCH_SIZE, now: Optional[datetime] = None) -> List[Digest]:
+    now = now or datetime.utcnow()
+    Notification = models.Notification
+    due = db.query(Notification.user_id)\
+            .filter(_waiting(now), Notification.next_attempt_at <= now)\
+            .distinct()\
+            .limit(limit)
+    user_ids = [user_id for user_id, in due]
+    if not user_ids:
+        db.rollback()
+        return []
+    token = uuid.uuid4().hex
+    db.query(Notification)\
+      .filter(Notification.user_id.in_(user_ids), _waiting(now))\
+      .update({"status": SENDING, "claim_token": token, "claimed_at": now}, synchronize_session=False)
+    rows = db.query(Notification.id, Notification.user_id, Notification.message, Notification.attempts,
+                    Notification.created_at, models.User.email, models.User.full_name, models.User.username)\
+             .join(models.User, models.User.id == Notification.user_id)\
+             .filter(Notification.claim_token == token)\
+             .order_by(Notification.user_id, Notification.id)\
+             .all()
+    db.commit()
+    digests: Dict[int, Digest] = {}
+    for row in rows:
+        digest = digests.get(row.user_id)
+        if digest is None:
+            digest = digests[row.user_id] = Digest(row.user_id, row.email, row.full_name or row.username)
+        digest.ids.append(row.id)
+        digest.lines.append(f"{row.created_at:%d.%m.%Y %H:%M} — {row.message}")
+        digest.attempts = max(digest.attempts, row.attempts)
+    return list(digests.values())
+
+# results: user_id -> текст ошибки или None при успешной отправке.
+# Отправленные уведомления удаляются, неудачные ждут повтора с удвоением
+# паузы, после NOTIFY_MAX_ATTEMPTS попыток остаются со статусом failed.
+def record_results(db: Session, digests: List[Digest], results: Dict[int, Optional[str]],
+                   now: Optional[datetime] = None):
+    now = now or datetime.utcnow()
+    Notification = models.Notification
+    sent = [notification_id for digest in digests if results.get(digest.user_id) is None
+            for notification_id in digest.ids]
+    if sent:
+        db.query(Notification).filter(Notification.id.in_(sent)).delete(synchronize_session=False)
+    for digest in digests:
+        error = results.get(digest.user_id)
+        if error is None:
+            continue
+        attempts = digest.attempts + 1
+        if attempts >= NOTIFY_MAX_ATTEMPTS:
+            update = {"status": FAILED}
+        else:
+            delay = NOTIFY_RETRY_SECONDS * 2 ** (attempts - 1)
+            update = {"status": PENDING, "next_attempt_at": now + timedelta(seconds=delay)}
+        update.update(attempts=attempts, last_error=error[:500], claim_token=None)
+        db.query(Notification).filter(Notification.id.in_(digest.ids)).update(update, synchronize_session=False)
+    db.commit()
+
+# Равномерное ограничение частоты отправки, общее для обработчиков процесса
+class RateLimiter:
+    def __init__(self, per_minute: int = NOTIFY_RATE_PER_MINUTE):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_slot = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(self.next_slot, now)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await anyio.sleep(slot - now)
+
+def _connect() -> smtplib.SMTP:
+    smtp = smtplib.SMTP(NOTIFY_SMTP_HOST, NOTIFY_SMTP_PORT, timeout=NOTIFY_SMTP_TIMEOUT_SECONDS)
+    try:
+        if NOTIFY_SMTP_STARTTLS:
+            smtp.starttls()
+        if NOTIFY_SMTP_USER:
+            smtp.login(NOTIFY_SMTP_USER, NOTIFY_SMTP_PASSWORD)
+    except Exception:
+        smtp.close()
+        raise
+    return smtp
+
+def _send(smtp: smtplib.SMTP, digest: Digest) -> Optional[str]:
+    try:
+        smtp.send_message(digest.as_message())
+    except smtplib.SMTPRecipientsRefused as error:
+        return f"Адрес отклонён: {error.recipients}"
+    except smtplib.SMTPResponseException as error:
+        return f"{error.smtp_code} {error.smtp_error!r}"
+    return None
+
+def _quit(smtp: smtplib.SMTP):
+    try:
+        smtp.quit()
+    except (OSError, smtplib.SMTPException):
+        smtp.close()
+
+async def _with_session(fn, *args):
+    from app.database import open_session
+    db = open_session()
+    try:
+        return await db.run(fn, *args)
+    finally:
+        await db.close()
+
+# Один пакет: захват, отправка, запись результатов. Возвращает число
+# обработанных дайджестов (0 — отправлять нечего).
+async def deliver_batch(limiter: RateLimiter, batch_size: int = NOTIFY_BATCH_SIZE) -> int:
+    digests = await _with_session(claim_digests, batch_size)
+    if not digests:
+        return 0
+    results: Dict[int, Optional[str]] = {}
+    try:
+        smtp = await run_in_threadpool(_connect)
+    except (OSError, smtplib.SMTPException) as error:
+        results = {digest.user_id: f"Сервер SMTP недоступен: {error}" for digest in digests}
+    else:
+        try:
+            for digest in digests:
+                if not digest.email:
+                    # Адрес удалён после постановки в очередь: отправлять некуда
+                    results[digest.user_id] = None
+                    continue
+                await limiter.acquire()
+                try:
+                    results[digest.user_id] = await run_in_threadpool(_send, smtp, digest)
+                except (OSError, smtplib.SMTPException) as error:
+                    # Соединение потеряно: этот и оставшиеся дайджесты ждут повтора
+                    for rest in digests:
+                        results.setdefault(rest.user_id, f"Ошибка соединения SMTP: {error}")
+                    break
+        finally:
+            await run_in_threadpool(_quit, smtp)
+    await _with_session(record_results, digests, results)
+    failed = sum(1 for error in results.values() if error is not None)
+    if failed:
+        print(f"Уведомления: не отправлено дайджестов: {failed} из {len(digests)}")
+    return len(digests)
+
+async def _work(limiter: RateLimiter):
+    while True:
+        try:
+            delivered = await deliver_batch(limiter)
+        except Exception as error:
+            print(f"Отправка уведомлений завершилась ошибкой: {error}")
+            delivered = 0
+        if not delivered:
+            await anyio.sleep(NOTIFY_POLL_SECONDS)
+
+# Пул обработчиков в процессе приложения или в отдельном процессе
+async def run_workers(workers: int = NOTIFY_WORKERS):
+    limiter = RateLimiter()
+    async with anyio.create_task_group() as task_group:
+        for _ in range(workers):
+            task_group.start_soon(_work, limiter)
+
+async def _send_pending() -> int:
+    limiter = RateLimiter()
+    total = 0
+    while True:
+        delivered = await deliver_batch(limiter)
+        if not delivered:
+            return total
+        total += delivered
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отправка уведомлений по электронной почте")
+    parser.add_argument("command", choices=["run", "send"],
+                        help="run — постоянная работа обработчиков, send — отправить накопленное и выйти")
+    parser.add_argument("--workers", type=int, default=max(NOTIFY_WORKERS, 1), help="Число обработчиков")
+    args = parser.parse_args(argv)
+    if not ENABLED:
+        print("Отправка уведомлений выключена: не задан NOTIFY_SMTP_HOST")
+        return 1
+    if args.command == "run":
+        anyio.run(run_workers, args.workers)
+        return 0
+    print(f"Обработано дайджестов: {anyio.run(_send_pending)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
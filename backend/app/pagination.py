@@ -0,0 +1,107 @@
+import base64
+import binascii
+import json
+import time
+from datetime import datetime
+from typing import Any, List, Optional
+from fastapi import HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import literal, tuple_
+from app import metrics
+from app.config import DEFAULT_PAGE_SIZE
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class PageParams:
+    def __init__(self, sort: str, limit: Optional[int] = None, after: Optional[List[Any]] = None):
+        self.sort = sort.lstrip("-")
+        self.descending = sort.startswith("-")
+        self.limit = limit
+        self.after = after
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if sort.lstrip("-") in ("id", "rank"):
+            return [int(values[0])]
+        return [datetime.fromisoformat(values[0]), int(values[1])]
+    except (binascii.Error, ValueError, TypeError, IndexError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+# Зависимость с параметрами страницы; курсор непрозрачен для клиента
+# и содержит значения ключа сортировки последней строки страницы.
+# default_limit задаёт размер страницы, если limit не указан (не больше
+# MAX_PAGE_SIZE); None — выдача без ограничения, только для маршрутов,
+# которые явно на это рассчитаны.
+def page_params(*sort_fields: str, default: str, default_limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    if default_limit is not None:
+        default_limit = min(default_limit, MAX_PAGE_SIZE)
+    pattern = "^-?(" + "|".join(sort_fields) + ")$"
+    async def dependency(
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+        sort: str = Query(default, regex=pattern, description="Поле сортировки, '-' для убывания"),
+    ):
+        after = decode_cursor(cursor, sort) if cursor else None
+        if limit is None:
+            limit = default_limit
+        if after is not None and limit is None:
+            limit = MAX_PAGE_SIZE
+        return PageParams(sort, limit, after)
+    return dependency
+
+def _keyset_columns(model, page: PageParams):
+    if page.sort == "id":
+        return [model.id]
+    return [getattr(model, page.sort), model.id]
+
+def paginate(query, model, page: Optional[PageParams]):
+    if page is None:
+        return query.order_by(model.id).all(), None
+    columns = _keyset_columns(model, page)
+    if page.after is not None:
+        values = [literal(v, c.type) for v, c in zip(page.after, columns)]
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        value = tuple_(*values) if len(columns) > 1 else values[0]
+        query = query.filter(key < value if page.descending else key > value)
+    query = query.order_by(*[c.desc() if page.descending else c.asc() for c in columns])
+    if page.limit is None:
+        return query.all(), None
+    rows = query.limit(page.limit + 1).all()
+    if len(rows) <= page.limit:
+        return rows, None
+    rows = rows[:page.limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in columns])
+
+# Выдача по релевантности: ранг вычисляется при каждом запросе и не
+# подходит для ключа курсора, поэтому курсор хранит смещение
+def paginate_ranked(query, rank, key, page: Optional[PageParams]):
+    descending = page is not None and page.descending
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in (rank, key)])
+    if page is None or page.limit is None:
+        return query.all(), None
+    offset = page.after[0] if page.after is not None else 0
+    rows = query.offset(offset).limit(page.limit + 1).all()
+    if len(rows) <= page.limit:
+        return rows, None
+    return rows[:page.limit], encode_cursor([offset + page.limit])
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+# Строки выборки по колонкам отдаются напрямую, минуя response_model
+def rows_response(rows, next_cursor: Optional[str]) -> JSONResponse:
+    started = time.perf_counter()
+    response = JSONResponse(content=jsonable_encoder([dict(row._mapping) for row in rows]))
+    metrics.record_serialization(started)
+    set_next_cursor(response, next_cursor)
+    return response
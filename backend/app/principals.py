@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS
+from app.models import RoleEnum
+
+# Компактное представление аутентифицированного пользователя, которое
+# отдают зависимости get_current_user и role_required
+class Principal:
+    __slots__ = ("id", "username", "role")
+
+    def __init__(self, id: int, username: str, role: RoleEnum):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def __repr__(self):
+        return f"Principal(id={self.id}, username={self.username!r}, role={self.role.value})"
+
+# LRU-кэш с TTL: токен -> Principal. Запись живёт не дольше самого токена
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_expires_at: Optional[float] = None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        ttl = self.ttl
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, principal)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [token for token, (_, principal) in self._entries.items() if principal.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+principal_cache = PrincipalCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+
+# Вызывается при изменении или удалении пользователя
+def invalidate_user(user_id: int):
+    principal_cache.invalidate_user(user_id)
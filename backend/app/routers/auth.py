@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import AwaitableSession, get_db
 from app.auth import authenticate_user, create_access_token
+from app.dependencies import role_required
+from app.hashing import hashing_pool
+from app.models import RoleEnum
+from app.principals import Principal
 from app import schemas
 
 router = APIRouter(
@@ -11,11 +14,11 @@ router = APIRouter(
 )
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(
-    db: Session = Depends(get_db),
+async def login_for_access_token(
+    db: AwaitableSession = Depends(get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -29,4 +32,10 @@ def login_for_access_token(
             "role": user.role.name
         }
     )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/hashing-metrics")
+async def get_hashing_metrics(
+    current_user: Principal = Depends(role_required([RoleEnum.admin]))
+):
+    return hashing_pool.metrics.snapshot()
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, status
+from app.cache import response_cache
+from app.dependencies import role_required
+from app.models import RoleEnum
+from app.principals import Principal
+
+router = APIRouter(
+    prefix="/cache",
+    tags=["cache"],
+)
+
+# Попадания и промахи кэша ответов по именам ответов
+@router.get("/stats")
+async def get_cache_stats(current_user: Principal = Depends(role_required([RoleEnum.admin]))):
+    return response_cache.stats()
+
+@router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_cache(current_user: Principal = Depends(role_required([RoleEnum.admin]))):
+    response_cache.clear()
@@ -0,0 +1,110 @@
+import json
+from typing import List, Optional
+import anyio
+from fastapi import APIRouter, Header, HTTPException, Query, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from app.auth import principal_from_token
+from app.database import open_session
+from app.events import RESET, Subscription, broker
+from app.models import RoleEnum
+from app.principals import Principal
+
+# Лента изменений: WebSocket /ws/changes и Server-Sent Events /sse/changes
+# для клиентов без WebSocket. Браузер не может передать заголовок
+# Authorization при открытии WebSocket и EventSource, поэтому токен
+# принимается также параметром token. Фильтры: project_id (можно несколько)
+# и assignee_id, при обоих приходят события, подходящие под оба. Без
+# фильтров администратор и менеджер получают все события; исполнитель
+# всегда получает только события своих задач, в том числе при фильтре по
+# проекту. after (или Last-Event-ID для SSE) — номер последнего полученного
+# события для возобновления.
+
+router = APIRouter(tags=["changes"])
+
+async def _authenticate(token: Optional[str]) -> Principal:
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверные учетные данные")
+    db = open_session(read_only=True)
+    try:
+        return await principal_from_token(token, db)
+    finally:
+        await db.close()
+
+def _subscription(principal: Principal, project_ids: Optional[List[int]], assignee_id: Optional[int]) -> Subscription:
+    if principal.role == RoleEnum.executor:
+        if assignee_id is not None and assignee_id != principal.id:
+            raise HTTPException(status_code=403, detail="Недостаточно прав для выполнения операции")
+        assignee_id = principal.id
+    return Subscription(set(project_ids or ()), assignee_id)
+
+def _bearer(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    return None
+
+@router.websocket("/ws/changes")
+async def changes_websocket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    project_id: Optional[List[int]] = Query(None),
+    assignee_id: Optional[int] = Query(None),
+    after: Optional[int] = Query(None),
+):
+    try:
+        principal = await _authenticate(token or _bearer(websocket.headers.get("authorization")))
+        subscription = _subscription(principal, project_id, assignee_id)
+    except HTTPException as e:
+        # До принятия соединения: клиент получит отказ рукопожатия
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    await websocket.accept()
+    broker.subscribe(subscription, after)
+
+    # Сообщения клиента не нужны, но их чтение нужно, чтобы заметить отключение
+    async def watch_disconnect(cancel_scope):
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        cancel_scope.cancel()
+
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(watch_disconnect, task_group.cancel_scope)
+        async for change in broker.listen(subscription):
+            await websocket.send_json({"type": "ping"} if change is None else change)
+            if change is not None and change["type"] == RESET:
+                await websocket.close()
+                break
+        task_group.cancel_scope.cancel()
+
+def _server_sent_event(change) -> str:
+    if change is None:
+        return ": ping\n\n"
+    data = json.dumps(change, ensure_ascii=False)
+    return f"id: {change['seq']}\ndata: {data}\n\n"
+
+@router.get("/sse/changes", response_class=StreamingResponse)
+async def changes_event_stream(
+    request: Request,
+    token: Optional[str] = Query(None),
+    project_id: Optional[List[int]] = Query(None),
+    assignee_id: Optional[int] = Query(None),
+    after: Optional[int] = Query(None),
+    last_event_id: Optional[int] = Header(None),
+):
+    principal = await _authenticate(token or _bearer(request.headers.get("authorization")))
+    subscription = _subscription(principal, project_id, assignee_id)
+
+    # Подписка создаётся, когда ответ начал отправляться, и снимается при
+    # закрытии потока: клиент, отключившийся раньше, подписки не оставляет
+    async def stream():
+        broker.subscribe(subscription, after if after is not None else last_event_id)
+        try:
+            async for change in broker.listen(subscription):
+                yield _server_sent_event(change)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,35 @@
+import secrets
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from app import metrics
+from app.cache import response_cache
+from app.config import METRICS_TOKEN
+
+router = APIRouter(
+    tags=["metrics"],
+)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+# Счётчики кэша ответов (app.cache) в формате Prometheus
+def cache_lines():
+    stats = response_cache.stats()
+    for counter in ("hits", "misses", "stores"):
+        name = f"response_cache_{counter}_total"
+        yield f"# TYPE {name} counter"
+        for endpoint, values in sorted(stats["endpoints"].items()):
+            yield f'{name}{{endpoint="{endpoint}"}} {values[counter]}'
+    for gauge in ("entries", "bytes"):
+        if gauge in stats:
+            yield f"# TYPE response_cache_{gauge} gauge"
+            yield f"response_cache_{gauge} {stats[gauge]}"
+    yield "# TYPE response_cache_invalidations_total counter"
+    yield f"response_cache_invalidations_total {stats['invalidations']}"
+
+# Гистограммы для Prometheus; с METRICS_TOKEN доступны только по токену
+@router.get("/metrics", response_class=Response)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN:
+        authorization = request.headers.get("authorization", "")
+        if not secrets.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный токен метрик")
+    return Response(content=metrics.render(cache_lines()), media_type=PROMETHEUS_MEDIA_TYPE)
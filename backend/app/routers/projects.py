@@ -1,120 +1,158 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from sqlalchemy.orm import Session
-from app import crud, schemas, models
-from app.database import get_db
-from app.dependencies import role_required
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from typing import List, Optional
+from app import crud, etags, schemas
+from app.cache import response_cache
+from app.config import PROJECT_DETAIL_TASK_LIMIT
+from app.database import AwaitableSession, get_db
+from app.dependencies import role_required, task_fields
 from app.models import RoleEnum
+from app.pagination import PageParams, page_params, set_next_cursor
+from app.principals import Principal
 
 router = APIRouter(
     prefix="/projects",
     tags=["projects"],
 )
 
-@router.get("/", response_model=List[schemas.Project])
-def get_projects(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+project_page = page_params("created_at", "id", default="created_at")
+search_page = page_params("rank", "created_at", "id", default="rank")
+project_task_page = page_params("created_at", "id", default="id", default_limit=PROJECT_DETAIL_TASK_LIMIT)
+
+@router.get("/", response_model=List[schemas.Project], responses={304: {"description": "Страница не изменилась"}})
+async def get_projects(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(project_page),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    return crud.get_projects(db)
+    versions, next_cursor = await db.run(crud.get_project_versions, page)
+    # Списки проверяются только по ETag (см. app.etags)
+    tag = etags.rows_etag(request, None, versions)
+    if etags.is_not_modified(request, tag):
+        response = etags.not_modified(tag)
+        set_next_cursor(response, next_cursor)
+        return response
+    cached = await response_cache.lookup(request, "projects")
+    if cached is not None:
+        etags.set_validators(cached, tag)
+        return cached
+
+    projects, next_cursor = await db.run(crud.get_projects, page)
+    set_next_cursor(response, next_cursor)
+    etags.set_validators(response, tag)
+    return await response_cache.store(request, "projects", projects, ["projects"],
+                                      List[schemas.Project], response.headers)
 
 @router.post("/", response_model=schemas.Project)
-def create_project(
+async def create_project(
     project: schemas.ProjectCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
 ):
-    db_project = crud.create_project(db=db, project=project)
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    return await db.run(crud.create_project, project=project)
 
 @router.get("/search/", response_model=List[schemas.Project])
-def search_projects(
+async def search_projects(
     query: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+    response: Response,
+    page: PageParams = Depends(search_page),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    return crud.search_projects(db, query)
+    projects, next_cursor = await db.run(crud.search_projects, query, page)
+    set_next_cursor(response, next_cursor)
+    return projects
 
 @router.delete("/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_project(
+async def delete_project(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
 ):
-    db_project = crud.get_project(db, project_id)
+    db_project = await db.run(crud.get_project, project_id)
     if not db_project:
         raise HTTPException(status_code=404, detail="Проект не найден")
-    success = crud.delete_project(db, project_id)
+    success = await db.run(crud.delete_project, project_id)
     if not success:
         raise HTTPException(status_code=400, detail="Не удалось удалить проект")
     return
 
-@router.get("/{project_id}/detail", response_model=schemas.ProjectDetail)
-def get_project_detail(
+@router.get("/{project_id}/detail", response_model=schemas.ProjectDetail,
+            responses={304: {"description": "Проект не изменился"}})
+async def get_project_detail(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(project_task_page),
+    fields: Optional[List[str]] = Depends(task_fields),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    project, tasks, participants = crud.get_project_with_details(db, project_id)
-    if not project:
+    current = await db.run(crud.get_project_version, project_id)
+    if not current:
+        raise HTTPException(status_code=404, detail="Проект не найден")
+    # Версия проекта увеличивается и при изменении его задач. Число
+    # просроченных задач меняется с наступлением срока, поэтому в ETag
+    # входит и ближайший срок незавершённой задачи
+    expires_at = await db.run(crud.next_overdue_at, project_id)
+    tag = etags.make_etag("project", project_id, current.version, expires_at, request.url.query)
+    modified = current.updated_at or current.created_at
+    if etags.is_not_modified(request, tag, modified):
+        return etags.not_modified(tag, modified)
+    cached = await response_cache.lookup(request, "project-detail")
+    if cached is not None:
+        etags.set_validators(cached, tag, modified)
+        return cached
+
+    detail, next_cursor = await db.run(crud.get_project_with_details, project_id, page, fields)
+    if detail is None:
         raise HTTPException(status_code=404, detail="Проект не найден")
+    set_next_cursor(response, next_cursor)
+    etags.set_validators(response, tag, modified)
+    # В деталях есть имена руководителя, участников и исполнителей
+    tags = [f"project:{project_id}", "users"]
 
-    project_data = {
-        "id": project.id,
-        "name": project.name,
-        "description": project.description,
-        "created_at": project.created_at,
-        "leader": project.leader,  # будет None, если не назначен
-        "tasks": tasks,
-        "participants": participants
-    }
-    return project_data
+    if fields is not None:
+        # Компактные строки задач не проходят валидацию ProjectDetail
+        content = schemas.ProjectDetail(**{**detail, "tasks": []}).dict()
+        content["tasks"] = [dict(row._mapping) for row in detail["tasks"]]
+        return await response_cache.store(request, "project-detail", content, tags, headers=response.headers,
+                                          expires_at=expires_at)
+    return await response_cache.store(request, "project-detail", detail, tags,
+                                      schemas.ProjectDetail, response.headers, expires_at=expires_at)
 
 @router.post("/{project_id}/participants")
-def add_participant(
+async def add_participant(
     project_id: int,
     participant_data: schemas.ParticipantCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
 ):
-    project = crud.add_participant_to_project(db, project_id, participant_data.user_id)
+    project = await db.run(crud.add_participant_to_project, project_id, participant_data.user_id)
     if project is None:
         raise HTTPException(status_code=404, detail="Не удалось добавить участника. Проверьте проект и пользователя.")
     return {"message": "Участник успешно добавлен"}
 
-@router.post("/{project_id}/leader", response_model=schemas.ProjectDetail)
-def set_project_leader(
+@router.post("/{project_id}/leader")
+async def set_project_leader(
     project_id: int,
     data: schemas.AssignLeaderData,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
 ):
-    updated_project = crud.assign_leader(db, project_id, data.user_id)
-    if not updated_project:
+    if not await db.run(crud.assign_leader, project_id, data.user_id):
         raise HTTPException(status_code=404, detail="Проект или пользователь не найдены")
+    return {"message": "Руководитель проекта назначен", "project_id": project_id, "leader_id": data.user_id}
 
-    # Перезагружаем детализированные данные проекта
-    project_obj, tasks, participants = crud.get_project_with_details(db, project_id)
-    return schemas.ProjectDetail(
-        id=project_obj.id,
-        name=project_obj.name,
-        description=project_obj.description,
-        created_at=project_obj.created_at,
-        tasks=tasks,
-        participants=participants,
-        leader=project_obj.leader
-    )
-    
 @router.delete("/{project_id}/participants/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_participant(
+async def remove_participant(
     project_id: int,
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
 ):
-    success = crud.remove_participant_from_project(db, project_id, user_id)
+    success = await db.run(crud.remove_participant_from_project, project_id, user_id)
     if not success:
         raise HTTPException(status_code=404, detail="Участник или проект не найдены")
     return
\ No newline at end of file
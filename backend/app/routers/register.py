@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
 from app import crud, schemas, models
-from app.database import get_db
+from app.database import AwaitableSession, get_db
+from app.hashing import hash_password
 from app.models import RoleEnum
 
 router = APIRouter(
@@ -10,12 +10,14 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def register_user(user: schemas.UserCreate, db: AwaitableSession = Depends(get_db)):
+    db_user = await db.run(crud.get_user_by_username, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Имя пользователя уже зарегистрировано")
+    await db.release()
 
     user.role = RoleEnum.executor
 
-    new_user = crud.create_user(db=db, user=user)
+    hashed_password = await hash_password(user.password)
+    new_user = await db.run(crud.create_user, user=user, hashed_password=hashed_password)
     return new_user
@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import TaskStatus, Task
-from app import models
-from typing import List
+from fastapi import APIRouter, Depends, Query, Request
+from app.database import AwaitableSession, get_db
+from fastapi.responses import StreamingResponse
+from app import crud, exports
+from app.cache import response_cache
 from app.dependencies import role_required
 from app.models import RoleEnum
+from app.principals import Principal
 
 router = APIRouter(
     prefix="/reports",
@@ -13,23 +13,36 @@ router = APIRouter(
 )
 
 @router.get("/task-stats")
-def get_task_statistics(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager])),
+async def get_task_statistics(
+    request: Request,
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager])),
     project_id: int = Query(None, description="ID проекта для фильтрации задач")
 ):
-    query = db.query(Task)
-    if project_id is not None:
-        query = query.filter(Task.project_id == project_id)
+    cached = await response_cache.lookup(request, "task-stats")
+    if cached is not None:
+        return cached
+    stats = await db.run(crud.get_task_stats, project_id)
+    # Число просроченных меняется и без записей, с наступлением срока
+    expires_at = await db.run(crud.next_overdue_at, project_id)
+    return await response_cache.store(request, "task-stats", stats, ["tasks"], expires_at=expires_at)
 
-    total_tasks = query.count()
-    completed_tasks = query.filter(Task.status == TaskStatus.completed).count()
-    in_progress_tasks = query.filter(Task.status == TaskStatus.in_progress).count()
-    new_tasks = query.filter(Task.status == TaskStatus.new).count()
+@router.get("/task-stats/breakdown")
+async def get_task_statistics_breakdown(
+    by: str = Query(..., regex="^(status|priority|project|assignee)$", description="Разрез отчёта"),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager])),
+    project_id: int = Query(None, description="ID проекта для фильтрации задач")
+):
+    return await db.run(crud.get_task_stats_breakdown, by, project_id)
 
-    return {
-        "total_tasks": total_tasks,
-        "completed_tasks": completed_tasks,
-        "in_progress_tasks": in_progress_tasks,
-        "new_tasks": new_tasks,
-    }
\ No newline at end of file
+@router.get("/export", response_class=StreamingResponse)
+async def export_task_statistics(
+    by: str = Query(..., regex="^(status|priority|project|assignee)$", description="Разрез отчёта"),
+    format: str = Query("csv", regex=exports.FORMAT_PATTERN, description="csv или ndjson"),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager])),
+    project_id: int = Query(None, description="ID проекта для фильтрации задач")
+):
+    return exports.export_response(
+        lambda db: crud.task_stats_breakdown_query(db, by, project_id), format, f"task-stats-{by}",
+    )
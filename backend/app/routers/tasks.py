@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
-from typing import List
-from sqlalchemy.orm import Session
-from app import crud, schemas, models
-from app.database import get_db
-from app.dependencies import role_required, get_current_user
-from app.models import RoleEnum, Attachment
-from datetime import datetime
-import os
-import shutil
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from app import blobs, crud, downloads, etags, exports, schemas, serializers
+from app.config import TASK_TREE_MAX_DEPTH
+from app.database import AwaitableSession, get_db
+from app.dependencies import role_required, get_current_user, task_fields
+from app.models import RoleEnum
+from app.pagination import PageParams, page_params, rows_response, set_next_cursor
+from app.principals import Principal
 
 router = APIRouter(
     prefix="/tasks",
@@ -16,141 +16,271 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.get("/", response_model=List[schemas.Task])
-def read_tasks(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+task_page = page_params("created_at", "id", default="created_at")
+search_page = page_params("rank", "created_at", "id", default="rank")
+
+@router.get("/", response_model=List[schemas.Task], responses={304: {"description": "Страница не изменилась"}})
+async def read_tasks(
+    request: Request,
+    filters: schemas.TaskFilter = Depends(),
+    page: PageParams = Depends(task_page),
+    fields: Optional[List[str]] = Depends(task_fields),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    if current_user.role.name == RoleEnum.executor.value:
-        tasks = db.query(models.Task).filter(models.Task.assigned_user_id == current_user.id).all()
+    assignee_id = current_user.id if current_user.role == RoleEnum.executor else None
+    versions, next_cursor = await db.run(crud.get_task_versions, filters, page, assignee_id)
+    # Списки проверяются только по ETag (см. app.etags)
+    tag = etags.rows_etag(request, assignee_id, versions)
+    if etags.is_not_modified(request, tag):
+        response = etags.not_modified(tag)
+        set_next_cursor(response, next_cursor)
+        return response
+
+    if assignee_id is not None:
+        tasks, next_cursor = await db.run(crud.get_tasks_by_assignee, assignee_id, filters, page, fields)
     else:
-        tasks = crud.get_tasks(db)
-    return tasks
+        tasks, next_cursor = await db.run(crud.get_tasks, filters, page, fields)
+    if fields is not None:
+        response = rows_response(tasks, next_cursor)
+    else:
+        response = serializers.json_response(List[schemas.Task], tasks)
+        set_next_cursor(response, next_cursor)
+    etags.set_validators(response, tag)
+    return response
 
-@router.post("/", response_model=schemas.Task)
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    db_task = models.Task(
-        description=task.description,
-        details=task.details,
-        project_id=task.project_id,
-        assigned_user_id=task.assigned_user_id,
-        creator_id=current_user.id,
-        estimated_time=task.estimated_time,
-        assignment_date=datetime.utcnow() if task.assigned_user_id else None
+# Выгрузка всех задач по фильтрам списка без постраничной разбивки;
+# колонки — как у view=summary или заданные в fields
+@router.get("/export", response_class=StreamingResponse)
+async def export_tasks(
+    format: str = Query("csv", regex=exports.FORMAT_PATTERN, description="csv или ndjson"),
+    filters: schemas.TaskFilter = Depends(),
+    fields: Optional[List[str]] = Depends(task_fields),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+):
+    columns = fields or list(schemas.TASK_SUMMARY_FIELDS)
+    assignee_id = current_user.id if current_user.role == RoleEnum.executor else None
+    return exports.export_response(
+        lambda db: crud.export_tasks_query(db, columns, filters, assignee_id), format, "tasks",
     )
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
-    return db_task
+
+@router.post("/", response_model=schemas.Task)
+async def create_task(task: schemas.TaskCreate, db: AwaitableSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run(crud.create_task, task, current_user.id)
+
+# Массовые операции объявлены до маршрутов /{task_id}, чтобы путь /bulk
+# не разбирался как идентификатор задачи
+@router.post("/bulk", response_model=schemas.TaskBulkResult)
+async def bulk_create_tasks(
+    payload: schemas.TaskBulkCreate,
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return await db.run(crud.bulk_create_tasks, payload.tasks, current_user.id)
+
+@router.patch("/bulk", response_model=schemas.TaskBulkResult)
+async def bulk_update_tasks(
+    payload: schemas.TaskBulkUpdate,
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+):
+    changes = payload.changes
+    only_assignee = None
+    if current_user.role == RoleEnum.executor:
+        if "assigned_user_id" in changes.__fields_set__:
+            raise HTTPException(status_code=403, detail="Недостаточно прав для выполнения операции")
+        # Исполнитель изменяет только назначенные ему задачи
+        only_assignee = current_user.id
+    if changes.assigned_user_id is not None and not await db.run(crud.user_exists, changes.assigned_user_id):
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    try:
+        return await db.run(crud.bulk_update_tasks, payload, only_assignee, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/bulk", response_model=schemas.TaskBulkResult)
+async def bulk_delete_tasks(
+    payload: schemas.TaskBulkSelection,
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+):
+    try:
+        return await db.run(crud.bulk_delete_tasks, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.put("/{task_id}", response_model=schemas.Task)
-def update_task(
+async def update_task(
     task_id: int,
     task_update: schemas.TaskUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    task = crud.get_task(db, task_id)
+    task = await db.run(crud.get_task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Задача не найдена")
-    if current_user.role.name == RoleEnum.executor.value and task.assigned_user_id != current_user.id:
+    if current_user.role == RoleEnum.executor and task.assigned_user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Нет прав на изменение этой задачи")
-    return crud.update_task(db, task, task_update)
+    return await db.run(crud.update_task, task, task_update, current_user.id)
 
-@router.get("/{task_id}", response_model=schemas.Task)
-def get_task(
+@router.get("/{task_id}", response_model=schemas.Task, responses={304: {"description": "Задача не изменилась"}})
+async def get_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor])),
+    request: Request,
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor])),
 ):
-    task = crud.get_task(db, task_id)
+    current = await db.run(crud.get_task_version, task_id)
+    if not current:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    tag, modified = etags.make_etag("task", task_id, current.version), current.updated_at or current.created_at
+    if etags.is_not_modified(request, tag, modified):
+        return etags.not_modified(tag, modified)
+
+    task = await db.run(crud.get_task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Задача не найдена")
-    return task
+    response = serializers.json_response(schemas.Task, task)
+    etags.set_validators(response, tag, modified)
+    return response
+
+# Задача со всеми подзадачами одним запросом и итогами по поддереву
+@router.get("/{task_id}/tree", response_model=schemas.TaskTreeNode)
+async def get_task_tree(
+    task_id: int,
+    max_depth: int = Query(TASK_TREE_MAX_DEPTH, ge=0, le=TASK_TREE_MAX_DEPTH, description="Глубина дерева"),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor])),
+):
+    tree = await db.run(crud.get_task_tree, task_id, max_depth)
+    if tree is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return tree
 
 @router.post("/{task_id}/comments", response_model=schemas.Comment)
-def add_comment(
+async def add_comment(
     task_id: int,
     comment: schemas.CommentCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    return crud.create_comment(db, comment, current_user.id, task_id)
+    return await db.run(crud.create_comment, comment, current_user.id, task_id)
 
-@router.post("/{task_id}/attachments", response_model=schemas.Attachment)
-def upload_attachment(
+# Тело запроса читается потоком в receive_upload, поэтому форма описана
+# для документации вручную
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+@router.post("/{task_id}/attachments", response_model=schemas.Attachment, openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_attachment(
     task_id: int,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+    request: Request,
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    task = crud.get_task(db, task_id)
-    if not task:
+    if not await db.run(crud.task_exists, task_id):
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    # Соединение с базой не удерживается, пока идёт передача файла
+    await db.release()
+    blob = await blobs.receive_upload(request)
 
-    upload_directory = "uploads"
-    os.makedirs(upload_directory, exist_ok=True)
-    file_location = os.path.join(upload_directory, file.filename)
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    attachment = schemas.AttachmentCreate(filename=blob.filename)
+    return await db.run(
+        crud.create_attachment, attachment, task_id, file_url=blobs.blob_url(blob.sha256),
+        size=blob.size, sha256=blob.sha256, content_type=blob.content_type,
+    )
 
-    attachment = schemas.AttachmentCreate(filename=file.filename)
-    return crud.create_attachment(db, attachment, task_id, file_url=file_location)
+@router.api_route(
+    "/{task_id}/attachments/{attachment_id}/content",
+    methods=["GET", "HEAD"],
+    response_class=Response,
+    responses={
+        200: {"description": "Содержимое файла"},
+        206: {"description": "Запрошенный диапазон байтов"},
+        304: {"description": "Файл не изменился"},
+        416: {"description": "Диапазон недоступен"},
+    },
+)
+async def download_attachment(
+    task_id: int,
+    attachment_id: int,
+    request: Request,
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+):
+    attachment = await db.run(crud.get_attachment, task_id, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Вложение не найдено")
+    await db.release()
+    return await downloads.attachment_response(request, attachment)
 
 @router.post("/{task_id}/subtasks", response_model=schemas.Task)
-def create_subtask(
+async def create_subtask(
     task_id: int,
     subtask_data: schemas.TaskCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager])),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager])),
 ):
-    parent_task = crud.get_task(db, task_id)
-    if not parent_task:
+    if not await db.run(crud.task_exists, task_id):
         raise HTTPException(status_code=404, detail="Родительская задача не найдена")
 
     subtask_data.parent_task_id = task_id
-    return crud.create_subtask(db, subtask_data, current_user.id)
+    return await db.run(crud.create_subtask, subtask_data, current_user.id)
 
 @router.get("/search/", response_model=List[schemas.Task])
-def search_tasks(
+async def search_tasks(
     query: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
+    filters: schemas.TaskFilter = Depends(),
+    page: PageParams = Depends(search_page),
+    fields: Optional[List[str]] = Depends(task_fields),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager, RoleEnum.executor]))
 ):
-    return crud.search_tasks(db, query)
+    tasks, next_cursor = await db.run(crud.search_tasks, query, filters, page, fields)
+    if fields is not None:
+        return rows_response(tasks, next_cursor)
+    response = serializers.json_response(List[schemas.Task], tasks)
+    set_next_cursor(response, next_cursor)
+    return response
 
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_task(
+async def delete_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
 ):
-    db_task = crud.get_task(db, task_id)
-    if not db_task:
+    if not await db.run(crud.task_exists, task_id):
         raise HTTPException(status_code=404, detail="Задача не найдена")
-    success = crud.delete_task(db, task_id)
+    success = await db.run(crud.delete_task, task_id)
     if not success:
         raise HTTPException(status_code=400, detail="Не удалось удалить задачу")
     return
 
 @router.delete("/{task_id}/attachments/{attachment_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_attachment(
+async def delete_attachment(
     task_id: int,
     attachment_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin, RoleEnum.manager]))
 ):
     # Получаем задачу
-    task = crud.get_task(db, task_id)
-    if not task:
+    if not await db.run(crud.task_exists, task_id):
         raise HTTPException(status_code=404, detail="Задача не найдена")
 
-    # Проверяем, что вложение относится к этой задаче
-    attachment = db.query(Attachment).filter(Attachment.id == attachment_id, Attachment.task_id == task_id).first()
-    if not attachment:
+    # Удаляется только вложение, относящееся к этой задаче
+    if not await db.run(crud.delete_attachment, task_id, attachment_id):
         raise HTTPException(status_code=404, detail="Вложение не найдено или не относится к этой задаче")
 
-    db.delete(attachment)
-    db.commit()
-
     return
\ No newline at end of file
@@ -1,75 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from typing import List
-from sqlalchemy.orm import Session
 from app import crud, schemas, models
-from app.database import get_db
+from app.cache import response_cache
+from app.database import AwaitableSession, get_db
 from app.dependencies import get_current_user, role_required
+from app.hashing import hash_password
 from app.models import RoleEnum
+from app.pagination import PageParams, page_params, set_next_cursor
+from app.principals import Principal
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
 )
 
+user_page = page_params("id", default="id")
+
 @router.post("/", response_model=schemas.User)
-def create_user(
+async def create_user(
     user: schemas.UserCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin]))
 ):
-    db_user = crud.get_user_by_username(db, username=user.username)
+    db_user = await db.run(crud.get_user_by_username, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Имя пользователя уже зарегистрировано")
-    return crud.create_user(db=db, user=user)
+    await db.release()
+    hashed_password = await hash_password(user.password)
+    return await db.run(crud.create_user, user=user, hashed_password=hashed_password)
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin]))
+async def read_users(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(user_page),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin]))
 ):
-    users = crud.get_users(db)
-    return users
+    cached = await response_cache.lookup(request, "users")
+    if cached is not None:
+        return cached
+    users, next_cursor = await db.run(crud.get_users, page)
+    set_next_cursor(response, next_cursor)
+    return await response_cache.store(request, "users", users, ["users"], List[schemas.User], response.headers)
 
 @router.get("/{user_id}", response_model=schemas.User)
-def get_user(
+async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    if current_user.id != user_id and current_user.role.name != RoleEnum.admin.value:
+    if current_user.id != user_id and current_user.role != RoleEnum.admin:
         raise HTTPException(status_code=403, detail="Недостаточно прав для выполнения операции")
-    user = crud.get_user(db, user_id)
+    user = await db.run(crud.get_user, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return user
 
 @router.put("/{user_id}", response_model=schemas.User)
-def update_user(
+async def update_user(
     user_id: int,
     user_update: schemas.UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    if current_user.id != user_id and current_user.role.name != RoleEnum.admin.value:
+    if current_user.id != user_id and current_user.role != RoleEnum.admin:
         raise HTTPException(status_code=403, detail="Недостаточно прав для выполнения операции")
     # Если редактируется роль, только администратор может это делать
-    if user_update.role is not None and current_user.role.name != RoleEnum.admin.value:
+    if user_update.role is not None and current_user.role != RoleEnum.admin:
         raise HTTPException(status_code=403, detail="Только администратор может изменять роль пользователя")
-    user = crud.update_user(db, user_id, user_update)
+    hashed_password = None
+    if user_update.password is not None:
+        await db.release()
+        hashed_password = await hash_password(user_update.password)
+    user = await db.run(crud.update_user, user_id, user_update, hashed_password)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(
+async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(role_required([RoleEnum.admin]))
+    db: AwaitableSession = Depends(get_db),
+    current_user: Principal = Depends(role_required([RoleEnum.admin]))
 ):
-    db_user = crud.get_user(db, user_id)
+    db_user = await db.run(crud.get_user, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    success = crud.delete_user(db, user_id)
+    success = await db.run(crud.delete_user, user_id)
     if not success:
         raise HTTPException(status_code=400, detail="Не удалось удалить пользователя")
     return
\ No newline at end of file
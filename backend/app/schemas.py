@@ -1,7 +1,8 @@
 from __future__ import annotations
-from pydantic import BaseModel
+from pydantic import BaseModel, root_validator, validator
 from typing import Optional, List
 from datetime import datetime
+from app.config import TASK_BULK_MAX_ITEMS
 from app.models import RoleEnum, TaskStatus, TaskPriority
 
 class AssignLeaderData(BaseModel):
@@ -92,8 +93,15 @@ class CommentCreate(BaseModel):
     class Config:
         orm_mode = True
 
+# Пользователь внутри задачи, комментария и проекта: без списка его задач,
+# чтобы представление задачи не зависело от других задач пользователя
+class UserSummary(UserBase):
+    role: Role
+    class Config:
+        orm_mode = True
+
 class CommentRead(CommentBase):
-    user: User
+    user: UserSummary
     class Config:
         orm_mode = True
 
@@ -104,9 +112,20 @@ class AttachmentBase(BaseModel):
     filename: str
     file_url: str
     task_id: int
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    content_type: Optional[str] = None
+    # Адрес скачивания: GET /tasks/{task_id}/attachments/{id}/content
+    download_url: Optional[str] = None
     class Config:
         orm_mode = True
 
+    @validator("download_url", always=True)
+    def build_download_url(cls, v, values):
+        if "id" in values and "task_id" in values:
+            return f"/tasks/{values['task_id']}/attachments/{values['id']}/content"
+        return v
+
 class AttachmentCreate(BaseModel):
     filename: str
     class Config:
@@ -144,11 +163,109 @@ class TaskUpdate(BaseModel):
     class Config:
         orm_mode = True
 
+# Компактная строка задачи для списков (view=summary): только скалярные
+# колонки, без вложенных пользователей, комментариев и вложений
+class TaskListItem(BaseModel):
+    id: int
+    description: str
+    status: TaskStatus
+    priority: TaskPriority
+    due_date: Optional[datetime] = None
+    project_id: Optional[int] = None
+    assigned_user_id: Optional[int] = None
+    creator_id: Optional[int] = None
+    parent_task_id: Optional[int] = None
+    estimated_time: float = 0.0
+    time_spent: float = 0.0
+    created_at: datetime
+    class Config:
+        orm_mode = True
+
+TASK_SUMMARY_FIELDS = tuple(TaskListItem.__fields__)
+
+class TaskFilter(BaseModel):
+    status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    project_id: Optional[int] = None
+    assigned_user_id: Optional[int] = None
+    due_from: Optional[datetime] = None
+    due_to: Optional[datetime] = None
+
+# Узел дерева подзадач; total_* и счётчики суммируются по выгруженному
+# поддереву, включая саму задачу
+class TaskTreeNode(BaseModel):
+    id: int
+    description: str
+    status: TaskStatus
+    priority: TaskPriority
+    parent_task_id: Optional[int] = None
+    assigned_user_id: Optional[int] = None
+    due_date: Optional[datetime] = None
+    estimated_time: float = 0.0
+    time_spent: float = 0.0
+    depth: int
+    total_estimated_time: float = 0.0
+    total_time_spent: float = 0.0
+    task_count: int = 1
+    completed_count: int = 0
+    completion_percent: float = 0.0
+    subtasks_truncated: bool = False
+    subtasks: List[TaskTreeNode] = []
+
+# Массовые операции: POST/PATCH/DELETE /tasks/bulk. Задачи для изменения
+# и удаления выбираются списком ids или фильтром, как в списке задач.
+def _check_bulk_size(items):
+    if len(items) > TASK_BULK_MAX_ITEMS:
+        raise ValueError(f"Не больше {TASK_BULK_MAX_ITEMS} задач в одном запросе")
+    return items
+
+class TaskBulkCreate(BaseModel):
+    tasks: List[TaskCreate]
+
+    _tasks_size = validator("tasks", allow_reuse=True)(_check_bulk_size)
+
+class TaskBulkSelection(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[TaskFilter] = None
+
+    _ids_size = validator("ids", allow_reuse=True)(_check_bulk_size)
+
+    @root_validator(skip_on_failure=True)
+    def check_selection(cls, values):
+        if (values.get("ids") is None) == (values.get("filter") is None):
+            raise ValueError("Укажите либо ids, либо filter")
+        return values
+
+class TaskBulkChanges(BaseModel):
+    status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    assigned_user_id: Optional[int] = None
+
+class TaskBulkUpdate(TaskBulkSelection):
+    changes: TaskBulkChanges
+
+    @validator("changes")
+    def check_changes(cls, v):
+        if not v.__fields_set__:
+            raise ValueError("Не указано ни одного изменения")
+        return v
+
+# Ошибка по отдельной задаче: index — позиция в списке tasks при создании,
+# id — задача при изменении и удалении
+class TaskBulkError(BaseModel):
+    index: Optional[int] = None
+    id: Optional[int] = None
+    detail: str
+
+class TaskBulkResult(BaseModel):
+    ids: List[int] = []
+    errors: List[TaskBulkError] = []
+
 class TaskRead(TaskBase):
     id: int
     status: TaskStatus
-    assigned_user: Optional[User] = None
-    creator: Optional[User] = None
+    assigned_user: Optional[UserSummary] = None
+    creator: Optional[UserSummary] = None
     project_id: Optional[int] = None
     project: Optional["Project"] = None
     time_spent: float = 0.0
@@ -163,14 +280,33 @@ class TaskRead(TaskBase):
 
 Task = TaskRead
 
+# Детали проекта (GET /projects/{project_id}/detail): пользователи без
+# списков их задач, страница задач проекта и сводка по статусам из счётчиков
+ProjectMember = UserSummary
+
+class ProjectTask(TaskListItem):
+    assigned_user: Optional[UserBase] = None
+    class Config:
+        orm_mode = True
+
+class ProjectTaskSummary(BaseModel):
+    total_tasks: int = 0
+    new_tasks: int = 0
+    in_progress_tasks: int = 0
+    completed_tasks: int = 0
+    overdue_tasks: int = 0
+    estimated_time: float = 0.0
+    time_spent: float = 0.0
+
 class ProjectDetail(BaseModel):
     id: int
     name: str
     description: Optional[str] = None
     created_at: datetime
-    leader: Optional[User] = None
-    tasks: List[Task] = []
-    participants: List[User] = []
+    leader: Optional[ProjectMember] = None
+    task_summary: ProjectTaskSummary
+    tasks: List[ProjectTask] = []
+    participants: List[ProjectMember] = []
     class Config:
         orm_mode = True
 
@@ -186,6 +322,7 @@ class Token(BaseModel):
         orm_mode = True
 
 # Обновление forward references
+TaskTreeNode.update_forward_refs()
 ProjectDetail.update_forward_refs()
 UserRead.update_forward_refs()
 TaskRead.update_forward_refs()
@@ -0,0 +1,241 @@
+import argparse
+import re
+import sys
+from sqlalchemy import column, func, literal, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+from app import models
+from app.config import SEARCH_TEXT_CONFIG
+
+# Полнотекстовый индекс задач и проектов. В SQLite это виртуальные таблицы
+# FTS5, в PostgreSQL — таблицы с tsvector и GIN-индексом. Индекс обновляется
+# триггерами базы данных, поэтому учитывает любые записи, включая массовые
+# UPDATE/DELETE в обход ORM. Запрос разбивается на слова, каждое ищется
+# по префиксу (для поиска по мере ввода), результаты ранжируются.
+#
+# Задача индексируется по описанию, деталям и тексту своих комментариев,
+# проект — по названию и описанию.
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Веса колонок: совпадение в описании задачи важнее, чем в комментариях
+TASK_WEIGHTS = (10.0, 4.0, 1.0)
+PROJECT_WEIGHTS = (10.0, 2.0)
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5("
+    "description, details, comments, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS project_search USING fts5("
+    "name, description, tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS tasks_search_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO task_search(rowid, description, details, comments)
+        VALUES (new.id, new.description, new.details, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_search_update AFTER UPDATE OF description, details ON tasks BEGIN
+        UPDATE task_search SET description = new.description, details = new.details WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_search_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM task_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_insert AFTER INSERT ON comments BEGIN
+        UPDATE task_search SET comments = (
+            SELECT group_concat(content, ' ') FROM comments WHERE task_id = new.task_id
+        ) WHERE rowid = new.task_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_update AFTER UPDATE OF content ON comments BEGIN
+        UPDATE task_search SET comments = (
+            SELECT group_concat(content, ' ') FROM comments WHERE task_id = new.task_id
+        ) WHERE rowid = new.task_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_delete AFTER DELETE ON comments BEGIN
+        UPDATE task_search SET comments = (
+            SELECT group_concat(content, ' ') FROM comments WHERE task_id = old.task_id
+        ) WHERE rowid = old.task_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS projects_search_insert AFTER INSERT ON projects BEGIN
+        INSERT INTO project_search(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS projects_search_update AFTER UPDATE OF name, description ON projects BEGIN
+        UPDATE project_search SET name = new.name, description = new.description WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS projects_search_delete AFTER DELETE ON projects BEGIN
+        DELETE FROM project_search WHERE rowid = old.id;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM task_search",
+    """INSERT INTO task_search(rowid, description, details, comments)
+       SELECT tasks.id, tasks.description, tasks.details,
+              coalesce((SELECT group_concat(content, ' ') FROM comments WHERE comments.task_id = tasks.id), '')
+       FROM tasks""",
+    "DELETE FROM project_search",
+    "INSERT INTO project_search(rowid, name, description) SELECT id, name, description FROM projects",
+]
+
+def _postgresql_ddl(config: str):
+    task_document = (
+        f"setweight(to_tsvector('{config}', coalesce(t.description, '')), 'A') || "
+        f"setweight(to_tsvector('{config}', coalesce(t.details, '')), 'B') || "
+        f"setweight(to_tsvector('{config}', coalesce((SELECT string_agg(c.content, ' ') "
+        f"FROM comments c WHERE c.task_id = t.id), '')), 'C')"
+    )
+    project_document = (
+        f"setweight(to_tsvector('{config}', coalesce(p.name, '')), 'A') || "
+        f"setweight(to_tsvector('{config}', coalesce(p.description, '')), 'B')"
+    )
+    return [
+        """CREATE TABLE IF NOT EXISTS task_search (
+            task_id INTEGER PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+            document TSVECTOR NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_task_search_document ON task_search USING GIN (document)",
+        """CREATE TABLE IF NOT EXISTS project_search (
+            project_id INTEGER PRIMARY KEY REFERENCES projects(id) ON DELETE CASCADE,
+            document TSVECTOR NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_project_search_document ON project_search USING GIN (document)",
+        f"""CREATE OR REPLACE FUNCTION task_search_refresh(target INTEGER) RETURNS VOID AS $$
+            INSERT INTO task_search(task_id, document)
+            SELECT t.id, {task_document} FROM tasks t WHERE t.id = target
+            ON CONFLICT (task_id) DO UPDATE SET document = EXCLUDED.document;
+        $$ LANGUAGE sql""",
+        f"""CREATE OR REPLACE FUNCTION project_search_refresh(target INTEGER) RETURNS VOID AS $$
+            INSERT INTO project_search(project_id, document)
+            SELECT p.id, {project_document} FROM projects p WHERE p.id = target
+            ON CONFLICT (project_id) DO UPDATE SET document = EXCLUDED.document;
+        $$ LANGUAGE sql""",
+        """CREATE OR REPLACE FUNCTION tasks_search_trigger() RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM task_search_refresh(NEW.id);
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION comments_search_trigger() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM task_search_refresh(OLD.task_id);
+            ELSE
+                PERFORM task_search_refresh(NEW.task_id);
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION projects_search_trigger() RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM project_search_refresh(NEW.id);
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS tasks_search ON tasks",
+        """CREATE TRIGGER tasks_search AFTER INSERT OR UPDATE OF description, details ON tasks
+           FOR EACH ROW EXECUTE FUNCTION tasks_search_trigger()""",
+        "DROP TRIGGER IF EXISTS comments_search ON comments",
+        """CREATE TRIGGER comments_search AFTER INSERT OR UPDATE OF content OR DELETE ON comments
+           FOR EACH ROW EXECUTE FUNCTION comments_search_trigger()""",
+        "DROP TRIGGER IF EXISTS projects_search ON projects",
+        """CREATE TRIGGER projects_search AFTER INSERT OR UPDATE OF name, description ON projects
+           FOR EACH ROW EXECUTE FUNCTION projects_search_trigger()""",
+    ]
+
+POSTGRESQL_REBUILD = [
+    "DELETE FROM task_search",
+    "SELECT task_search_refresh(id) FROM tasks",
+    "DELETE FROM project_search",
+    "SELECT project_search_refresh(id) FROM projects",
+]
+
+def tokens(text: str):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _statements(dialect: str):
+    if dialect == "sqlite":
+        return SQLITE_DDL, SQLITE_REBUILD
+    if dialect == "postgresql":
+        return _postgresql_ddl(SEARCH_TEXT_CONFIG), POSTGRESQL_REBUILD
+    return None, None
+
+# Создание индекса и триггеров; повторный вызов безопасен. Индекс базы,
+# созданной до его появления, заполняется по текущим данным.
+def ensure_index(db: Session):
+    ddl, rebuild_statements = _statements(db.get_bind().dialect.name)
+    if ddl is None:
+        return
+    connection = db.connection()
+    for statement in ddl:
+        connection.exec_driver_sql(statement)
+    missing_tasks = db.query(models.Task.id).first() is not None \
+        and not connection.exec_driver_sql("SELECT count(*) FROM task_search").scalar()
+    missing_projects = db.query(models.Project.id).first() is not None \
+        and not connection.exec_driver_sql("SELECT count(*) FROM project_search").scalar()
+    if missing_tasks or missing_projects:
+        for statement in rebuild_statements:
+            connection.exec_driver_sql(statement)
+    db.commit()
+
+def rebuild(db: Session):
+    _, rebuild_statements = _statements(db.get_bind().dialect.name)
+    connection = db.connection()
+    for statement in rebuild_statements or []:
+        connection.exec_driver_sql(statement)
+    db.commit()
+
+# Совпадения возвращаются подзапросом с колонками id и rank;
+# меньший rank означает более релевантный результат
+def _sqlite_match(index: str, weights, text: str):
+    fts = table(index, column("rowid"))
+    query = " ".join(f'"{token}"*' for token in tokens(text))
+    rank = func.bm25(literal_column(index), *weights)
+    return select(fts.c.rowid.label("id"), rank.label("rank"))\
+        .where(literal_column(index).op("MATCH")(query))\
+        .subquery()
+
+def _postgresql_match(index: str, key: str, text: str):
+    fts = table(index, column(key), column("document"))
+    tsquery = func.to_tsquery(SEARCH_TEXT_CONFIG, " & ".join(f"{token}:*" for token in tokens(text)))
+    # ts_rank растёт с релевантностью; знак меняется, чтобы, как и в bm25,
+    # лучшие совпадения шли первыми при сортировке по возрастанию
+    return select(fts.c[key].label("id"), (-func.ts_rank(fts.c.document, tsquery)).label("rank"))\
+        .where(fts.c.document.op("@@")(tsquery))\
+        .subquery()
+
+# Прочие базы: прежний поиск подстроки без ранжирования
+def _like_match(model, columns, text: str):
+    pattern = f"%{text}%"
+    return select(model.id.label("id"), literal(0.0).label("rank"))\
+        .where(or_(*[c.ilike(pattern) for c in columns]))\
+        .subquery()
+
+# Найденные задачи; None, если в запросе нет ни одного слова
+def match_tasks(db: Session, text: str):
+    if not tokens(text):
+        return None
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return _sqlite_match("task_search", TASK_WEIGHTS, text)
+    if dialect == "postgresql":
+        return _postgresql_match("task_search", "task_id", text)
+    return _like_match(models.Task, [models.Task.description, models.Task.details], text)
+
+def match_projects(db: Session, text: str):
+    if not tokens(text):
+        return None
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return _sqlite_match("project_search", PROJECT_WEIGHTS, text)
+    if dialect == "postgresql":
+        return _postgresql_match("project_search", "project_id", text)
+    return _like_match(models.Project, [models.Project.name, models.Project.description], text)
+
+def main(argv=None):
+    from app.database import SessionLocal
+    parser = argparse.ArgumentParser(description="Обслуживание полнотекстового индекса")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+    db = SessionLocal()
+    try:
+        ensure_index(db)
+        rebuild(db)
+        print("Поисковый индекс пересобран")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import enum
+import typing
+from datetime import date, datetime, time
+from functools import lru_cache
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional, Type
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+from app import metrics
+
+# Быстрая сериализация ответов на чтение. Для схемы ответа (pydantic v1,
+# orm_mode) один раз собирается функция, которая читает атрибуты объекта
+# ORM (или ключи словаря) и сразу строит JSON-совместимый словарь, без
+# from_orm, проверки типов и jsonable_encoder; результат кодируется orjson.
+# Вывод совпадает с обычным путём FastAPI для данных из базы: перечисления
+# — значениями, даты — в ISO 8601, float-поля — числами с точкой. Схемы с
+# валидаторами (например, AttachmentRead с вычисляемым download_url)
+# сериализуются через pydantic, как раньше.
+
+JSON_MEDIA_TYPE = "application/json"
+
+def _has_validators(model: Type[BaseModel]) -> bool:
+    return bool(model.__validators__ or model.__pre_root_validators__ or model.__post_root_validators__)
+
+def _scalar(type_, value: str) -> str:
+    if isinstance(type_, type):
+        if issubclass(type_, enum.Enum):
+            return f"{value}.value"
+        if issubclass(type_, (datetime, date, time)):
+            return f"{value}.isoformat()"
+        if issubclass(type_, float):
+            return f"float({value})"
+        if issubclass(type_, (bool, int, str)):
+            return value
+    return f"_encode({value})"
+
+# Выражение для значения поля; None пропускается как есть, как в pydantic
+# для Optional-полей и значений по умолчанию
+def _expression(field: ModelField, value: str, names: Dict[str, Any]) -> str:
+    type_ = field.type_
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        name = f"_{type_.__name__}"
+        names[name] = serializer(type_)
+        item = f"{name}(item)"
+        single = f"{name}({value})"
+    else:
+        item = _scalar(type_, "item")
+        single = _scalar(type_, value)
+    if field.shape == SHAPE_LIST:
+        return f"(None if {value} is None else [{item} for item in {value}])"
+    if field.shape == SHAPE_SINGLETON:
+        return f"(None if {value} is None else {single})"
+    return f"_encode({value})"
+
+def _compile(model: Type[BaseModel], from_dict: bool) -> Callable[[Any], dict]:
+    names: Dict[str, Any] = {"_encode": jsonable_encoder}
+    lines = ["def serialize(obj):"]
+    for index, (name, field) in enumerate(model.__fields__.items()):
+        default = f"_default{index}"
+        names[default] = field.get_default()
+        if from_dict:
+            lines.append(f"    v{index} = obj.get({name!r}, {default})")
+        else:
+            lines.append(f"    v{index} = getattr(obj, {name!r}, {default})")
+    items = ", ".join(
+        f"{field.alias!r}: {_expression(field, f'v{index}', names)}"
+        for index, field in enumerate(model.__fields__.values())
+    )
+    lines.append(f"    return {{{items}}}")
+    exec("\n".join(lines), names)
+    return names["serialize"]
+
+# Функция объект -> словарь для схемы; вложенные схемы собираются один раз
+@lru_cache(maxsize=None)
+def serializer(model: Type[BaseModel]) -> Callable[[Any], dict]:
+    if _has_validators(model):
+        return lambda obj: jsonable_encoder(model.parse_obj(obj) if isinstance(obj, dict) else model.from_orm(obj))
+    from_object, from_dict = None, None
+
+    def serialize(obj):
+        nonlocal from_object, from_dict
+        if isinstance(obj, dict):
+            if from_dict is None:
+                from_dict = _compile(model, from_dict=True)
+            return from_dict(obj)
+        if from_object is None:
+            from_object = _compile(model, from_dict=False)
+        return from_object(obj)
+    return serialize
+
+# model — схема ответа или List[схема], как response_model у маршрута
+def to_jsonable(model: Any, content: Any):
+    if typing.get_origin(model) is list:
+        item = serializer(typing.get_args(model)[0])
+        return [item(obj) for obj in content]
+    return serializer(model)(content)
+
+def dumps(model: Any, content: Any) -> bytes:
+    started = perf_counter()
+    body = orjson.dumps(to_jsonable(model, content))
+    metrics.record_serialization(started)
+    return body
+
+# Готовый ответ: FastAPI не выполняет повторную проверку response_model
+def json_response(model: Any, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=dumps(model, content), media_type=JSON_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Нагрузочный замер API внутри процесса: база заполняется синтетическими
+# данными (пользователи, проекты с участниками, деревья подзадач,
+# комментарии, вложения), затем сценарии выполняются через ASGI-клиент
+# httpx без сети и сервера. Для каждого сценария считаются p50/p90/p99
+# задержки и пропускная способность; результаты сохраняются в JSON, и
+# прогоны на разных коммитах сравниваются через --compare.
+# Запуск из каталога backend:
+#   python -m benchmarks.api --output results.json
+#   python -m benchmarks.api --compare results.json
+# База создаётся во временном файле, если не задан DATABASE_URL. Данные
+# зависят только от параметров заполнения и --seed.
+
+PASSWORD = "benchmark"
+# Фиксированное время, чтобы данные не зависели от дня запуска
+BASE_TIME = datetime(2024, 1, 1)
+
+WORDS = (
+    "отчёт задача проект ошибка релиз ревью тест сервер клиент оплата интеграция документация "
+    "дизайн миграция сборка деплой анализ встреча договор макет бюджет поддержка"
+).split()
+
+SCENARIOS = ("tasks", "tasks-executor", "project-detail", "task-stats", "search", "login")
+
+def sentence(rng, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+# Задачи проекта образуют деревья: родитель выбирается среди уже созданных
+# задач того же проекта, глубина не больше depth
+def seed(db, args):
+    from app import counters, models, search
+    from app.hashing import hash_password_sync
+    rng = random.Random(args.seed)
+    hashed_password = hash_password_sync(PASSWORD)
+    roles = {role.name: role.id for role in db.query(models.Role)}
+
+    managers = max(1, args.users // 10)
+    user_rows = [
+        dict(username=f"user{n}", full_name=f"Пользователь {n}", email=f"user{n}@example.com",
+             hashed_password=hashed_password,
+             role_id=roles[models.RoleEnum.manager if n < managers else models.RoleEnum.executor])
+        for n in range(args.users)
+    ]
+    db.execute(models.User.__table__.insert(), user_rows)
+    users = dict(db.query(models.User.username, models.User.id).filter(models.User.username.like("user%")))
+    manager_ids = [users[f"user{n}"] for n in range(managers)]
+    executor_ids = [users[f"user{n}"] for n in range(managers, args.users)] or manager_ids
+
+    project_rows = [
+        dict(name=f"Проект {n}", description=sentence(rng, 8), created_at=BASE_TIME,
+             leader_id=rng.choice(manager_ids))
+        for n in range(args.projects)
+    ]
+    db.execute(models.Project.__table__.insert(), project_rows)
+    projects = [project_id for project_id, in db.query(models.Project.id).order_by(models.Project.id)]
+
+    participant_rows, task_rows = [], []
+    next_id = (db.query(models.Task.id).order_by(models.Task.id.desc()).limit(1).scalar() or 0) + 1
+    statuses, priorities = list(models.TaskStatus), list(models.TaskPriority)
+    for project_id in projects:
+        members = rng.sample(executor_ids, min(args.participants, len(executor_ids)))
+        participant_rows += [dict(project_id=project_id, user_id=user_id) for user_id in members]
+        depths = {}
+        for _ in range(args.tasks):
+            parent = rng.choice(list(depths)) if depths and rng.random() < args.subtask_share else None
+            if parent is not None and depths[parent] >= args.depth:
+                parent = None
+            task_id, next_id = next_id, next_id + 1
+            depths[task_id] = depths[parent] + 1 if parent is not None else 1
+            created_at = BASE_TIME + timedelta(minutes=task_id)
+            task_rows.append(dict(
+                id=task_id, description=sentence(rng, 4), details=sentence(rng, 16),
+                status=rng.choice(statuses), priority=rng.choice(priorities), project_id=project_id,
+                assigned_user_id=rng.choice(members), creator_id=rng.choice(manager_ids),
+                due_date=created_at + timedelta(days=rng.randint(-10, 60)),
+                estimated_time=float(rng.randint(1, 16)), time_spent=float(rng.randint(0, 16)),
+                parent_task_id=parent, assignment_date=created_at, created_at=created_at,
+            ))
+    db.execute(models.project_participants.insert(), participant_rows)
+    db.execute(models.Task.__table__.insert(), task_rows)
+
+    comment_rows, attachment_rows = [], []
+    for task in task_rows:
+        for n in range(rng.randint(0, 2 * args.comments)):
+            comment_rows.append(dict(content=sentence(rng, 10), user_id=task["assigned_user_id"],
+                                     task_id=task["id"], created_at=task["created_at"] + timedelta(hours=n)))
+        for n in range(rng.randint(0, 2 * args.attachments)):
+            digest = f"{task['id']:032x}{n:032x}"
+            attachment_rows.append(dict(filename=f"file{n}.txt", file_url=f"uploads/blobs/{digest}",
+                                        task_id=task["id"], size=1024, sha256=digest, content_type="text/plain"))
+    if comment_rows:
+        db.execute(models.Comment.__table__.insert(), comment_rows)
+    if attachment_rows:
+        db.execute(models.Attachment.__table__.insert(), attachment_rows)
+    db.commit()
+    # Вставка мимо ORM: счётчики отчёта и поисковый индекс строятся заново
+    counters.rebuild(db)
+    search.rebuild(db)
+
+def dataset(db):
+    from app import models
+    return {
+        "users": db.query(models.User).count(),
+        "projects": db.query(models.Project).count(),
+        "participants": db.query(models.project_participants).count(),
+        "tasks": db.query(models.Task).count(),
+        "subtasks": db.query(models.Task).filter(models.Task.parent_task_id.isnot(None)).count(),
+        "comments": db.query(models.Comment).count(),
+        "attachments": db.query(models.Attachment).count(),
+    }
+
+def percentile(values, share: float) -> float:
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+def summarize(latencies, errors: int, elapsed: float, concurrency: int) -> dict:
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p90_ms": round(percentile(latencies, 0.90), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+# request(i) -> (метод, адрес, параметры httpx) для i-го запроса сценария
+async def run_scenario(client, request, requests: int, concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        method, url, options = request(i)
+        await client.request(method, url, **options)
+    numbers = itertools.count()
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        for i in numbers:
+            if i >= requests:
+                return
+            method, url, options = request(i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **options)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, concurrency)
+
+async def token(client, username: str, password: str) -> str:
+    response = await client.post("/auth/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+# executor — пользователь с назначенными задачами для входа и его списка задач
+async def run(args, projects, executor: str) -> dict:
+    import httpx
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    queries = [" ".join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(50)] + [word[:3] for word in WORDS]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        admin = {"Authorization": f"Bearer {await token(client, 'admin', 'admin123')}"}
+        own = {"Authorization": f"Bearer {await token(client, executor, PASSWORD)}"}
+        login = {"username": executor, "password": PASSWORD}
+        scenarios = {
+            "tasks": lambda i: ("GET", "/tasks/", {"params": {"limit": args.page_size}, "headers": admin}),
+            "tasks-executor": lambda i: ("GET", "/tasks/", {"params": {"limit": args.page_size}, "headers": own}),
+            "project-detail": lambda i: ("GET", f"/projects/{projects[i % len(projects)]}/detail",
+                                         {"params": {"limit": args.page_size}, "headers": admin}),
+            "task-stats": lambda i: ("GET", "/reports/task-stats",
+                                     {"params": {"project_id": projects[i % len(projects)]} if i % 2 else {},
+                                      "headers": admin}),
+            "search": lambda i: ("GET", "/tasks/search/",
+                                 {"params": {"query": queries[i % len(queries)], "limit": args.page_size},
+                                  "headers": admin}),
+            "login": lambda i: ("POST", "/auth/token", {"data": login}),
+        }
+        results = {}
+        for name in args.scenarios:
+            # Вход упирается в bcrypt, поэтому для него отдельное число запросов
+            requests = args.login_requests if name == "login" else args.requests
+            results[name] = await run_scenario(client, scenarios[name], requests, args.concurrency, args.warmup)
+            print_row(name, results[name])
+    return results
+
+def print_header():
+    print(f"\n{'сценарий':<16}{'запросов':>9}{'ошибок':>8}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'запр/с':>10}")
+
+def print_row(name: str, result: dict):
+    print(f"{name:<16}{result['requests']:>9}{result['errors']:>8}{result['p50_ms']:>10.2f}"
+          f"{result['p90_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['throughput_rps']:>10.1f}")
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+# Сравнение с прежним прогоном; регрессией считается рост p50 больше threshold
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    print(f"\nсравнение с {baseline.get('commit') or 'предыдущим прогоном'} ({baseline.get('created_at', '')})")
+    if baseline.get("dataset") != current["dataset"]:
+        print("Внимание: данные прогонов различаются, сравнение неточно")
+    print(f"{'сценарий':<16}{'p50, мс':>26}{'p99, мс':>26}{'запр/с':>26}")
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        cells = []
+        for key in ("p50_ms", "p99_ms", "throughput_rps"):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:.1f} -> {result[key]:.1f} ({change:+.0f}%)")
+        print(f"{name:<16}" + "".join(f"{cell:>26}" for cell in cells))
+        if before["p50_ms"] and result["p50_ms"] > before["p50_ms"] * (1 + threshold):
+            regressions.append(name)
+    if regressions:
+        print(f"Замедление больше {threshold:.0%} по p50: {', '.join(regressions)}")
+        return 1
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер задержек и пропускной способности API")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--participants", type=int, default=10, help="Участников в проекте")
+    parser.add_argument("--tasks", type=int, default=300, help="Задач в проекте")
+    parser.add_argument("--depth", type=int, default=5, help="Наибольшая глубина дерева подзадач")
+    parser.add_argument("--subtask-share", type=float, default=0.6, help="Доля задач, которые являются подзадачами")
+    parser.add_argument("--comments", type=int, default=2, help="Комментариев на задачу в среднем")
+    parser.add_argument("--attachments", type=int, default=1, help="Вложений на задачу в среднем")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="Запросов на сценарий")
+    parser.add_argument("--login-requests", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5, help="Запросов для прогрева, не учитываются")
+    parser.add_argument("--concurrency", type=int, default=4, help="Одновременных запросов")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--cache", choices=["none", "memory"], default="none",
+                        help="Кэш ответов; по умолчанию выключен, чтобы замерять обработку запроса")
+    parser.add_argument("--output", help="Файл JSON для результатов")
+    parser.add_argument("--compare", help="Файл JSON предыдущего прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимый рост p50 при сравнении")
+    args = parser.parse_args(argv)
+
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(), "api.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["CACHE_BACKEND"] = args.cache
+
+    from app import models
+    from app.config import DB_ASYNC
+    from app.database import SessionLocal, engine
+    # Импорт приложения создаёт схему, роли и администратора
+    import app.main  # noqa: F401
+
+    db = SessionLocal()
+    try:
+        if db.query(models.Project.id).first() is None:
+            started = time.perf_counter()
+            seed(db, args)
+            print(f"База заполнена за {time.perf_counter() - started:.1f} с")
+        counts = dataset(db)
+        projects = [project_id for project_id, in db.query(models.Project.id).order_by(models.Project.id)]
+        executor = db.query(models.User.username)\
+                     .join(models.User.assigned_tasks)\
+                     .order_by(models.User.id)\
+                     .limit(1)\
+                     .scalar()
+    finally:
+        # Соединение писателя SQLite единственное и нужно приложению
+        db.close()
+    print(", ".join(f"{name}: {count}" for name, count in counts.items()))
+    print_header()
+    results = asyncio.run(run(args, projects, executor))
+
+    report = {
+        "commit": commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": engine.url.get_backend_name(),
+        "db_async": DB_ASYNC,
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "dataset": counts,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты записаны в {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline:
+            return compare(json.load(baseline), report, args.threshold)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
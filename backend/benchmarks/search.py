@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Сравнение поиска задач: прежний ilike('%q%') против полнотекстового индекса.
+# Запуск из каталога backend:
+#   python -m benchmarks.search --tasks 50000
+# База создаётся во временном файле, если не задан DATABASE_URL.
+
+COMMON_WORDS = (
+    "отчёт задача проект ошибка релиз ревью тест сервер клиент оплата "
+    "интеграция документация дизайн миграция сборка деплой анализ встреча"
+).split()
+SYLLABLES = "ка ро ми на ле то ва ры су пе до ги за лю ко бе ну ти ша ёж".split()
+
+# Частые слова встречаются в каждом тексте, редкие составляют длинный хвост
+# словаря, как имена, термины и номера в реальных задачах
+def vocabulary(rng, size: int):
+    return ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)]
+
+def sentence(rng, rare, length):
+    return " ".join(rng.choice(COMMON_WORDS) if rng.random() < 0.3 else rng.choice(rare) for _ in range(length))
+
+# Префиксы, которые набирает пользователь в строке поиска
+def queries(rare):
+    word = rare[0]
+    return ["отч", "отчёт", "деплой сервер", word[:2], word[:4], word, f"{rare[1]} {rare[2]}", "xyz"]
+
+def seed(db, rare, tasks: int, comments_per_task: int):
+    from app import models
+    rng = random.Random(42)
+    project = models.Project(name="benchmark")
+    db.add(project)
+    db.flush()
+    task_rows = [
+        dict(description=sentence(rng, rare, 4), details=sentence(rng, rare, 12), project_id=project.id)
+        for _ in range(tasks)
+    ]
+    db.execute(models.Task.__table__.insert(), task_rows)
+    user_id = db.query(models.User.id).first()[0]
+    comment_rows = [
+        dict(content=sentence(rng, rare, 8), user_id=user_id, task_id=task_id)
+        for task_id in range(1, tasks + 1) for _ in range(comments_per_task)
+    ]
+    if comment_rows:
+        db.execute(models.Comment.__table__.insert(), comment_rows)
+    db.commit()
+
+def measure(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение ilike и полнотекстового поиска задач")
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--comments", type=int, default=1, help="Комментариев на задачу")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50, help="Размер страницы результатов")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Размер словаря редких слов")
+    args = parser.parse_args(argv)
+
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(), "search.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from sqlalchemy import or_
+    from app import crud, models, search
+    from app.database import SessionLocal, ensure_schema
+    from app.pagination import PageParams
+
+    ensure_schema()
+    db = SessionLocal()
+    try:
+        if db.query(models.Role.id).first() is None:
+            db.add(models.Role(name=models.RoleEnum.admin))
+            db.flush()
+        if db.query(models.User.id).first() is None:
+            db.add(models.User(username="benchmark", hashed_password="-", role_id=db.query(models.Role.id).first()[0]))
+            db.commit()
+        search.ensure_index(db)
+        rare = vocabulary(random.Random(7), args.vocabulary)
+        if db.query(models.Task.id).first() is None:
+            started = time.perf_counter()
+            seed(db, rare, args.tasks, args.comments)
+            print(f"Создано задач: {args.tasks} за {time.perf_counter() - started:.1f} с")
+
+        # Прежний путь: подстрока в описании, деталях и комментариях задачи
+        def like_search(query, limit):
+            pattern = f"%{query}%"
+            commented = db.query(models.Comment.task_id).filter(models.Comment.content.ilike(pattern))
+            rows = db.query(models.Task.id)\
+                .filter(or_(models.Task.description.ilike(pattern), models.Task.details.ilike(pattern),
+                            models.Task.id.in_(commented)))\
+                .order_by(models.Task.id)
+            return rows.limit(limit).all() if limit else rows.all()
+
+        def fts_search(query, limit):
+            rows, _ = crud.search_tasks(db, query, page=PageParams("rank", limit or None), fields=["id"])
+            return rows
+
+        for limit in (args.limit, 0):
+            title = f"страница из {limit} строк" if limit else "все результаты"
+            print(f"\n{title}")
+            print(f"{'запрос':<22}{'ilike, мс p50/p95':>22}{'FTS, мс p50/p95':>22}{'найдено ilike/FTS':>20}")
+            for query in queries(rare):
+                like = measure(lambda: like_search(query, limit), args.repeat)
+                fts = measure(lambda: fts_search(query, limit), args.repeat)
+                found = f"{len(like_search(query, limit))}/{len(fts_search(query, limit))}"
+                print(f"{query:<22}{like[0]:>11.2f}/{like[1]:<10.2f}{fts[0]:>11.2f}/{fts[1]:<10.2f}{found:>20}")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Сравнение сериализации ответов на чтение: прежний путь FastAPI
+# (from_orm по response_model, jsonable_encoder, json.dumps) против
+# собранных сериализаторов app.serializers с orjson. Строки загружаются
+# из базы один раз, измеряется только сериализация.
+# Запуск из каталога backend:
+#   python -m benchmarks.serialization --tasks 500
+# База создаётся во временном файле, если не задан DATABASE_URL.
+
+def seed(db, tasks: int, users: int, comments_per_task: int, attachments_per_task: int):
+    from app import models
+    project = models.Project(name="benchmark", description="Проект для замеров")
+    db.add(project)
+    role_id = db.query(models.Role.id).first()[0]
+    db.add_all(models.User(username=f"benchmark{n}", full_name=f"Исполнитель {n}", hashed_password="-",
+                           role_id=role_id) for n in range(users))
+    db.flush()
+    # Задачи распределяются между пользователями, как в рабочей базе
+    user_ids = [user_id for user_id, in db.query(models.User.id)]
+    now = datetime.utcnow()
+    task_rows = [
+        dict(description=f"Задача {i}", details="Подробности задачи " * 5, project_id=project.id,
+             assigned_user_id=user_ids[i % len(user_ids)], creator_id=user_ids[(i + 1) % len(user_ids)],
+             due_date=now + timedelta(days=i % 30), estimated_time=float(i % 8), time_spent=0.5, assignment_date=now, created_at=now)
+        for i in range(tasks)
+    ]
+    db.execute(models.Task.__table__.insert(), task_rows)
+    task_ids = [task_id for task_id, in db.query(models.Task.id).filter(models.Task.project_id == project.id)]
+    comment_rows = [
+        dict(content=f"Комментарий {n}", user_id=user_ids[n % len(user_ids)], task_id=task_id, created_at=now)
+        for task_id in task_ids for n in range(comments_per_task)
+    ]
+    if comment_rows:
+        db.execute(models.Comment.__table__.insert(), comment_rows)
+    attachment_rows = [
+        dict(filename=f"file{n}.txt", file_url=f"uploads/blobs/{task_id}/{n}", task_id=task_id, size=1024,
+             sha256="0" * 64, content_type="text/plain")
+        for task_id in task_ids for n in range(attachments_per_task)
+    ]
+    if attachment_rows:
+        db.execute(models.Attachment.__table__.insert(), attachment_rows)
+    db.commit()
+    return project.id
+
+def measure(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение сериализации через pydantic и app.serializers")
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--users", type=int, default=20, help="Исполнителей, между которыми распределены задачи")
+    parser.add_argument("--comments", type=int, default=3, help="Комментариев на задачу")
+    parser.add_argument("--attachments", type=int, default=1, help="Вложений на задачу")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(), "serialization.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from typing import List
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import parse_obj_as
+    from app import crud, models, schemas, serializers
+    from app.database import SessionLocal, ensure_schema
+
+    ensure_schema()
+    db = SessionLocal()
+    try:
+        if db.query(models.Role.id).first() is None:
+            db.add(models.Role(name=models.RoleEnum.admin))
+            db.commit()
+        project_id = db.query(models.Project.id).filter(models.Project.name == "benchmark").scalar()
+        if project_id is None:
+            started = time.perf_counter()
+            project_id = seed(db, args.tasks, args.users, args.comments, args.attachments)
+            print(f"Создано задач: {args.tasks} за {time.perf_counter() - started:.1f} с")
+
+        tasks = db.query(models.Task).options(*crud.TASK_READ_PLAN)\
+                  .filter(models.Task.project_id == project_id).all()
+        detail, _ = crud.get_project_with_details(db, project_id)
+        cases = (
+            ("задачи (GET /tasks/)", List[schemas.Task], tasks, len(tasks)),
+            ("детали проекта", schemas.ProjectDetail, detail, len(detail["tasks"])),
+        )
+
+        def pydantic_path(model, content):
+            return json.dumps(jsonable_encoder(parse_obj_as(model, content)), ensure_ascii=False,
+                              separators=(",", ":")).encode()
+
+        print(f"\n{'ответ':<24}{'строк':>7}{'pydantic, мс p50/p95':>24}{'orjson, мс p50/p95':>24}"
+              f"{'мкс/строка до/после':>24}")
+        for title, model, content, rows in cases:
+            if json.loads(pydantic_path(model, content)) != json.loads(serializers.dumps(model, content)):
+                print(f"{title}: результаты сериализации различаются")
+                return 1
+            before = measure(lambda: pydantic_path(model, content), args.repeat)
+            after = measure(lambda: serializers.dumps(model, content), args.repeat)
+            per_row = f"{before[0] * 1000 / rows:.1f}/{after[0] * 1000 / rows:.1f}"
+            print(f"{title:<24}{rows:>7}{before[0]:>13.2f}/{before[1]:<10.2f}{after[0]:>13.2f}/{after[1]:<10.2f}"
+                  f"{per_row:>24}")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+# Настройки задаются до импорта приложения: движки базы создаются при
+# импорте app.database. По умолчанию тесты работают с временной SQLite;
+# TEST_DATABASE_URL запускает весь набор на другой базе (например,
+# PostgreSQL). DATABASE_URL разработчика не используется, чтобы тесты не
+# писали в рабочую базу.
+_tmp = tempfile.mkdtemp(prefix="taskmanager-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["UPLOADS_DIR"] = os.path.join(_tmp, "uploads")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["NOTIFY_SMTP_HOST"] = ""
+os.environ["METRICS_ENABLED"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.database import SessionLocal
+from app.main import app
+
+PASSWORD = "secret"
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+@pytest.fixture(scope="session")
+def admin(client):
+    response = client.post("/auth/token", data={"username": "admin", "password": "admin123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+# У SQLite одно соединение писателя: перед запросами клиента, которые
+# пишут в базу, транзакцию этой сессии нужно завершить (commit/rollback)
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def unique(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+# Пользователь с ролью role: (id, заголовки с его токеном)
+@pytest.fixture
+def make_user(client, admin):
+    def make(role: str = "executor", **fields):
+        username = unique(role)
+        response = client.post("/users/", json={"username": username, "password": PASSWORD, "role": role, **fields},
+                               headers=admin)
+        assert response.status_code == 200, response.text
+        token = client.post("/auth/token", data={"username": username, "password": PASSWORD}).json()["access_token"]
+        return response.json()["id"], {"Authorization": f"Bearer {token}"}
+    return make
+
+@pytest.fixture
+def make_project(client, admin):
+    def make():
+        response = client.post("/projects/", json={"name": unique("project")}, headers=admin)
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    return make
+
+# Задачи создаются одним запросом bulk; возвращает их id
+@pytest.fixture
+def make_tasks(client, admin):
+    def make(project_id: int, count: int, **fields):
+        tasks = [{"description": f"Задача {n}", "project_id": project_id, **fields} for n in range(count)]
+        response = client.post("/tasks/bulk", json={"tasks": tasks}, headers=admin)
+        assert response.status_code == 200, response.text
+        return response.json()["ids"]
+    return make
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+# Число SQL-запросов внутри блока with
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter)
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import time
+from app import blobs, models
+
+OLD = time.time() - 7200
+
+def write(path: str, content: bytes, mtime: float = OLD) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as target:
+        target.write(content)
+    os.utime(path, (mtime, mtime))
+    return path
+
+def write_blob(content: bytes, mtime: float = OLD) -> str:
+    sha256 = hashlib.sha256(content).hexdigest()
+    write(blobs.blob_path(sha256), content, mtime)
+    return sha256
+
+def attach(db, task_id: int, **fields):
+    db.add(models.Attachment(task_id=task_id, file_url="uploads/file", **fields))
+    db.commit()
+
+def test_gc_removes_only_stale_unreferenced_blobs(db, make_project, make_tasks):
+    task_id, = make_tasks(make_project(), 1)
+    referenced = write_blob(b"referenced")
+    orphan = write_blob(b"orphan")
+    recent = write_blob(b"recent", mtime=time.time())
+    attach(db, task_id, filename="a.txt", sha256=referenced)
+
+    report = blobs.collect_garbage(db, grace_seconds=3600)
+    db.rollback()
+    assert os.path.exists(blobs.blob_path(referenced))
+    assert not os.path.exists(blobs.blob_path(orphan))
+    assert os.path.exists(blobs.blob_path(recent))
+    assert report.skipped_recent >= 1
+
+def test_gc_keeps_blob_touched_by_concurrent_upload(db, monkeypatch):
+    sha256 = write_blob(b"uploaded again")
+    rename = os.rename
+
+    # Загрузка того же файла обновляет его между проверкой и удалением
+    def rename_after_upload(source, target):
+        os.utime(source)
+        rename(source, target)
+
+    monkeypatch.setattr(os, "rename", rename_after_upload)
+    blobs.collect_garbage(db, grace_seconds=3600)
+    db.rollback()
+    assert os.path.exists(blobs.blob_path(sha256))
+
+def test_store_recreates_blob_removed_by_gc(tmp_path):
+    content = b"removed meanwhile"
+    sha256 = hashlib.sha256(content).hexdigest()
+    temp_path = write(str(tmp_path / "upload"), content)
+    blobs._store(temp_path, sha256)
+    with open(blobs.blob_path(sha256), "rb") as stored:
+        assert stored.read() == content
+
+def test_legacy_sweep_is_opt_in(db, make_project, make_tasks):
+    task_id, = make_tasks(make_project(), 1)
+    kept = write(os.path.join(blobs.UPLOADS_DIR, "report.pdf"), b"legacy")
+    orphan = write(os.path.join(blobs.UPLOADS_DIR, "old.pdf"), b"legacy")
+    hidden = write(os.path.join(blobs.UPLOADS_DIR, ".keep"), b"")
+    attach(db, task_id, filename="report.pdf")
+
+    blobs.collect_garbage(db, grace_seconds=3600)
+    assert os.path.exists(orphan)
+
+    blobs.collect_garbage(db, grace_seconds=3600, legacy=True)
+    db.rollback()
+    assert os.path.exists(kept) and os.path.exists(hidden)
+    assert not os.path.exists(orphan)
@@ -0,0 +1,38 @@
+import time
+from datetime import datetime, timedelta
+
+def cache_status(client, headers, url):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.headers.get("X-Cache"), response.json()
+
+def test_tagged_write_invalidates_cached_response(client, admin, make_project, make_tasks):
+    project_id = make_project()
+    task_id, = make_tasks(project_id, 1)
+    url = f"/reports/task-stats?project_id={project_id}"
+    assert cache_status(client, admin, url)[0] == "MISS"
+    assert cache_status(client, admin, url)[0] == "HIT"
+
+    assert client.put(f"/tasks/{task_id}", json={"status": "Завершена"}, headers=admin).status_code == 200
+    status, stats = cache_status(client, admin, url)
+    assert status == "MISS" and stats["completed_tasks"] == 1
+
+def test_project_list_is_invalidated_by_new_project(client, admin, make_project):
+    cache_status(client, admin, "/projects/")
+    assert cache_status(client, admin, "/projects/")[0] == "HIT"
+    project_id = make_project()
+    status, projects = cache_status(client, admin, "/projects/")
+    assert status == "MISS" and project_id in [project["id"] for project in projects]
+
+# Срок наступает без записей в базу: запись кэша не должна его пережить
+def test_task_stats_expire_when_task_becomes_overdue(client, admin, make_project, make_tasks):
+    project_id = make_project()
+    due_date = datetime.utcnow() + timedelta(seconds=1.5)
+    make_tasks(project_id, 1, due_date=due_date.isoformat())
+    url = f"/reports/task-stats?project_id={project_id}"
+    assert cache_status(client, admin, url)[1]["overdue_tasks"] == 0
+    assert cache_status(client, admin, url)[0] == "HIT"
+
+    time.sleep(max(0.0, (due_date - datetime.utcnow()).total_seconds()) + 0.1)
+    status, stats = cache_status(client, admin, url)
+    assert status == "MISS" and stats["overdue_tasks"] == 1
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from fastapi import HTTPException, Request
+from app.events import RESET, ChangeBroker, Subscription, broker
+from app.models import RoleEnum
+from app.principals import Principal
+from app.routers.changes import _subscription, changes_event_stream
+
+def change(type="task.updated", project_id=1, user_ids=(), **data):
+    return {"type": type, "project_id": project_id, "user_ids": list(user_ids), **data}
+
+def run(coroutine_fn):
+    return asyncio.run(coroutine_fn())
+
+def test_broker_numbers_events_and_resumes_after_seq():
+    async def scenario():
+        changes = ChangeBroker(history_size=10)
+        first, second = change(task_id=1), change(task_id=2)
+        changes.publish([first, second])
+        assert second["seq"] == first["seq"] + 1
+
+        subscription = Subscription()
+        changes.subscribe(subscription, after=first["seq"])
+        assert subscription.backlog == [second]
+
+        listener = changes.listen(subscription, keepalive=0.01)
+        assert await listener.__anext__() == second
+        third = change(task_id=3)
+        changes.publish([third])
+        assert await listener.__anext__() == third
+        await listener.aclose()
+        assert subscription not in changes._subscriptions
+    run(scenario)
+
+def test_broker_resets_after_history_eviction():
+    async def scenario():
+        changes = ChangeBroker(history_size=3)
+        changes.publish([change(task_id=n) for n in range(5)])
+        evicted = changes._history[0]["seq"] - 2
+
+        subscription = Subscription()
+        changes.subscribe(subscription, after=evicted)
+        assert [item["type"] for item in subscription.backlog] == [RESET]
+
+        # Номер из будущего (например, до перезапуска с другими часами)
+        future = Subscription()
+        changes.subscribe(future, after=changes._seq + 1)
+        assert [item["type"] for item in future.backlog] == [RESET]
+
+        # Самое старое событие в истории ещё можно получить
+        resumed = Subscription()
+        changes.subscribe(resumed, after=changes._history[0]["seq"] - 1)
+        assert len(resumed.backlog) == 3
+    run(scenario)
+
+def test_executor_project_filter_gets_only_own_tasks():
+    executor = Principal(id=7, username="executor", role=RoleEnum.executor)
+
+    async def scenario():
+        subscription = _subscription(executor, [1], None)
+        assert subscription.matches(change(project_id=1, user_ids=[7]))
+        assert not subscription.matches(change(project_id=1, user_ids=[8]))
+        assert not subscription.matches(change(project_id=2, user_ids=[7]))
+        with pytest.raises(HTTPException):
+            _subscription(executor, [1], 8)
+    run(scenario)
+
+def test_executor_websocket_does_not_receive_other_tasks_of_project(client, admin, make_user, make_project):
+    executor_id, headers = make_user("executor")
+    other_id, _ = make_user("executor")
+    project_id = make_project()
+    token = headers["Authorization"][7:]
+    with client.websocket_connect(f"/ws/changes?token={token}&project_id={project_id}") as websocket:
+        for assignee in (other_id, executor_id):
+            response = client.post("/tasks/", json={"description": "Задача", "project_id": project_id,
+                                                    "assigned_user_id": assignee}, headers=admin)
+            assert response.status_code == 200, response.text
+        received = websocket.receive_json()
+    assert received["type"] == "task.created" and received["user_ids"] == [executor_id]
+
+def test_event_stream_subscribes_only_while_streaming(make_user):
+    _, headers = make_user("manager")
+
+    async def scenario():
+        request = Request({"type": "http", "method": "GET", "path": "/sse/changes", "headers": []})
+        before = len(broker._subscriptions)
+        response = await changes_event_stream(request, token=headers["Authorization"][7:], project_id=None,
+                                              assignee_id=None, after=None, last_event_id=None)
+        # Клиент отключился до начала ответа
+        assert len(broker._subscriptions) == before
+
+        stream = response.body_iterator
+        reading = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        assert len(broker._subscriptions) == before + 1
+        broker.publish([change(task_id=1)])
+        assert (await reading).startswith("id: ")
+        await stream.aclose()
+        assert len(broker._subscriptions) == before
+    run(scenario)
@@ -0,0 +1,81 @@
+from app import counters
+
+# Материализованные счётчики (app.counters) должны совпадать с пересчётом
+# по таблице tasks после любой записи: через сессию, массовых операций и
+# каскадных удалений
+
+def assert_counters_match(db):
+    assert counters.verify(db) == []
+    db.rollback()
+
+def create_task(client, admin, project_id, **fields):
+    response = client.post("/tasks/", json={"description": "Задача", "project_id": project_id, **fields},
+                           headers=admin)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def test_counters_after_create_and_update(client, admin, db, make_user, make_project):
+    user_id, _ = make_user("executor")
+    project_id = make_project()
+    task_id = create_task(client, admin, project_id, assigned_user_id=user_id, estimated_time=3.0)
+    response = client.post(f"/tasks/{task_id}/subtasks", json={"description": "Подзадача", "project_id": project_id,
+                                                                "estimated_time": 1.5}, headers=admin)
+    assert response.status_code == 200
+    assert_counters_match(db)
+
+    changes = {"status": "В процессе", "priority": "Высокий", "time_spent": 2.0, "estimated_time": 4.0}
+    assert client.put(f"/tasks/{task_id}", json=changes, headers=admin).status_code == 200
+    assert_counters_match(db)
+
+    stats = client.get(f"/reports/task-stats?project_id={project_id}", headers=admin).json()
+    assert (stats["total_tasks"], stats["in_progress_tasks"], stats["estimated_time"]) == (2, 1, 5.5)
+
+def test_counters_after_bulk_operations(client, admin, db, make_user, make_project, make_tasks):
+    first_id, _ = make_user("executor")
+    second_id, _ = make_user("executor")
+    project_id = make_project()
+    ids = make_tasks(project_id, 6, assigned_user_id=first_id, estimated_time=2.0)
+    assert_counters_match(db)
+
+    selection = {"ids": ids[:4], "changes": {"status": "Завершена", "assigned_user_id": second_id}}
+    assert client.patch("/tasks/bulk", json=selection, headers=admin).status_code == 200
+    assert_counters_match(db)
+
+    selection = {"filter": {"project_id": project_id, "status": "Новая"}, "changes": {"priority": "Низкий"}}
+    assert client.patch("/tasks/bulk", json=selection, headers=admin).status_code == 200
+    assert_counters_match(db)
+
+    response = client.request("DELETE", "/tasks/bulk", json={"ids": ids[::2]}, headers=admin)
+    assert response.json()["ids"] == ids[::2]
+    assert_counters_match(db)
+
+def test_counters_after_subtree_delete(client, admin, db, make_user, make_project):
+    user_id, _ = make_user("executor")
+    project_id = make_project()
+    root = create_task(client, admin, project_id, assigned_user_id=user_id, estimated_time=1.0)
+    parent = root
+    for depth in range(3):
+        response = client.post(f"/tasks/{parent}/subtasks", json={"description": f"Уровень {depth}",
+                                                                  "project_id": project_id,
+                                                                  "assigned_user_id": user_id,
+                                                                  "estimated_time": 1.0}, headers=admin)
+        parent = response.json()["id"]
+    assert client.delete(f"/tasks/{root}", headers=admin).status_code == 204
+    assert_counters_match(db)
+    stats = client.get(f"/reports/task-stats?project_id={project_id}", headers=admin).json()
+    assert stats["total_tasks"] == 0
+
+def test_counters_after_user_and_project_delete(client, admin, db, make_user, make_project, make_tasks):
+    user_id, _ = make_user("executor")
+    project_id = make_project()
+    make_tasks(project_id, 3, assigned_user_id=user_id, estimated_time=1.0)
+    other_project = make_project()
+    root = create_task(client, admin, other_project, assigned_user_id=user_id)
+    client.post(f"/tasks/{root}/subtasks", json={"description": "Подзадача", "project_id": other_project},
+                headers=admin)
+
+    assert client.delete(f"/users/{user_id}", headers=admin).status_code == 204
+    assert_counters_match(db)
+
+    assert client.delete(f"/projects/{other_project}", headers=admin).status_code == 204
+    assert_counters_match(db)
@@ -0,0 +1,61 @@
+import pytest
+from fastapi import HTTPException
+from app.downloads import parse_range
+
+CONTENT = b"0123456789abcdef"
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-3", (0, 3)),
+    ("bytes=10-", (10, 15)),
+    ("bytes=-4", (12, 15)),
+    ("bytes=-100", (0, 15)),
+    ("bytes=14-100", (14, 15)),
+    # Несколько диапазонов, другие единицы и неверный синтаксис: файл целиком
+    ("bytes=0-1,4-5", None),
+    ("items=0-3", None),
+    ("bytes=abc", None),
+    ("bytes=5-2", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+@pytest.mark.parametrize("header", ["bytes=16-", "bytes=100-200", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range(header, len(CONTENT))
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+@pytest.fixture
+def attachment_url(client, admin, make_project, make_tasks):
+    task_id, = make_tasks(make_project(), 1)
+    response = client.post(f"/tasks/{task_id}/attachments", files={"file": ("data.bin", CONTENT)}, headers=admin)
+    assert response.status_code == 200, response.text
+    return f"/tasks/{task_id}/attachments/{response.json()['id']}/content"
+
+def test_range_request_returns_partial_content(client, admin, attachment_url):
+    response = client.get(attachment_url, headers={**admin, "Range": "bytes=4-7"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[4:8]
+    assert response.headers["Content-Range"] == f"bytes 4-7/{len(CONTENT)}"
+    assert response.headers["Content-Length"] == "4"
+
+def test_range_past_end_returns_416(client, admin, attachment_url):
+    response = client.get(attachment_url, headers={**admin, "Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+def test_if_range_mismatch_returns_whole_file(client, admin, attachment_url):
+    etag = client.get(attachment_url, headers=admin).headers["ETag"]
+    matching = client.get(attachment_url, headers={**admin, "Range": "bytes=0-1", "If-Range": etag})
+    assert matching.status_code == 206 and matching.content == CONTENT[:2]
+
+    stale = client.get(attachment_url, headers={**admin, "Range": "bytes=0-1", "If-Range": '"0000"'})
+    assert stale.status_code == 200 and stale.content == CONTENT
+
+def test_conditional_and_head_requests(client, admin, attachment_url):
+    etag = client.get(attachment_url, headers=admin).headers["ETag"]
+    assert client.get(attachment_url, headers={**admin, "If-None-Match": etag}).status_code == 304
+    head = client.head(attachment_url, headers=admin)
+    assert head.status_code == 200 and head.content == b""
+    assert head.headers["Content-Length"] == str(len(CONTENT))
@@ -0,0 +1,111 @@
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+# Условные GET: после изменения любых данных, входящих в ответ, прежний
+# ETag не должен давать 304. Если сервер всё же отвечает 304, ответ без
+# условия должен совпадать с тем, что клиент сохранил вместе с ETag.
+
+def fetch(client, headers, url):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.headers["ETag"], response.json()
+
+def revalidate(client, headers, url, etag, body):
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    _, fresh = fetch(client, headers, url)
+    if response.status_code == 304:
+        assert fresh == body
+        return body
+    assert response.status_code == 200
+    assert response.json() == fresh
+    return fresh
+
+def test_sibling_task_change_keeps_etag_valid(client, admin, make_user, make_project, make_tasks):
+    user_id, _ = make_user("executor")
+    first, second = make_tasks(make_project(), 2, assigned_user_id=user_id)
+    url = f"/tasks/{first}"
+    etag, body = fetch(client, admin, url)
+    assert client.put(f"/tasks/{second}", json={"status": "Завершена"}, headers=admin).status_code == 200
+    revalidate(client, admin, url, etag, body)
+
+def test_assignee_rename_changes_task_etag(client, admin, make_user, make_project, make_tasks):
+    user_id, _ = make_user("executor", full_name="Старое имя")
+    task_id, = make_tasks(make_project(), 1, assigned_user_id=user_id)
+    url = f"/tasks/{task_id}"
+    etag, body = fetch(client, admin, url)
+    assert client.put(f"/users/{user_id}", json={"full_name": "Новое имя"}, headers=admin).status_code == 200
+    assert revalidate(client, admin, url, etag, body)["assigned_user"]["full_name"] == "Новое имя"
+
+def test_assignee_delete_changes_task_etag(client, admin, make_user, make_project, make_tasks):
+    user_id, _ = make_user("executor")
+    task_id, = make_tasks(make_project(), 1, assigned_user_id=user_id)
+    url = f"/tasks/{task_id}"
+    etag, body = fetch(client, admin, url)
+    assert client.delete(f"/users/{user_id}", headers=admin).status_code == 204
+    assert revalidate(client, admin, url, etag, body)["assigned_user"] is None
+
+def test_comment_author_rename_changes_task_etag(client, admin, make_user, make_project, make_tasks):
+    user_id, headers = make_user("manager")
+    task_id, = make_tasks(make_project(), 1)
+    assert client.post(f"/tasks/{task_id}/comments", json={"content": "Готово"}, headers=headers).status_code == 200
+    url = f"/tasks/{task_id}"
+    etag, body = fetch(client, admin, url)
+    assert client.put(f"/users/{user_id}", json={"full_name": "Автор"}, headers=admin).status_code == 200
+    assert revalidate(client, admin, url, etag, body)["comments"][0]["user"]["full_name"] == "Автор"
+
+def test_subtask_changes_parent_etag(client, admin, make_project, make_tasks):
+    project_id = make_project()
+    parent_id, = make_tasks(project_id, 1)
+    response = client.post(f"/tasks/{parent_id}/subtasks", json={"description": "Подзадача", "project_id": project_id},
+                           headers=admin)
+    subtask_id = response.json()["id"]
+    url = f"/tasks/{parent_id}"
+    etag, body = fetch(client, admin, url)
+    assert client.put(f"/tasks/{subtask_id}", json={"status": "Завершена"}, headers=admin).status_code == 200
+    body = revalidate(client, admin, url, etag, body)
+    assert [task["status"] for task in body["subtasks"]] == ["Завершена"]
+
+    etag, _ = fetch(client, admin, url)
+    assert client.delete(f"/tasks/{subtask_id}", headers=admin).status_code == 204
+    assert revalidate(client, admin, url, etag, body)["subtasks"] == []
+
+def test_leader_rename_changes_project_etag(client, admin, make_user, make_project):
+    user_id, _ = make_user("manager")
+    project_id = make_project()
+    assert client.post(f"/projects/{project_id}/leader", json={"user_id": user_id}, headers=admin).status_code == 200
+    url = f"/projects/{project_id}/detail"
+    etag, body = fetch(client, admin, url)
+    assert client.put(f"/users/{user_id}", json={"full_name": "Руководитель"}, headers=admin).status_code == 200
+    assert revalidate(client, admin, url, etag, body)["leader"]["full_name"] == "Руководитель"
+
+def test_empty_update_keeps_task_etag(client, admin, make_project, make_tasks):
+    task_id, = make_tasks(make_project(), 1)
+    url = f"/tasks/{task_id}"
+    etag, _ = fetch(client, admin, url)
+    assert client.put(url, json={}, headers=admin).status_code == 200
+    assert client.get(url, headers={**admin, "If-None-Match": etag}).status_code == 304
+
+def test_project_etag_changes_when_task_becomes_overdue(client, admin, make_project, make_tasks):
+    project_id = make_project()
+    due_date = datetime.utcnow() + timedelta(seconds=1)
+    make_tasks(project_id, 1, due_date=due_date.isoformat())
+    url = f"/projects/{project_id}/detail"
+    etag, body = fetch(client, admin, url)
+    assert body["task_summary"]["overdue_tasks"] == 0
+    time.sleep(max(0.0, (due_date - datetime.utcnow()).total_seconds()) + 0.1)
+    assert revalidate(client, admin, url, etag, body)["task_summary"]["overdue_tasks"] == 1
+
+def test_deleted_row_is_not_hidden_by_if_modified_since(client, admin, make_project, make_tasks):
+    project_id = make_project()
+    first, second = make_tasks(project_id, 2)
+    url = f"/tasks/?project_id={project_id}"
+    response = client.get(url, headers=admin)
+    assert "Last-Modified" not in response.headers
+    assert client.delete(f"/tasks/{second}", headers=admin).status_code == 204
+
+    since = format_datetime(datetime.now(timezone.utc) + timedelta(minutes=1), usegmt=True)
+    response = client.get(url, headers={**admin, "If-Modified-Since": since})
+    assert response.status_code == 200
+    assert [task["id"] for task in response.json()] == [first]
+    assert client.get("/projects/", headers={**admin, "If-Modified-Since": since}).status_code == 200
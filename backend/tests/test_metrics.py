@@ -0,0 +1,27 @@
+import logging
+from types import SimpleNamespace
+from app import metrics
+
+STATEMENT = "SELECT *\n  FROM tasks WHERE id = ?"
+
+def run_query(monkeypatch, elapsed: float):
+    connection = SimpleNamespace(info={metrics.QUERY_STARTED: [0.0]})
+    monkeypatch.setattr(metrics.time, "perf_counter", lambda: elapsed)
+    metrics._after_execute(connection, None, STATEMENT, (), None, False)
+
+def test_slow_query_is_logged_without_statement(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "METRICS_SLOW_QUERY_MS", 100)
+    with caplog.at_level(logging.WARNING, logger=metrics.__name__):
+        run_query(monkeypatch, 0.05)
+        assert caplog.records == []
+        run_query(monkeypatch, 0.25)
+    record, = caplog.records
+    assert record.levelno == logging.WARNING
+    assert "250.0 мс" in record.getMessage() and "tasks" not in record.getMessage()
+
+def test_slow_query_statement_is_logged_at_debug(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "METRICS_SLOW_QUERY_MS", 100)
+    with caplog.at_level(logging.DEBUG, logger=metrics.__name__):
+        run_query(monkeypatch, 0.25)
+    statement, = [record for record in caplog.records if record.levelno == logging.DEBUG]
+    assert statement.getMessage().endswith("SELECT * FROM tasks WHERE id = ?")
@@ -0,0 +1,113 @@
+import smtplib
+from datetime import datetime, timedelta
+import anyio
+import pytest
+from app import models, notifications
+from app.config import NOTIFY_CLAIM_TIMEOUT_SECONDS, NOTIFY_DIGEST_SECONDS, NOTIFY_MAX_ATTEMPTS, NOTIFY_RETRY_SECONDS
+from tests.conftest import unique
+
+def email():
+    return f"{unique('executor')}@example.com"
+
+@pytest.fixture
+def notified_user(client, admin, make_user, make_project, monkeypatch):
+    monkeypatch.setattr(notifications, "ENABLED", True)
+    user_id, _ = make_user("executor", email=email())
+    project_id = make_project()
+    for n in range(2):
+        response = client.post("/tasks/", json={"description": f"Задача {n}", "project_id": project_id,
+                                                "assigned_user_id": user_id}, headers=admin)
+        assert response.status_code == 200, response.text
+    return user_id
+
+def rows(db, user_id):
+    db.expire_all()
+    return db.query(models.Notification).filter(models.Notification.user_id == user_id)\
+             .order_by(models.Notification.id).all()
+
+def claim(db, user_id, now):
+    return [digest for digest in notifications.claim_digests(db, now=now) if digest.user_id == user_id]
+
+def test_notifications_are_written_with_the_change(db, notified_user):
+    notifications_rows = rows(db, notified_user)
+    assert [row.status for row in notifications_rows] == [notifications.PENDING] * 2
+    delay = notifications_rows[0].next_attempt_at - notifications_rows[0].created_at
+    assert delay == timedelta(seconds=NOTIFY_DIGEST_SECONDS)
+    db.rollback()
+
+def test_rolled_back_change_leaves_no_notification(db, make_user, monkeypatch):
+    monkeypatch.setattr(notifications, "ENABLED", True)
+    user_id, _ = make_user("executor", email=email())
+    db.query(models.User).filter(models.User.id == user_id).update({"full_name": "Не сохранится"})
+    notifications.notify(db, [user_id], "Изменение")
+    db.rollback()
+    db.commit()
+    assert rows(db, user_id) == []
+
+def test_digest_is_claimed_once(db, notified_user):
+    now = datetime.utcnow() + timedelta(seconds=NOTIFY_DIGEST_SECONDS)
+    digest, = claim(db, notified_user, now)
+    assert len(digest.ids) == 2 and len(digest.lines) == 2
+    assert claim(db, notified_user, now) == []
+    # Обработчик, не сообщивший результат, теряет захват по таймауту
+    stale = now + timedelta(seconds=NOTIFY_CLAIM_TIMEOUT_SECONDS + 1)
+    assert [digest.ids for digest in claim(db, notified_user, stale)] == [digest.ids]
+
+def test_failed_digest_is_retried_with_backoff(db, notified_user):
+    now = datetime.utcnow() + timedelta(seconds=NOTIFY_DIGEST_SECONDS)
+    for attempt in range(1, NOTIFY_MAX_ATTEMPTS + 1):
+        digest, = claim(db, notified_user, now)
+        notifications.record_results(db, [digest], {notified_user: "421 занято"}, now=now)
+        retried = rows(db, notified_user)
+        assert {row.attempts for row in retried} == {attempt}
+        if attempt < NOTIFY_MAX_ATTEMPTS:
+            delay = timedelta(seconds=NOTIFY_RETRY_SECONDS * 2 ** (attempt - 1))
+            assert {row.status for row in retried} == {notifications.PENDING}
+            assert {row.next_attempt_at for row in retried} == {now + delay}
+            assert claim(db, notified_user, now + delay - timedelta(seconds=1)) == []
+            now += delay
+    assert {row.status for row in rows(db, notified_user)} == {notifications.FAILED}
+    assert {row.last_error for row in rows(db, notified_user)} == {"421 занято"}
+    assert claim(db, notified_user, now + timedelta(days=1)) == []
+    db.rollback()
+
+class FakeSmtp:
+    def __init__(self, refused=()):
+        self.refused = set(refused)
+        self.messages = []
+
+    def send_message(self, message):
+        if message["To"] in self.refused:
+            raise smtplib.SMTPRecipientsRefused({message["To"]: (550, b"no such user")})
+        self.messages.append(message)
+
+    def quit(self):
+        pass
+
+# Уведомления пользователя становятся готовыми к отправке; возвращает его адрес
+def make_due(db, user_id) -> str:
+    db.query(models.Notification).filter(models.Notification.user_id == user_id)\
+      .update({"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+    db.commit()
+    address = db.query(models.User.email).filter(models.User.id == user_id).scalar()
+    db.rollback()
+    return address
+
+def test_deliver_batch_sends_one_digest_and_deletes_it(db, notified_user, monkeypatch):
+    smtp = FakeSmtp()
+    monkeypatch.setattr(notifications, "_connect", lambda: smtp)
+    address = make_due(db, notified_user)
+    anyio.run(notifications.deliver_batch, notifications.RateLimiter(0))
+    sent = [message for message in smtp.messages if message["To"] == address]
+    assert len(sent) == 1 and "(2)" in sent[0]["Subject"]
+    assert rows(db, notified_user) == []
+    db.rollback()
+
+def test_deliver_batch_keeps_refused_digest_for_retry(db, notified_user, monkeypatch):
+    address = make_due(db, notified_user)
+    monkeypatch.setattr(notifications, "_connect", lambda: FakeSmtp(refused={address}))
+    anyio.run(notifications.deliver_batch, notifications.RateLimiter(0))
+    retried = rows(db, notified_user)
+    assert {(row.status, row.attempts) for row in retried} == {(notifications.PENDING, 1)}
+    assert retried[0].last_error.startswith("Адрес отклонён")
+    db.rollback()
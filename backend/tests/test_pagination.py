@@ -0,0 +1,21 @@
+from app.config import DEFAULT_PAGE_SIZE
+from app.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+
+# Списки без limit отдаются страницами по DEFAULT_PAGE_SIZE; клиент
+# получает остальное по курсору
+
+def test_task_list_is_bounded_by_default(client, admin, make_project, make_tasks):
+    project_id = make_project()
+    ids = make_tasks(project_id, DEFAULT_PAGE_SIZE + 1)
+    url = f"/tasks/?project_id={project_id}"
+    first = client.get(url, headers=admin)
+    assert first.status_code == 200
+    assert len(first.json()) == DEFAULT_PAGE_SIZE
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+
+    rest = client.get(url, params={"cursor": cursor}, headers=admin)
+    assert NEXT_CURSOR_HEADER not in rest.headers
+    assert sorted(task["id"] for task in first.json() + rest.json()) == ids
+
+def test_page_size_is_capped(client, admin):
+    assert client.get("/users/", params={"limit": MAX_PAGE_SIZE + 1}, headers=admin).status_code == 422
@@ -0,0 +1,74 @@
+from typing import List
+import pytest
+from app import crud, models, schemas, serializers
+from tests.conftest import count_queries, unique
+
+# Число SQL-запросов на чтение задач не должно зависеть от числа задач:
+# связи загружаются планом из схемы ответа (crud.TASK_READ_PLAN)
+
+SIZES = (5, 50)
+
+def add_details(db, task_ids, user_id):
+    for task_id in task_ids:
+        db.add(models.Comment(content="Комментарий", user_id=user_id, task_id=task_id))
+        db.add(models.Attachment(filename="a.txt", file_url=f"uploads/blobs/{task_id}", task_id=task_id))
+    db.commit()
+
+def list_queries(client, headers, project_id):
+    url = f"/tasks/?project_id={project_id}&limit=100"
+    client.get(url, headers=headers)
+    with count_queries() as counter:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return counter.count, len(response.json())
+
+@pytest.mark.parametrize("role", ["admin", "executor"])
+def test_task_list_query_count_is_constant(client, admin, db, make_user, make_project, make_tasks, role):
+    executor_id, executor = make_user("executor")
+    headers = admin if role == "admin" else executor
+    counts = []
+    for size in SIZES:
+        project_id = make_project()
+        ids = make_tasks(project_id, size, assigned_user_id=executor_id)
+        add_details(db, ids, executor_id)
+        queries, rows = list_queries(client, headers, project_id)
+        assert rows == size
+        counts.append(queries)
+    assert counts[0] == counts[1]
+
+def test_get_task_query_count_is_constant(db, make_user, make_project, make_tasks):
+    user_id, _ = make_user("executor")
+    counts = []
+    for size in SIZES:
+        project_id = make_project()
+        root, *children = make_tasks(project_id, size + 1, assigned_user_id=user_id)
+        db.query(models.Task).filter(models.Task.id.in_(children)).update({"parent_task_id": root},
+                                                                            synchronize_session=False)
+        add_details(db, [root] * size, user_id)
+        db.expire_all()
+        with count_queries() as counter:
+            body = serializers.to_jsonable(schemas.Task, crud.get_task(db, root))
+        assert len(body["subtasks"]) == size and len(body["comments"]) == size
+        counts.append(counter.count)
+        db.rollback()
+    assert counts[0] == counts[1]
+
+def test_search_query_count_is_constant(db, make_user, make_project, make_tasks):
+    user_id, _ = make_user("executor")
+    counts = []
+    for size in SIZES:
+        word = unique("слово").replace("-", "")
+        project_id = make_project()
+        ids = make_tasks(project_id, size, assigned_user_id=user_id)
+        db.query(models.Task).filter(models.Task.id.in_(ids)).update({"description": f"Задача {word}"},
+                                                                      synchronize_session=False)
+        db.commit()
+        add_details(db, ids, user_id)
+        db.expire_all()
+        with count_queries() as counter:
+            tasks, _ = crud.search_tasks(db, word)
+            body = serializers.to_jsonable(List[schemas.Task], tasks)
+        assert len(body) == size
+        counts.append(counter.count)
+        db.rollback()
+    assert counts[0] == counts[1]
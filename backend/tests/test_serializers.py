@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import List
+import pytest
+from fastapi.encoders import jsonable_encoder
+from app import crud, models, schemas, serializers
+from app.pagination import PageParams
+from tests.conftest import unique
+
+# Собранные сериализаторы (app.serializers) должны давать тот же JSON, что
+# и обычный путь FastAPI: from_orm/parse_obj схемы и jsonable_encoder
+
+def expected(model, content):
+    if isinstance(content, list):
+        return [expected(model, item) for item in content]
+    if isinstance(content, dict):
+        return jsonable_encoder(model.parse_obj(content))
+    return jsonable_encoder(model.from_orm(content))
+
+def assert_same(model, content):
+    schema = List[model] if isinstance(content, list) else model
+    assert serializers.to_jsonable(schema, content) == expected(model, content)
+
+@pytest.fixture
+def project(client, admin, make_user, make_project, make_tasks):
+    executor_id, _ = make_user("executor", email=f"{unique('executor')}@example.com")
+    leader_id, _ = make_user("manager", full_name="Руководитель Проекта")
+    project_id = make_project()
+    assert client.post(f"/projects/{project_id}/leader", json={"user_id": leader_id}, headers=admin).status_code == 200
+    assert client.post(f"/projects/{project_id}/participants", json={"user_id": executor_id},
+                       headers=admin).status_code == 200
+    root, = make_tasks(project_id, 1, assigned_user_id=executor_id, details="Подробности", priority="Высокий",
+                       estimated_time=2, due_date="2030-01-02T03:04:05.678901")
+    for n in range(2):
+        response = client.post(f"/tasks/{root}/subtasks", json={"description": f"Подзадача {n}",
+                                                                 "project_id": project_id}, headers=admin)
+        assert response.status_code == 200, response.text
+    assert client.post(f"/tasks/{root}/comments", json={"content": "Комментарий"}, headers=admin).status_code == 200
+    response = client.post(f"/tasks/{root}/attachments", files={"file": ("a.txt", b"data", "text/plain")},
+                           headers=admin)
+    assert response.status_code == 200, response.text
+    # Задача без исполнителя, срока и подробностей: поля Optional равны None
+    make_tasks(project_id, 1)
+    return {"id": project_id, "root": root, "executor_id": executor_id, "leader_id": leader_id}
+
+def test_task_read_matches_pydantic(db, project):
+    task = crud.get_task(db, project["root"])
+    assert task.assigned_user and task.attachments and len(task.subtasks) == 2 and task.comments
+    assert_same(schemas.Task, task)
+    body = serializers.to_jsonable(schemas.Task, task)
+    assert body["attachments"][0]["download_url"].endswith("/content")
+    assert body["due_date"] == "2030-01-02T03:04:05.678901" and body["priority"] == "Высокий"
+
+    tasks, _ = crud.get_tasks(db, schemas.TaskFilter(project_id=project["id"]), PageParams("id"))
+    assert any(task.assigned_user is None and task.due_date is None for task in tasks)
+    assert_same(schemas.Task, tasks)
+    db.rollback()
+
+def test_project_detail_matches_pydantic(db, project):
+    detail, _ = crud.get_project_with_details(db, project["id"], PageParams("created_at"))
+    assert detail["leader"] is not None and detail["participants"] and len(detail["tasks"]) == 4
+    assert_same(schemas.ProjectDetail, detail)
+
+    detail["leader"] = None
+    assert_same(schemas.ProjectDetail, detail)
+    db.rollback()
+
+def test_user_read_matches_pydantic(db, project):
+    executor = crud.get_user(db, project["executor_id"])
+    leader = crud.get_user(db, project["leader_id"])
+    assert executor.assigned_tasks and executor.full_name is None
+    assert leader.email is None and not leader.assigned_tasks
+    assert_same(schemas.User, [executor, leader])
+    db.rollback()
+
+def test_dict_content_matches_pydantic():
+    summary = {"total_tasks": 3, "completed_tasks": 1, "estimated_time": 4, "time_spent": 1.5}
+    assert_same(schemas.ProjectTaskSummary, summary)
+    child = {"id": 2, "description": "Подзадача", "status": models.TaskStatus.completed,
+             "priority": models.TaskPriority.low, "parent_task_id": 1, "depth": 1, "estimated_time": 1}
+    node = {"id": 1, "description": "Задача", "status": models.TaskStatus.new, "priority": models.TaskPriority.high,
+            "due_date": datetime(2024, 1, 1, 12, 30), "depth": 0, "subtasks": [child]}
+    assert_same(schemas.TaskTreeNode, node)
@@ -4,6 +4,7 @@ import ProjectService from '../services/ProjectService';
 import TaskService from '../services/TaskService';
 import UserService from '../services/UserService';
 import AuthService from '../services/AuthService';
+import ChangeFeedService from '../services/ChangeFeedService';
 
 import {
   Container,
@@ -48,6 +49,7 @@ function ProjectDetailPage() {
   // Состояния загрузки проекта и самого проекта
   const [project, setProject] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [nextTasksCursor, setNextTasksCursor] = useState(null);
 
   // Состояние для редактирования проекта
   const [isEditingProject, setIsEditingProject] = useState(false);
@@ -84,11 +86,18 @@ function ProjectDetailPage() {
     loadUsers();
   }, [projectId]);
 
-  const loadProjectDetail = () => {
-    setLoading(true);
+  // Изменения проекта от других пользователей: данные перечитываются без индикатора загрузки
+  useEffect(() => {
+    const refresh = () => loadProjectDetail(false);
+    return ChangeFeedService.subscribe({ projectId }, refresh, refresh);
+  }, [projectId]);
+
+  const loadProjectDetail = (showLoading = true) => {
+    if (showLoading) setLoading(true);
     ProjectService.getProjectDetail(projectId)
       .then((response) => {
         setProject(response.data);
+        setNextTasksCursor(response.headers['x-next-cursor'] || null);
         setLoading(false);
       })
       .catch((error) => {
@@ -98,6 +107,19 @@ function ProjectDetailPage() {
       });
   };
 
+  // Следующая страница задач проекта
+  const loadMoreTasks = () => {
+    ProjectService.getProjectDetail(projectId, nextTasksCursor)
+      .then((response) => {
+        setProject((current) => ({ ...current, tasks: [...current.tasks, ...response.data.tasks] }));
+        setNextTasksCursor(response.headers['x-next-cursor'] || null);
+      })
+      .catch((error) => {
+        console.error('Ошибка при загрузке задач проекта:', error);
+        showSnackbar('Не удалось загрузить задачи', 'error');
+      });
+  };
+
   const loadUsers = () => {
     UserService.getUsers()
       .then((response) => {
@@ -254,11 +276,12 @@ function ProjectDetailPage() {
     }
   };
 
-  // Подсчёт задач по статусам
-  const totalTasks = project && project.tasks ? project.tasks.length : 0;
-  const newTasksCount = project && project.tasks ? project.tasks.filter(t => t.status === 'Новая').length : 0;
-  const inProgressCount = project && project.tasks ? project.tasks.filter(t => t.status === 'В процессе').length : 0;
-  const completedCount = project && project.tasks ? project.tasks.filter(t => t.status === 'Завершена').length : 0;
+  // Подсчёт задач по статусам: сводка по всему проекту, а не по загруженной странице
+  const summary = project && project.task_summary ? project.task_summary : {};
+  const totalTasks = summary.total_tasks || 0;
+  const newTasksCount = summary.new_tasks || 0;
+  const inProgressCount = summary.in_progress_tasks || 0;
+  const completedCount = summary.completed_tasks || 0;
 
   // Данные для круговой диаграммы
   const pieData = [
@@ -519,6 +542,13 @@ function ProjectDetailPage() {
           ) : (
             <Typography>Задачи не найдены.</Typography>
           )}
+          {nextTasksCursor && (
+            <Box sx={{ marginTop: 2, textAlign: 'center' }}>
+              <Button variant="outlined" onClick={loadMoreTasks}>
+                Загрузить ещё
+              </Button>
+            </Box>
+          )}
         </Paper>
 
         <Typography variant="h5" gutterBottom>
@@ -157,6 +157,26 @@ function TaskDetailPage() {
     }
   };
 
+  // Файл скачивается с токеном авторизации и открывается из памяти браузера
+  const handleOpenAttachment = (event, attachment) => {
+    event.preventDefault();
+    TaskService.downloadAttachment(taskId, attachment.id)
+      .then((response) => {
+        const url = window.URL.createObjectURL(response.data);
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = attachment.filename;
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        window.URL.revokeObjectURL(url);
+      })
+      .catch((error) => {
+        console.error('Ошибка при скачивании файла:', error);
+        showSnackbar('Не удалось скачать файл', 'error');
+      });
+  };
+
   const handleDeleteAttachment = (attachmentId) => {
     const confirmDelete = window.confirm('Вы уверены, что хотите удалить этот файл?');
     if (!confirmDelete) return;
@@ -450,9 +470,8 @@ function TaskDetailPage() {
               <ListItem key={attachment.id} sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
                 <Box>
                   <a
-                    href={`http://localhost:8000/uploads/${attachment.filename}`}
-                    target="_blank"
-                    rel="noopener noreferrer"
+                    href={`http://localhost:8000/tasks/${taskId}/attachments/${attachment.id}/content`}
+                    onClick={(event) => handleOpenAttachment(event, attachment)}
                     style={{ textDecoration: 'none', color: '#1976d2' }}
                   >
                     {attachment.filename}
@@ -0,0 +1,51 @@
+import AuthService from './AuthService';
+
+const WS_URL = 'ws://localhost:8000'; // Замените на адрес бэкенда
+
+const RECONNECT_DELAY = 3000;
+
+// Подписка на ленту изменений /ws/changes. При обрыве соединение
+// восстанавливается с номера последнего полученного события; событие reset
+// означает, что часть изменений пропущена и данные нужно перечитать целиком.
+// Возвращает функцию отписки.
+const ChangeFeedService = {
+  subscribe({ projectId, assigneeId } = {}, onChange, onReset) {
+    let socket = null;
+    let lastSeq = null;
+    let closed = false;
+    let timer = null;
+
+    const connect = () => {
+      const user = AuthService.getCurrentUser();
+      if (!user || !user.access_token) return;
+      const params = new URLSearchParams({ token: user.access_token });
+      if (projectId) params.append('project_id', projectId);
+      if (assigneeId) params.append('assignee_id', assigneeId);
+      if (lastSeq !== null) params.append('after', lastSeq);
+
+      socket = new WebSocket(`${WS_URL}/ws/changes?${params}`);
+      socket.onmessage = (message) => {
+        const change = JSON.parse(message.data);
+        if (change.type === 'ping') return;
+        lastSeq = change.seq;
+        if (change.type === 'reset') {
+          if (onReset) onReset();
+        } else {
+          onChange(change);
+        }
+      };
+      socket.onclose = () => {
+        if (!closed) timer = setTimeout(connect, RECONNECT_DELAY);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      if (socket) socket.close();
+    };
+  }
+};
+
+export default ChangeFeedService;
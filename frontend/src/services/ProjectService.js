@@ -1,16 +1,18 @@
-import api from './api';
+import api, { getAllPages } from './api';
 
 const ProjectService = {
   getProjects() {
-    return api.get('/projects/'); // Добавляем слэш в конце
+    return getAllPages('/projects/'); // Добавляем слэш в конце
   },
 
   createProject(projectData) {
     return api.post('/projects/', projectData);
   },
 
-  getProjectDetail(projectId) {
-    return api.get(`/projects/${projectId}/detail`);
+  // Задачи проекта приходят страницами; курсор следующей — в заголовке X-Next-Cursor
+  getProjectDetail(projectId, cursor) {
+    const params = cursor ? { cursor } : {};
+    return api.get(`/projects/${projectId}/detail`, { params });
   },
 
   addParticipant(projectId, userId) {
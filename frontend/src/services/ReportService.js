@@ -8,6 +8,14 @@ class ReportService {
     }
     return api.get('/reports/task-stats', { params });
   }
+
+  exportTaskStatistics(by, format = 'csv', projectId) {
+    const params = { by, format };
+    if (projectId) {
+      params.project_id = projectId;
+    }
+    return api.get('/reports/export', { params, responseType: 'blob' });
+  }
 }
 
 export default new ReportService();
@@ -1,8 +1,13 @@
-import api from './api';
+import api, { getAllPages } from './api';
 
 class TaskService {
   getTasks() {
-    return api.get('/tasks/'); // Добавляем слэш в конце
+    return getAllPages('/tasks/'); // Добавляем слэш в конце
+  }
+
+  // Выгрузка задач файлом: format — csv или ndjson, остальные параметры — фильтры списка
+  exportTasks(params) {
+    return api.get('/tasks/export', { params, responseType: 'blob' });
   }
 
   getTask(taskId) {
@@ -17,6 +22,25 @@ class TaskService {
     return api.put(`/tasks/${taskId}`, taskData);
   }
 
+  // Массовые операции: ids — список задач или filter — условия как в списке задач
+  createTasks(tasks) {
+    return api.post('/tasks/bulk', { tasks });
+  }
+
+  updateTasks(selection, changes) {
+    return api.patch('/tasks/bulk', { ...selection, changes });
+  }
+
+  deleteTasks(selection) {
+    return api.delete('/tasks/bulk', { data: selection });
+  }
+
+  // Задача со всеми подзадачами и итогами по поддереву
+  getTaskTree(taskId, maxDepth) {
+    const params = maxDepth === undefined ? {} : { max_depth: maxDepth };
+    return api.get(`/tasks/${taskId}/tree`, { params });
+  }
+
   addComment(taskId, commentData) {
     return api.post(`/tasks/${taskId}/comments`, commentData);
   }
@@ -44,6 +68,12 @@ class TaskService {
   deleteAttachment(taskId, attachmentId) {
     return api.delete(`/tasks/${taskId}/attachments/${attachmentId}`);
   }
+
+  downloadAttachment(taskId, attachmentId) {
+    return api.get(`/tasks/${taskId}/attachments/${attachmentId}/content`, {
+      responseType: 'blob',
+    });
+  }
 }
 
 export default new TaskService();
@@ -1,8 +1,8 @@
-import api from './api';
+import api, { getAllPages } from './api';
 
 class UserService {
   getUsers() {
-    return api.get('/users/'); // Добавляем слэш в конце
+    return getAllPages('/users/'); // Добавляем слэш в конце
   }
 
   getUser(userId) {
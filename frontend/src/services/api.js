@@ -18,4 +18,16 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Списки приходят страницами; курсор следующей — в заголовке X-Next-Cursor.
+// Загружает все страницы и возвращает ответ со строками всех страниц.
+export const getAllPages = async (url, params = {}) => {
+  let response = await api.get(url, { params });
+  const rows = [...response.data];
+  while (response.headers['x-next-cursor']) {
+    response = await api.get(url, { params: { ...params, cursor: response.headers['x-next-cursor'] } });
+    rows.push(...response.data);
+  }
+  return { ...response, data: rows };
+};
+
 export default api;
\ No newline at end of file